@@ -0,0 +1,64 @@
+"""
+
+Decoding 40-status timeline pages, the way providers used to (json.loads, then Status(**data) for each status)
+and the way they do now (orjson, then one validation pass over the whole page).
+Both use the current models, so this doesn't include the time saved by not validating URLs.
+
+Run with FEDIIVERSE_ROOT_PATH set:
+    python -m benchmarks.decode
+
+"""
+import asyncio
+import json
+import time
+
+from fediiverse.mastodon.models.status import Status
+from fediiverse.mastodon.providers._base import BaseProvider
+
+from .fixtures import FLAVORS, make_timeline_data
+
+NUMBER = 200
+PAGE_SIZE = 40
+
+
+class BufferedResponse:
+	def __init__(self, body: bytes):
+		self.body = body
+
+	async def read(self) -> bytes:
+		return self.body
+
+
+def legacy_decode(body: bytes) -> list[Status]:
+	return [Status(**data) for data in json.loads(body)]
+
+
+async def decode(body: bytes) -> list[Status]:
+	return await BaseProvider._decode(BufferedResponse(body), list[Status])
+
+
+async def main():
+	print(f"{'flavor':<14}{'size':>10}{'legacy':>12}{'current':>12}{'speedup':>10}")
+	for flavor in FLAVORS:
+		body = json.dumps(make_timeline_data(flavor, PAGE_SIZE)).encode("utf-8")
+		if legacy_decode(body) != await decode(body):
+			raise AssertionError(f"output mismatch for {flavor!r}")
+
+		start_time = time.perf_counter()
+		for _ in range(NUMBER):
+			legacy_decode(body)
+		legacy_time = (time.perf_counter() - start_time) / NUMBER
+
+		start_time = time.perf_counter()
+		for _ in range(NUMBER):
+			await decode(body)
+		current_time = (time.perf_counter() - start_time) / NUMBER
+
+		print(
+			f"{flavor:<14}{len(body) // 1024:>8}KB{legacy_time * 1e3:>10.2f}ms{current_time * 1e3:>10.2f}ms"
+			f"{legacy_time / current_time:>9.2f}x"
+		)
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
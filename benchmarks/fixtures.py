@@ -0,0 +1,458 @@
+"""
+
+Fixtures for the benchmarks: timelines, threads (contexts) and profiles as JSON.
+
+Recorded fixtures are JSON files in benchmarks/corpus/ (see record_fixtures.py). Those contain real people's posts,
+so they are kept out of git. The synthetic corpus below is always available. It imitates what Mastodon, GoToSocial
+and Akkoma actually send: their content markup, ids, mentions and extra fields, with emoji-heavy, card-heavy,
+media-heavy and long-thread variants. Every status is different (ids, counts, flags) so caches can't serve repeats.
+
+"""
+import datetime
+import json
+import string
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+from fediiverse.mastodon.models.account import Account
+from fediiverse.mastodon.models.context import Context
+from fediiverse.mastodon.models.status import Status
+
+CORPUS_PATH = Path(__file__).parent / "corpus"
+
+FLAVORS = ("mastodon", "gotosocial", "akkoma")
+
+INSTANCES = {
+	"mastodon": "mastodon.example",
+	"gotosocial": "gts.example",
+	"akkoma": "akkoma.example",
+}
+
+FixtureKind = Literal["timeline", "context", "account"]
+
+
+@dataclass
+class Fixture:
+	name: str
+	flavor: str
+	kind: FixtureKind
+	# timeline: a list of statuses
+	# context: {"status": status, "context": {"ancestors": [...], "descendants": [...]}}
+	# account: {"account": account, "statuses": [...]}
+	data: Any
+
+	@property
+	def statuses(self) -> list[Status]:
+		if self.kind == "timeline":
+			return [Status.model_validate(status_data) for status_data in self.data]
+		elif self.kind == "context":
+			context = self.context
+			return [*context.ancestors, Status.model_validate(self.data["status"]), *context.descendants]
+		else:
+			return [Status.model_validate(status_data) for status_data in self.data["statuses"]]
+
+	@property
+	def status(self) -> Status:
+		return Status.model_validate(self.data["status"])
+
+	@property
+	def context(self) -> Context:
+		return Context.from_data(self.data["context"])
+
+	@property
+	def account(self) -> Account:
+		return Account.model_validate(self.data["account"])
+
+
+def make_id(flavor: str, index: int) -> str:
+	if flavor == "gotosocial":
+		# ULIDs, newest first
+		alphabet = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+		value = 2 ** 80 - index * 7919
+		return "01HX" + "".join(alphabet[(value >> (5 * shift)) & 31] for shift in range(21, -1, -1))
+	elif flavor == "akkoma":
+		# flake ids, base62
+		alphabet = string.digits + string.ascii_uppercase + string.ascii_lowercase
+		value = 10 ** 17 - index * 104729
+		flake = ""
+		while value:
+			value, digit = divmod(value, 62)
+			flake = alphabet[digit] + flake
+		return "Ai" + flake
+	else:
+		# snowflakes
+		return str(112_000_000_000_000_000 - index * 65536)
+
+
+def make_custom_emoji(flavor: str, shortcode: str) -> dict[str, Any]:
+	instance = INSTANCES[flavor]
+	emoji_url = f"https://{instance}/emoji/{shortcode}.png"
+	custom_emoji = {
+		"shortcode": shortcode,
+		"url": emoji_url,
+		"static_url": emoji_url,
+		"visible_in_picker": True
+	}
+	if flavor == "akkoma":
+		custom_emoji["tags"] = ["pack:blobs"]
+	elif flavor == "mastodon":
+		custom_emoji["category"] = "blobs"
+	return custom_emoji
+
+
+SHORTCODES = ("blobcat", "neofox_heart", "ablobcatrave", "blobfoxcomfy", "verified")
+
+
+def make_mention(flavor: str, username: str) -> str:
+	instance = INSTANCES[flavor]
+	if flavor == "mastodon":
+		return (
+			f'<span class="h-card" translate="no"><a href="https://{instance}/@{username}" class="u-url mention">'
+			f'@<span>{username}</span></a></span>'
+		)
+	elif flavor == "gotosocial":
+		return f'<span class="h-card"><a href="https://{instance}/@{username}" class="mention">@<span>{username}</span></a></span>'
+	else:
+		return (
+			f'<span class="h-card"><a class="u-url mention" data-user="{make_id(flavor, len(username))}" '
+			f'href="https://{instance}/users/{username}" rel="ugc">@<span>{username}</span></a></span>'
+		)
+
+
+def make_hashtag(flavor: str, tag: str) -> str:
+	instance = INSTANCES[flavor]
+	if flavor == "akkoma":
+		return f'<a class="hashtag" data-tag="{tag.lower()}" href="https://{instance}/tag/{tag.lower()}" rel="tag ugc">#{tag}</a>'
+	return f'<a href="https://{instance}/tags/{tag.lower()}" class="mention hashtag" rel="tag">#<span>{tag}</span></a>'
+
+
+def make_link(flavor: str, url: str) -> str:
+	if flavor == "mastodon":
+		scheme, _, rest = url.partition("://")
+		return (
+			f'<a href="{url}" target="_blank" rel="nofollow noopener noreferrer" translate="no">'
+			f'<span class="invisible">{scheme}://</span><span class="ellipsis">{rest[:30]}</span>'
+			f'<span class="invisible">{rest[30:]}</span></a>'
+		)
+	elif flavor == "gotosocial":
+		return f'<a href="{url}" rel="nofollow noreferrer noopener" target="_blank">{url}</a>'
+	else:
+		return f'<a href="{url}" rel="ugc">{url}</a>'
+
+
+def make_content(flavor: str, paragraphs: list[list[str]]) -> str:
+	"""paragraphs are lists of lines of (already escaped) HTML"""
+	if flavor == "mastodon":
+		return "".join(f"<p>{'<br />'.join(lines)}</p>" for lines in paragraphs)
+	elif flavor == "gotosocial":
+		return "".join(f"<p>{'<br>'.join(lines)}</p>" for lines in paragraphs)
+	else:
+		# akkoma doesn't wrap posts in paragraphs
+		return "<br/><br/>".join("<br/>".join(lines) for lines in paragraphs)
+
+
+def make_text(flavor: str, variant: str, index: int) -> list[list[str]]:
+	if variant == "emoji":
+		return [
+			[
+				f"good morning fediverse ☀️☕ day {index} of the plan: 🧹 clean, 🛒 groceries, 🎮 play some Animal Crossing 🐸🍃",
+				"and maybe 🍰 bake? 👩‍🍳✨ wish me luck!! 💪😤 :blobcat: :neofox_heart: :ablobcatrave:",
+			],
+			[
+				"🏳️‍🌈🏳️‍⚧️ reminder that you're all valid 💖💜💙 :blobfoxcomfy: 🇯🇵🇫🇷🇧🇷 👍🏽👍🏿 "
+				f"{make_hashtag(flavor, 'Caturday')} 🐈‍⬛🐈",
+			],
+		]
+	elif variant == "card":
+		return [[
+			f"this is a great read about 3DS homebrew {make_link(flavor, f'https://news.example/articles/{index}/miiverse-applet-reverse-engineering')}",
+		]]
+	elif variant == "thread":
+		return [
+			[f"{make_mention(flavor, f'user{(index + 1) % 7}')} ({index}/n) replying to the thread, "
+			 "the Miiverse applet is a WebKit-based browser with a custom JS API called cave."],
+			["It's old: no flexbox, no fetch, no promises. Everything is polyfilled &amp; transpiled &lt;3"],
+		]
+
+	texts = [
+		[["Finally got the new build running on real hardware. The frame pacing issue was a missing vsync wait in "
+		  "the present path, of course. Writing it up tomorrow"]],
+		[[f"{make_mention(flavor, 'alex')} 今日は天気がいいので散歩に行きました。桜がとてもきれいでした🌸 写真はあとで載せます！"]],
+		[["new sticker pack dropped :neofox_heart: :ablobcatrave:",
+		  f"get it at {make_link(flavor, 'https://shop.example/stickers?ref=fedi&amp;campaign=spring')}"]],
+		[["Thread about 3DS homebrew (1/12) 🧵"],
+		 ["<code>cave.lls_getItem(&quot;token&quot;)</code> returns the saved token", "Everything is polyfilled."],
+		 [f"{make_hashtag(flavor, '3DS')} {make_hashtag(flavor, 'homebrew')}"]],
+	]
+	return texts[index % len(texts)]
+
+
+def make_account_data(flavor: str, index: int) -> dict[str, Any]:
+	instance = INSTANCES[flavor]
+	username = f"user{index}"
+	display_names = [
+		"sheep :blobcat: (she/her) 🏳️‍⚧️",
+		"Alex",
+		"ねこ🐈",
+		"The \"Real\" <Dev> & Co :neofox_heart:",
+		"",
+	]
+	account = {
+		"id": make_id(flavor, 1_000_000 + index),
+		"username": username,
+		"acct": username if index % 3 else f"{username}@remote.example",
+		"display_name": display_names[index % len(display_names)],
+		"locked": False,
+		"bot": index % 11 == 0,
+		"created_at": "2022-11-05T00:00:00.000Z",
+		"note": make_content(flavor, [["just posting. ", make_hashtag(flavor, "introduction")]]),
+		"url": f"https://{instance}/@{username}",
+		"avatar": f"https://{instance}/media/avatars/{index}.png",
+		"avatar_static": f"https://{instance}/media/avatars/{index}.png",
+		"header": f"https://{instance}/media/headers/{index}.png",
+		"header_static": f"https://{instance}/media/headers/{index}.png",
+		"followers_count": 50 + index,
+		"following_count": 20 + index,
+		"statuses_count": 1000 + index,
+		"last_status_at": "2024-05-01",
+		"emojis": [make_custom_emoji(flavor, shortcode) for shortcode in SHORTCODES[:2]],
+		"fields": [
+			{"name": "pronouns", "value": "they/them", "verified_at": None},
+			{
+				"name": "website",
+				"value": make_link(flavor, f"https://{username}.example"),
+				"verified_at": "2023-01-01T00:00:00.000Z" if index % 2 else None
+			},
+		],
+	}
+
+	if flavor == "mastodon":
+		account.update({"group": False, "discoverable": True, "indexable": True, "hide_collections": False, "roles": []})
+	elif flavor == "gotosocial":
+		# GoToSocial sends emojis it couldn't fetch with empty urls
+		account["emojis"].append({"shortcode": "broken", "url": "", "static_url": "", "visible_in_picker": False})
+		account["enable_rss"] = False
+	else:
+		account["fqn"] = f"{username}@{instance}"
+		account["pleroma"] = {
+			"ap_id": f"https://{instance}/users/{username}",
+			"is_admin": False,
+			"is_moderator": False,
+			"hide_favorites": True,
+			"relationship": {},
+			"tags": [],
+		}
+		account["akkoma"] = {"instance": {"name": instance, "nodeinfo": {}}, "permit_followback": False}
+
+	return account
+
+
+def make_media_attachment(flavor: str, index: int, attachment_index: int, *, sketch: bool = False) -> dict[str, Any]:
+	instance = INSTANCES[flavor]
+	width, height = (320, 120) if sketch else (1280 - attachment_index * 200, 960)
+	small_width, small_height = width // 2, height // 2
+	attachment = {
+		"id": make_id(flavor, 5_000_000 + index * 10 + attachment_index),
+		"type": "image",
+		"url": f"https://{instance}/media/attachments/{index}/{attachment_index}.png",
+		"preview_url": f"https://{instance}/media/attachments/{index}/{attachment_index}_small.png",
+		"remote_url": None,
+		"description": f"a photo of a cat, number {attachment_index}" if attachment_index % 2 == 0 else None,
+		"blurhash": "LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+		"meta": {
+			"original": {"width": width, "height": height, "size": f"{width}x{height}", "aspect": width / height},
+			"small": {"width": small_width, "height": small_height, "size": f"{small_width}x{small_height}", "aspect": width / height},
+		},
+	}
+	if flavor == "akkoma":
+		# akkoma only knows the original size
+		del attachment["meta"]["small"]
+		attachment["pleroma"] = {"mime_type": "image/png"}
+	elif flavor == "gotosocial":
+		attachment["meta"]["focus"] = {"x": 0, "y": 0}
+	return attachment
+
+
+def make_card(flavor: str, index: int) -> dict[str, Any]:
+	card = {
+		"url": f"https://news.example/articles/{index}/miiverse-applet-reverse-engineering",
+		"title": f"Reverse engineering the Miiverse applet, part {index} 🔧",
+		"description": "How the 3DS Miiverse applet talks to its servers, and how to make it talk to ours instead.",
+		"type": "link",
+		"author_name": "sheep" if index % 2 else "",
+		"author_url": "",
+		"provider_name": "" if index % 3 == 0 else "news.example",
+		"provider_url": "",
+		"html": "",
+		"width": 1200 if index % 4 else 400,
+		"height": 630 if index % 4 else 400,
+		"image": f"https://news.example/images/{index}.png" if index % 5 else None,
+		"embed_url": "",
+		"blurhash": None,
+	}
+	if flavor == "akkoma":
+		card["pleroma"] = {"opengraph": {"title": card["title"], "url": card["url"]}}
+	elif flavor == "mastodon":
+		card["language"] = "en"
+		card["published_at"] = None
+	return card
+
+
+def make_status_data(
+		flavor: str,
+		index: int,
+		*,
+		variant: str = "mixed",
+		in_reply_to: dict[str, Any] | None = None,
+		boosts: bool = True
+) -> dict[str, Any]:
+	instance = INSTANCES[flavor]
+	status_id = make_id(flavor, index)
+	account = make_account_data(flavor, index % 23)
+	created_at = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc) - datetime.timedelta(minutes=index * 7)
+
+	status = {
+		"id": status_id,
+		"created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+		"in_reply_to_id": in_reply_to["id"] if in_reply_to else None,
+		"in_reply_to_account_id": in_reply_to["account"]["id"] if in_reply_to else None,
+		"sensitive": index % 9 == 0,
+		"spoiler_text": "cw: food 🍕" if index % 9 == 0 else "",
+		"visibility": ["public", "unlisted", "public", "private"][index % 4],
+		"language": "en",
+		"uri": f"https://{instance}/users/{account['username']}/statuses/{status_id}",
+		"url": f"https://{instance}/@{account['username']}/{status_id}",
+		"replies_count": index % 5,
+		"reblogs_count": index % 7,
+		"favourites_count": (index * 3) % 13,
+		"edited_at": "2024-05-01T13:00:00.000Z" if index % 17 == 0 else None,
+		"favourited": index % 4 == 0,
+		"reblogged": index % 10 == 0,
+		"muted": False,
+		"bookmarked": index % 8 == 0,
+		"content": make_content(flavor, make_text(flavor, variant, index)),
+		"reblog": None,
+		"application": {"name": "Tusky", "website": "https://tusky.app"} if index % 3 == 0 else None,
+		"account": account,
+		"media_attachments": [],
+		"mentions": [],
+		"tags": [],
+		"emojis": [make_custom_emoji(flavor, shortcode) for shortcode in SHORTCODES],
+		"card": None,
+		"poll": None,
+		"filtered": [],
+	}
+
+	if variant == "media" or (variant == "mixed" and index % 4 == 1):
+		if index % 6 == 0:
+			status["media_attachments"] = [make_media_attachment(flavor, index, 0, sketch=True)]
+		else:
+			status["media_attachments"] = [
+				make_media_attachment(flavor, index, attachment_index) for attachment_index in range(1 + index % 4)
+			]
+
+	if variant == "card" or (variant == "mixed" and index % 4 == 2):
+		status["card"] = make_card(flavor, index)
+
+	if variant == "mixed" and index % 13 == 6:
+		status["filtered"] = [{
+			"filter": {
+				"id": "1",
+				"title": "spoilers",
+				"context": ["home", "public", "thread"],
+				"filter_action": "warn",
+			},
+			"keyword_matches": ["finally"],
+			"status_matches": None
+		}]
+
+	if flavor == "akkoma":
+		status["pleroma"] = {
+			"content": {"text/plain": ""},
+			"context": f"https://{instance}/contexts/{index // 10}",
+			"conversation_id": index // 10,
+			"emoji_reactions": [{"name": "🐸", "count": index % 4, "me": False}],
+			"local": index % 3 != 0,
+			"spoiler_text": {"text/plain": status["spoiler_text"]},
+		}
+		status["akkoma"] = {"source": {"content": "", "mediaType": "text/plain"}}
+	elif flavor == "gotosocial":
+		status["interaction_policy"] = {
+			"can_favourite": {"always": ["public"], "with_approval": []},
+			"can_reply": {"always": ["public"], "with_approval": []},
+			"can_reblog": {"always": ["public"], "with_approval": []},
+		}
+
+	if boosts and index % 6 == 5:
+		# a boost of someone else's status
+		boosted = make_status_data(flavor, index + 10_000, variant=variant, boosts=False)
+		status["reblog"] = boosted
+		status["content"] = ""
+		status["media_attachments"] = []
+		status["card"] = None
+
+	return status
+
+
+def make_timeline_data(flavor: str, count: int = 20, *, start: int = 0, variant: str = "mixed") -> list[dict[str, Any]]:
+	return [make_status_data(flavor, index, variant=variant) for index in range(start, start + count)]
+
+
+def make_context_data(flavor: str, *, ancestors: int, descendants: int) -> dict[str, Any]:
+	thread = []
+	for index in range(ancestors + 1 + descendants):
+		thread.append(make_status_data(
+			flavor, 100_000 + index,
+			variant="thread",
+			in_reply_to=thread[-1] if thread else None,
+			boosts=False
+		))
+
+	return {
+		"status": thread[ancestors],
+		"context": {
+			"ancestors": thread[:ancestors],
+			"descendants": thread[ancestors + 1:],
+		}
+	}
+
+
+def make_account_fixture_data(flavor: str) -> dict[str, Any]:
+	return {
+		"account": make_account_data(flavor, 1),
+		"statuses": make_timeline_data(flavor, start=200_000),
+	}
+
+
+def make_timeline(count: int = 20, start: int = 0, flavor: str = "mastodon") -> list[Status]:
+	return [Status.model_validate(status_data) for status_data in make_timeline_data(flavor, count, start=start)]
+
+
+def synthetic_fixtures() -> list[Fixture]:
+	fixtures = []
+	for flavor in FLAVORS:
+		fixtures.append(Fixture("timeline", flavor, "timeline", make_timeline_data(flavor)))
+		for variant in ("emoji", "card", "media"):
+			fixtures.append(Fixture(f"{variant}-heavy", flavor, "timeline", make_timeline_data(flavor, variant=variant)))
+		fixtures.append(Fixture("long-thread", flavor, "context", make_context_data(flavor, ancestors=60, descendants=240)))
+		fixtures.append(Fixture("profile", flavor, "account", make_account_fixture_data(flavor)))
+	return fixtures
+
+
+def recorded_fixtures() -> list[Fixture]:
+	fixtures = []
+	for fixture_path in sorted(CORPUS_PATH.glob("*.json")):
+		with open(fixture_path, "r") as file:
+			fixture_data = json.load(file)
+		fixtures.append(Fixture(
+			name=f"recorded-{fixture_data['name']}",
+			flavor=fixture_data["flavor"],
+			kind=fixture_data["kind"],
+			data=fixture_data["data"]
+		))
+	return fixtures
+
+
+def load_fixtures() -> list[Fixture]:
+	return synthetic_fixtures() + recorded_fixtures()
@@ -0,0 +1,89 @@
+"""
+
+Latency of the public timeline from a stand-in instance where some requests are very slow, with and without hedging.
+
+Run with FEDIIVERSE_ROOT_PATH set:
+    python -m benchmarks.hedging [--budget 0.05] [--percentile 95]
+
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from aiohttp import web
+
+from fediiverse.mastodon import ClientPool
+
+from .fixtures import make_status_data
+
+NUMBER = 400
+PORT = 8766
+DELAY = 0.02
+SLOW_DELAY = 1
+SLOW_CHANCE = 0.05
+
+
+class SlowTailInstance:
+	def __init__(self, *, host: str = "127.0.0.1", port: int = PORT):
+		self.host = host
+		self.port = port
+		self.requests = 0
+		self.statuses = [make_status_data("mastodon", 1_000_000 - index, variant="mixed") for index in range(20)]
+		self._random = random.Random(0)
+		self._runner: web.AppRunner
+
+		self.app = web.Application()
+		self.app.router.add_get("/api/v1/timelines/public", self._get_public_timeline)
+
+	@property
+	def url(self) -> str:
+		return f"http://{self.host}:{self.port}"
+
+	async def _get_public_timeline(self, _: web.Request) -> web.Response:
+		self.requests += 1
+		await asyncio.sleep(SLOW_DELAY if self._random.random() < SLOW_CHANCE else DELAY)
+		return web.json_response(self.statuses)
+
+	async def __aenter__(self):
+		self._runner = web.AppRunner(self.app)
+		await self._runner.setup()
+		await web.TCPSite(self._runner, self.host, self.port).start()
+		return self
+
+	async def __aexit__(self, *_):
+		await self._runner.cleanup()
+
+
+async def measure(budget: float, percentile: float):
+	async with SlowTailInstance() as instance, ClientPool(hedge_budget=budget, hedge_percentile=percentile) as pool:
+		mastodon = pool.client(instance.url)
+		latencies = []
+		for _ in range(NUMBER):
+			start_time = time.perf_counter()
+			await mastodon.timelines.get_public_timeline(limit=20)
+			latencies.append(time.perf_counter() - start_time)
+
+		quantiles = statistics.quantiles(latencies, n=100)
+		name = f"budget {budget}" if budget else "no hedging"
+		print(
+			f"{name:<15}"
+			f"p50 {quantiles[49] * 1e3:>7.1f}ms  p95 {quantiles[94] * 1e3:>7.1f}ms  p99 {quantiles[98] * 1e3:>7.1f}ms  "
+			f"{instance.requests} requests, {pool.hedging.hedged} hedged, {pool.hedging.won} hedges answered first"
+		)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="public timeline latency with and without hedging")
+	parser.add_argument("--budget", type=float, default=0.05, help="hedges per request")
+	parser.add_argument("--percentile", type=float, default=95, help="latency percentile after which to hedge")
+	args = parser.parse_args()
+
+	print(f"{NUMBER} requests, {SLOW_CHANCE:.0%} of them take {SLOW_DELAY}s instead of {DELAY * 1e3:.0f}ms")
+	asyncio.run(measure(0, args.percentile))
+	asyncio.run(measure(args.budget, args.percentile))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,68 @@
+"""
+
+First page latency of the home timeline, fetched from a (stand-in) instance and from a home buffer.
+Also checks that streamed statuses and deletions show up in the buffer.
+
+Run with FEDIIVERSE_ROOT_PATH set:
+    python -m benchmarks.home_buffers
+
+"""
+import asyncio
+import time
+
+from fediiverse.mastodon import ClientPool
+from fediiverse.servers.olv.home_buffers import HomeBuffers
+
+from .streaming_server import StandInInstance
+
+NUMBER = 20
+DELAY = 0.1
+PAGE_SIZE = 20
+
+
+async def wait_for(condition, timeout: float = 5):
+	start_time = time.perf_counter()
+	while not condition():
+		if time.perf_counter() - start_time > timeout:
+			raise AssertionError("timed out")
+		await asyncio.sleep(0.01)
+
+
+async def main():
+	async with (
+		StandInInstance(delay=DELAY) as instance,
+		ClientPool() as pool,
+		HomeBuffers(max_users=1, idle_timeout=600) as home_buffers
+	):
+		mastodon = pool.client(instance.url, token="stand-in")
+
+		start_time = time.perf_counter()
+		for _ in range(NUMBER):
+			await mastodon.timelines.get_home_timeline(limit=PAGE_SIZE)
+		fetched_time = (time.perf_counter() - start_time) / NUMBER
+
+		def get_page_ids():
+			page = home_buffers.get_first_page(mastodon, PAGE_SIZE)
+			return page and [status.id for status in page]
+
+		await wait_for(get_page_ids)
+		if get_page_ids() != [status["id"] for status in instance.statuses[:PAGE_SIZE]]:
+			raise AssertionError("buffered page doesn't match the instance")
+
+		status = await instance.post()
+		await wait_for(lambda: get_page_ids()[0] == status["id"])
+		await instance.delete(status["id"])
+		await wait_for(lambda: status["id"] not in get_page_ids())
+
+		start_time = time.perf_counter()
+		for _ in range(NUMBER):
+			home_buffers.get_first_page(mastodon, PAGE_SIZE)
+		buffered_time = (time.perf_counter() - start_time) / NUMBER
+
+		print(f"instance delay {DELAY * 1e3:.0f}ms, {instance.home_requests} home timeline requests")
+		print(f"{'fetched':<10}{fetched_time * 1e3:>10.2f}ms")
+		print(f"{'buffered':<10}{buffered_time * 1e3:>10.4f}ms")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -0,0 +1,147 @@
+"""
+
+Micro-benchmark of inline_emojify against the previous implementation
+(shortcode regex loop + emoji.emoji_list + sort) on status text.
+
+Run with FEDIIVERSE_ROOT_PATH set:
+    python -m benchmarks.inline_emojify
+
+"""
+import re
+import timeit
+from typing import Optional
+
+import emoji as emoji_lib
+from bs4 import BeautifulSoup
+
+from fediiverse.mastodon.models.custom_emoji import CustomEmoji
+from fediiverse.servers.olv.rendering import inline_emojify, get_emoji_img_src, get_proxied_url
+
+NUMBER = 2000
+
+SHORTCODE_INDEX = {
+	shortcode: CustomEmoji(
+		shortcode=shortcode,
+		url=f"https://files.example.social/custom_emojis/images/{shortcode}.png",
+		static_url=f"https://files.example.social/custom_emojis/images/{shortcode}.png",
+		visible_in_picker=True
+	)
+	for shortcode in ("blobcat", "neofox_heart", "ablobcatrave", "verified")
+}
+
+# text nodes as they come out of real statuses, display names and cards
+SAMPLES = {
+	"plain": "Finally got the new build running on real hardware. The frame pacing issue was a missing "
+			 "vsync wait in the present path, of course. Writing it up tomorrow",
+	"display_name": "sheep :blobcat: (she/her) 🏳️‍⚧️",
+	"emoji_heavy": "good morning fediverse ☀️☕ today's plan: 🧹 clean, 🛒 groceries, 🎮 play some "
+				   "Animal Crossing 🐸🍃 and maybe 🍰 bake? 👩‍🍳✨ wish me luck!! 💪😤 #caturday 🐈‍⬛",
+	"shortcodes": "new sticker pack dropped :neofox_heart: :ablobcatrave: :ablobcatrave: :not_an_emoji: :blobcat:",
+	"cjk": "今日は天気がいいので散歩に行きました。桜がとてもきれいでした🌸 写真はあとで載せます！",
+	"card_title": "Release 4.3.0 · mastodon/mastodon · GitHub",
+	"long": ("Thread about 3DS homebrew (1/12) 🧵 The Miiverse applet is a WebKit-based browser with a custom "
+			 "JS API called cave. It's old: no flexbox, no fetch, no promises. Everything is polyfilled. ") * 4,
+}
+
+
+def legacy_inline_emojify(
+		text: str,
+		soup: BeautifulSoup,
+		*,
+		shortcode_index: Optional[dict[str, CustomEmoji]] = None,
+):
+	text_matches: list[dict] = []
+
+	if shortcode_index:
+		index = 0
+		shortcode_pattern = re.compile(":([a-zA-Z0-9_]+):")
+
+		while True:
+			match = shortcode_pattern.search(text, index)
+			if not match:
+				break
+
+			match_start, match_end = match.span()
+			index = match_end
+
+			match_shortcode = match.group(1)
+			if match_shortcode not in shortcode_index:
+				continue
+
+			text_matches.append({
+				"type": "custom_emoji",
+				"start": match_start,
+				"end": match_end,
+				"shortcode": match_shortcode
+			})
+
+	for emoji_match in emoji_lib.emoji_list(text):
+		text_matches.append({
+			"type": "emoji",
+			"start": emoji_match["match_start"],
+			"end": emoji_match["match_end"],
+			"emoji": emoji_match["emoji"]
+		})
+
+	text_matches.sort(key=lambda match_: match_["start"])
+
+	children = []
+	index = 0
+	for match in text_matches:
+		children.append(text[index:match["start"]])
+
+		if match["type"] == "custom_emoji":
+			custom_emoji = shortcode_index[match["shortcode"]]
+			emoji_el = soup.new_tag("img")
+			emoji_el["class"] = "custom-emoji"
+			emoji_el["src"] = get_proxied_url(custom_emoji.url, max_height=32)
+			children.append(emoji_el)
+		else:
+			emoji_src = get_emoji_img_src(emoji=match["emoji"], size=16)
+			if emoji_src:
+				emoji_el = soup.new_tag("img")
+				emoji_el["class"] = "emoji"
+				emoji_el["src"] = emoji_src
+				children.append(emoji_el)
+
+		index = match["end"]
+
+	children.append(text[index:])
+	return children
+
+
+def shape(children: list) -> list:
+	# proxied URLs are encrypted (with a timestamp and random IV), so leave their tokens out
+	return [
+		child if isinstance(child, str) else (child.name, child["class"], child["src"].partition("?t=")[0])
+		for child in children
+	]
+
+
+def main():
+	soup = BeautifulSoup("", "html.parser")
+
+	print(f"{'sample':<14}{'legacy':>12}{'current':>12}{'speedup':>10}")
+	for name, text in SAMPLES.items():
+		legacy = legacy_inline_emojify(text, soup, shortcode_index=SHORTCODE_INDEX)
+		current = inline_emojify(text, soup, shortcode_index=SHORTCODE_INDEX)
+		if shape(legacy) != shape(current):
+			raise AssertionError(f"output mismatch for {name!r}")
+
+		legacy_time = timeit.timeit(
+			lambda: legacy_inline_emojify(text, soup, shortcode_index=SHORTCODE_INDEX),
+			number=NUMBER
+		) / NUMBER
+		current_time = timeit.timeit(
+			lambda: inline_emojify(text, soup, shortcode_index=SHORTCODE_INDEX),
+			number=NUMBER
+		) / NUMBER
+
+		print(
+			f"{name:<14}{legacy_time * 1e6:>10.1f}us{current_time * 1e6:>10.1f}us"
+			f"{legacy_time / current_time:>9.1f}x"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,80 @@
+"""
+
+Records real API responses from an instance into benchmarks/corpus/, for run.py to use next to the synthetic fixtures.
+The responses are saved as they were sent (before pydantic sees them), so server quirks are kept.
+The corpus contains other people's posts, so it's not committed.
+
+    python -m benchmarks.record_fixtures <flavor> <instance url> [--status ID] [--account ACCT] [--token TOKEN]
+
+Without --status, the thread of the public timeline status with the most replies is recorded.
+Without --account, the account of the first status on the public timeline is recorded.
+
+"""
+import argparse
+import asyncio
+import json
+from typing import Any, Optional
+
+from fediiverse.mastodon import Client
+from fediiverse.mastodon.models.account import Account
+from fediiverse.mastodon.models.status import Status
+
+from .fixtures import CORPUS_PATH, FLAVORS
+
+
+async def get_json(mastodon: Client, *path: str, params: Optional[dict] = None) -> Any:
+	url = mastodon.base_url
+	for part in path:
+		url /= part
+
+	response = await mastodon.request(method="GET", url=url, params=params)
+	response.raise_for_status()
+	return await response.json()
+
+
+def save_fixture(flavor: str, name: str, kind: str, data: Any):
+	CORPUS_PATH.mkdir(exist_ok=True)
+	fixture_path = CORPUS_PATH / f"{flavor}-{name}.json"
+	with open(fixture_path, "w") as file:
+		json.dump({"name": name, "flavor": flavor, "kind": kind, "data": data}, file)
+	print(f"saved {fixture_path}")
+
+
+async def record(flavor: str, host: str, *, token: Optional[str], status_id: Optional[str], acct: Optional[str]):
+	async with Client(host, token) as mastodon:
+		timeline = await get_json(mastodon, "v1", "timelines", "public", params={"limit": 40})
+		for status_data in timeline:
+			Status.model_validate(status_data)
+		save_fixture(flavor, "public-timeline", "timeline", timeline)
+
+		if status_id is None:
+			status_id = max(timeline, key=lambda status_data: status_data["replies_count"])["id"]
+		status = await get_json(mastodon, "v1", "statuses", status_id)
+		context = await get_json(mastodon, "v1", "statuses", status_id, "context")
+		for status_data in [status, *context["ancestors"], *context["descendants"]]:
+			Status.model_validate(status_data)
+		save_fixture(flavor, f"thread-{status_id}", "context", {"status": status, "context": context})
+
+		if acct is None:
+			account = timeline[0]["account"]
+		else:
+			account = await get_json(mastodon, "v1", "accounts", "lookup", params={"acct": acct})
+		Account.model_validate(account)
+		statuses = await get_json(mastodon, "v1", "accounts", account["id"], "statuses", params={"limit": 20})
+		save_fixture(flavor, f"account-{account['id']}", "account", {"account": account, "statuses": statuses})
+
+
+def main():
+	parser = argparse.ArgumentParser(description="record fixtures for the rendering benchmarks")
+	parser.add_argument("flavor", choices=FLAVORS)
+	parser.add_argument("host", help="e.g. https://mastodon.social")
+	parser.add_argument("--status", help="id of the status whose thread is recorded")
+	parser.add_argument("--account", help="acct of the account that is recorded")
+	parser.add_argument("--token", help="access token, for instances that don't have public timelines")
+	args = parser.parse_args()
+
+	asyncio.run(record(args.flavor, args.host, token=args.token, status_id=args.status, acct=args.account))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,68 @@
+"""
+
+Timeline rendering throughput of the STREAMING engine, in-process and with process pools of different sizes.
+Pages are rendered concurrently like they would be for many consoles, with the fragment cache disabled.
+
+Run with FEDIIVERSE_ROOT_PATH set:
+    python -m benchmarks.render_throughput [max pool size]
+
+"""
+import asyncio
+import os
+import sys
+import time
+
+from fediiverse.servers.olv import streaming, workers
+from fediiverse.servers.olv.rendering import StatusListEntry
+
+from .fixtures import make_timeline
+
+PAGES = 48
+CONCURRENCY = 16
+
+
+async def render_pages(timelines: list[list[StatusListEntry]]) -> float:
+	semaphore = asyncio.Semaphore(CONCURRENCY)
+
+	async def render_page(entries: list[StatusListEntry]):
+		async with semaphore:
+			for batch_start in range(0, len(entries), streaming.STREAMING_BATCH_SIZE):
+				await streaming.render_entries_html(
+					entries[batch_start:batch_start + streaming.STREAMING_BATCH_SIZE],
+					local_user_id="100001"
+				)
+
+	start_time = time.perf_counter()
+	await asyncio.gather(*(render_page(entries) for entries in timelines))
+	return time.perf_counter() - start_time
+
+
+async def main():
+	max_pool_size = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+	streaming.status_html_cache.max_size = 0
+
+	timelines = [
+		[StatusListEntry(status) for status in make_timeline(20, start=page * 20)]
+		for page in range(PAGES)
+	]
+
+	print(f"{PAGES} pages of 20 statuses, {CONCURRENCY} at a time, on {os.cpu_count()} cores")
+	print(f"{'pool size':<12}{'pages/s':>10}{'speedup':>10}")
+
+	baseline = None
+	for pool_size in range(0, max_pool_size + 1):
+		workers.start_process_pool(pool_size)
+		try:
+			# warm up, which also starts the workers
+			await render_pages(timelines[:max(pool_size, 1)])
+			duration = await render_pages(timelines)
+		finally:
+			workers.shutdown_process_pool()
+
+		pages_per_second = PAGES / duration
+		baseline = baseline or pages_per_second
+		print(f"{pool_size or 'in-process':<12}{pages_per_second:>10.1f}{pages_per_second / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
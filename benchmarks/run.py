@@ -0,0 +1,331 @@
+"""
+
+Rendering benchmark suite. Runs every rendering stage on its own, and whole pages end to end,
+over each fixture (see fixtures.py) and reports ops/s and latency percentiles.
+
+Run with FEDIIVERSE_ROOT_PATH set:
+    python -m benchmarks.run [--number N] [--filter TEXT] [--caches] [--json PATH]
+    python -m benchmarks.run --compare baseline.json [--threshold 0.1]
+
+Caches are disabled unless --caches is given, so every op does the full work.
+With --compare, exits with status 1 if any benchmark's p50 got slower than the baseline by more than the threshold.
+
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass, asdict
+from types import SimpleNamespace
+from typing import Callable, Awaitable, Optional
+
+from bs4 import BeautifulSoup
+from fastapi.responses import StreamingResponse
+
+from fediiverse.mastodon.models.status import Status
+from fediiverse.servers.olv import render_status_list_page, sanitizer, streaming, rendering
+from fediiverse.servers.olv.rendering import (
+	StatusListEntry, inline_emojify, beautifully_insert_content, render_status, load_template, render_profile, config
+)
+from fediiverse.servers.olv.sanitizer import sanitize_content
+from fediiverse.servers.olv.streaming import render_status_html, beautifully_render_content
+from fediiverse.storage import RenderingEngine
+from fediiverse.version import FEDIIVERSE_VERSION_STR
+
+from .fixtures import Fixture, load_fixtures
+
+LOCAL_USER_ID = "100001"
+UTC_OFFSET = datetime.timedelta(hours=2)
+
+# same limits as the status route
+ANCESTOR_LIMIT = 8
+DESCENDANT_LIMIT = 20
+
+WARMUP = 3
+
+CACHES = (
+	rendering.status_fragment_cache,
+	streaming.status_html_cache,
+	streaming.content_html_cache,
+	sanitizer.sanitized_content_cache,
+)
+
+TEMPLATES = {
+	"timeline": "timeline.html",
+	"context": "status.html",
+	"account": "profile.html",
+}
+
+
+@dataclass
+class Result:
+	fixture: str
+	stage: str
+	ops: int
+	ops_per_second: float
+	mean_us: float
+	p50_us: float
+	p95_us: float
+	p99_us: float
+
+	@property
+	def id(self) -> str:
+		return f"{self.fixture}:{self.stage}"
+
+
+# a stage is called with the index of the op, and returns a coroutine for async stages
+Stage = Callable[[int], Optional[Awaitable]]
+
+
+def disable_caches():
+	for cache in CACHES:
+		cache.max_size = 0
+		cache.clear()
+
+
+def get_text_nodes(nodes: list[sanitizer.ContentNode]) -> list[str]:
+	texts = []
+	for node in nodes:
+		if isinstance(node, str):
+			texts.append(node)
+		else:
+			texts.extend(get_text_nodes(node.children))
+	return texts
+
+
+def get_page_entries(fixture: Fixture) -> list[StatusListEntry]:
+	"""the entries the routes put on the fixture's page"""
+	if fixture.kind == "context":
+		context = fixture.context
+		return [
+			*(StatusListEntry(status) for status in context.ancestors[-ANCESTOR_LIMIT:]),
+			StatusListEntry(fixture.status, expanded=True, extra_class="main-status"),
+			*(StatusListEntry(status) for status in context.descendants[:DESCENDANT_LIMIT])
+		]
+	return [StatusListEntry(status) for status in fixture.statuses]
+
+
+async def read_page(soup: BeautifulSoup, entries: list[StatusListEntry], engine: RenderingEngine) -> str:
+	config.rendering.engine = engine
+	response = await render_status_list_page(soup, entries, user_id=LOCAL_USER_ID, utc_offset=UTC_OFFSET)
+	if isinstance(response, StreamingResponse):
+		return "".join([chunk async for chunk in response.body_iterator])
+	return response.body.decode()
+
+
+def get_stages(fixture: Fixture) -> dict[str, Stage]:
+	all_statuses = fixture.statuses
+	# boosts are rendered as the boosted status
+	statuses = [status.reblog or status for status in all_statuses]
+	contents = [status.content for status in statuses]
+	soup = BeautifulSoup("", "html.parser")
+
+	# the text of a status as inline_emojify sees it: its display name and every text node of its content
+	texts = [
+		(
+			[status.account.display_name, *get_text_nodes(sanitize_content(status.content))],
+			{custom_emoji.shortcode: custom_emoji for custom_emoji in status.emojis}
+		)
+		for status in statuses
+	]
+
+	def run_inline_emojify(index: int):
+		status_texts, shortcode_index = texts[index % len(texts)]
+		for text in status_texts:
+			inline_emojify(text, soup, shortcode_index=shortcode_index)
+
+	def run_sanitize_content(index: int):
+		sanitizer.sanitized_content_cache.pop(sanitizer.get_content_digest(contents[index % len(contents)]))
+		sanitize_content(contents[index % len(contents)])
+
+	def run_insert_content(index: int):
+		status = statuses[index % len(statuses)]
+		beautifully_insert_content(status.content, soup.new_tag("div"), status.emojis, soup)
+
+	def run_render_content_html(index: int):
+		status = statuses[index % len(statuses)]
+		beautifully_render_content(status.content, status.emojis)
+
+	def run_render_status(index: int):
+		status = all_statuses[index % len(all_statuses)]
+		render_status(status, soup.new_tag("div"), soup, local_user_id=LOCAL_USER_ID, utc_offset=UTC_OFFSET)
+
+	def run_render_status_html(index: int):
+		status = all_statuses[index % len(all_statuses)]
+		render_status_html(status, local_user_id=LOCAL_USER_ID, utc_offset=UTC_OFFSET)
+
+	template = TEMPLATES[fixture.kind]
+
+	async def run_load_template(_):
+		await load_template(template, user_id=LOCAL_USER_ID, is_miiverse=True)
+
+	stages: dict[str, Stage] = {
+		"inline_emojify": run_inline_emojify,
+		"sanitize_content": run_sanitize_content,
+		"insert_content/soup": run_insert_content,
+		"insert_content/streaming": run_render_content_html,
+		"status/soup": run_render_status,
+		"status/streaming": run_render_status_html,
+		"load_template": run_load_template,
+	}
+
+	if fixture.kind == "account":
+		account = fixture.account
+		mastodon = SimpleNamespace(accounts=SimpleNamespace(get_account_statuses=None))
+
+		async def get_account_statuses(**_) -> list[Status]:
+			return all_statuses
+
+		mastodon.accounts.get_account_statuses = get_account_statuses
+
+		async def run_render_profile(_):
+			await render_profile(account, mastodon=mastodon, user_id=LOCAL_USER_ID, is_miiverse=True)
+
+		stages["render_profile"] = run_render_profile
+
+		def make_page_stage(engine: RenderingEngine) -> Stage:
+			async def run_page(_):
+				profile_soup, timeline = await render_profile(
+					account,
+					mastodon=mastodon,
+					user_id=LOCAL_USER_ID,
+					is_miiverse=True
+				)
+				await read_page(profile_soup, [StatusListEntry(status) for status in timeline], engine)
+			return run_page
+	else:
+		entries = get_page_entries(fixture)
+
+		def make_page_stage(engine: RenderingEngine) -> Stage:
+			async def run_page(_):
+				page_soup = await load_template(template, user_id=LOCAL_USER_ID, is_miiverse=True)
+				await read_page(page_soup, entries, engine)
+			return run_page
+
+	for engine in RenderingEngine:
+		stages[f"page/{engine.value}"] = make_page_stage(engine)
+
+	return stages
+
+
+async def measure(stage: Stage, number: int) -> list[float]:
+	async def call(index: int):
+		result = stage(index)
+		if result is not None:
+			await result
+
+	for index in range(WARMUP):
+		await call(index)
+
+	durations = []
+	for index in range(number):
+		start_time = time.perf_counter()
+		await call(index)
+		durations.append(time.perf_counter() - start_time)
+	return durations
+
+
+def summarize(fixture: str, stage: str, durations: list[float]) -> Result:
+	percentiles = statistics.quantiles(durations, n=100, method="inclusive")
+	return Result(
+		fixture=fixture,
+		stage=stage,
+		ops=len(durations),
+		ops_per_second=len(durations) / sum(durations),
+		mean_us=statistics.fmean(durations) * 1e6,
+		p50_us=percentiles[49] * 1e6,
+		p95_us=percentiles[94] * 1e6,
+		p99_us=percentiles[98] * 1e6,
+	)
+
+
+async def run(number: int, filters: list[str]) -> list[Result]:
+	engine = config.rendering.engine
+	results = []
+	try:
+		for fixture in load_fixtures():
+			fixture_name = f"{fixture.flavor}/{fixture.name}"
+			for stage_name, stage in get_stages(fixture).items():
+				if filters and not any(text in f"{fixture_name}:{stage_name}" for text in filters):
+					continue
+
+				result = summarize(fixture_name, stage_name, await measure(stage, number))
+				results.append(result)
+				print(
+					f"{result.id:<52}{result.ops_per_second:>10.0f}{result.mean_us:>11.1f}"
+					f"{result.p50_us:>11.1f}{result.p95_us:>11.1f}{result.p99_us:>11.1f}"
+				)
+	finally:
+		config.rendering.engine = engine
+	return results
+
+
+def compare(results: list[Result], baseline_path: str, threshold: float) -> bool:
+	"""prints the change of every p50 against the baseline, returns whether anything regressed"""
+	with open(baseline_path, "r") as file:
+		baseline = {
+			f"{result['fixture']}:{result['stage']}": result
+			for result in json.load(file)["results"]
+		}
+
+	regressed = False
+	print()
+	print(f"{'benchmark':<52}{'baseline':>11}{'current':>11}{'change':>9}")
+	for result in results:
+		baseline_result = baseline.get(result.id)
+		if baseline_result is None:
+			continue
+
+		change = result.p50_us / baseline_result["p50_us"] - 1
+		is_regression = change > threshold
+		regressed = regressed or is_regression
+		print(
+			f"{result.id:<52}{baseline_result['p50_us']:>9.1f}us{result.p50_us:>9.1f}us{change:>+8.1%}"
+			f"{'  REGRESSION' if is_regression else ''}"
+		)
+	return regressed
+
+
+def main():
+	parser = argparse.ArgumentParser(description="fediiverse rendering benchmarks")
+	parser.add_argument("--number", type=int, default=200, help="ops per benchmark")
+	parser.add_argument("--filter", action="append", default=[], help="only run benchmarks whose name contains this")
+	parser.add_argument("--caches", action="store_true", help="keep the rendering caches enabled")
+	parser.add_argument("--json", help="write the results to this file")
+	parser.add_argument("--compare", help="compare p50 latencies against the results in this file")
+	parser.add_argument("--threshold", type=float, default=0.1, help="allowed p50 slowdown for --compare")
+	args = parser.parse_args()
+
+	if not args.caches:
+		disable_caches()
+
+	print(f"{'benchmark':<52}{'ops/s':>10}{'mean us':>11}{'p50 us':>11}{'p95 us':>11}{'p99 us':>11}")
+	results = asyncio.run(run(args.number, args.filter))
+
+	if args.json:
+		with open(args.json, "w") as file:
+			json.dump({
+				"meta": {
+					"fediiverse_version": FEDIIVERSE_VERSION_STR,
+					"python": platform.python_version(),
+					"platform": platform.platform(),
+					"cpu_count": os.cpu_count(),
+					"mode": config.mode.value,
+					"caches": args.caches,
+					"number": args.number,
+					"time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+				},
+				"results": [asdict(result) for result in results]
+			}, file, indent=2)
+
+	if args.compare and compare(results, args.compare, args.threshold):
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,126 @@
+"""
+
+A stand-in instance with a streaming api, for trying out the home timeline buffers without a real instance.
+It serves a home timeline made of synthetic statuses (slowed down by --delay, like a far away instance)
+and streams a new status to every connected user every --interval seconds.
+
+    python -m benchmarks.streaming_server [--port 8765] [--delay 0.3] [--interval 5]
+
+benchmarks.home_buffers starts one itself.
+
+"""
+import argparse
+import asyncio
+import json
+from typing import Any
+
+from aiohttp import web
+
+from .fixtures import make_status_data
+
+
+class StandInInstance:
+	def __init__(self, *, host: str = "127.0.0.1", port: int = 8765, delay: float = 0.3, flavor: str = "mastodon"):
+		self.host = host
+		self.port = port
+		self.delay = delay
+		self.flavor = flavor
+		self.statuses: list[dict[str, Any]] = []  # newest first
+		self.home_requests = 0
+		self._next_index = 0
+		self._websockets: set[web.WebSocketResponse] = set()
+		self._runner: web.AppRunner
+
+		for _ in range(40):
+			self.statuses.insert(0, self._make_status())
+
+		self.app = web.Application()
+		self.app.router.add_get("/api/v1/instance", self._get_instance)
+		self.app.router.add_get("/api/v1/timelines/home", self._get_home_timeline)
+		self.app.router.add_get("/api/v1/streaming", self._stream)
+
+	@property
+	def url(self) -> str:
+		return f"http://{self.host}:{self.port}"
+
+	def _make_status(self) -> dict[str, Any]:
+		# in the fixtures, lower indexes are newer statuses, like in a timeline
+		self._next_index += 1
+		return make_status_data(self.flavor, 1_000_000 - self._next_index, variant="mixed")
+
+	async def _get_instance(self, _: web.Request) -> web.Response:
+		return web.json_response({
+			"uri": f"{self.host}:{self.port}",
+			"title": "stand-in",
+			"description": "",
+			"email": "",
+			"version": "4.3.0",
+			"urls": {"streaming_api": f"ws://{self.host}:{self.port}"},
+			"stats": {},
+			"registrations": False
+		})
+
+	async def _get_home_timeline(self, request: web.Request) -> web.Response:
+		self.home_requests += 1
+		await asyncio.sleep(self.delay)
+		limit = int(request.query.get("limit", 20))
+		return web.json_response(self.statuses[:limit])
+
+	async def _stream(self, request: web.Request) -> web.WebSocketResponse:
+		websocket = web.WebSocketResponse()
+		await websocket.prepare(request)
+		self._websockets.add(websocket)
+		try:
+			async for _ in websocket:
+				pass
+		finally:
+			self._websockets.discard(websocket)
+		return websocket
+
+	async def _send(self, event: str, payload: str):
+		message = json.dumps({"stream": ["user"], "event": event, "payload": payload})
+		for websocket in list(self._websockets):
+			await websocket.send_str(message)
+
+	async def post(self) -> dict[str, Any]:
+		"""a new status on everyone's home timeline"""
+		status = self._make_status()
+		self.statuses.insert(0, status)
+		await self._send("update", json.dumps(status))
+		return status
+
+	async def delete(self, status_id: str):
+		self.statuses = [status for status in self.statuses if status["id"] != status_id]
+		await self._send("delete", status_id)
+
+	async def __aenter__(self):
+		self._runner = web.AppRunner(self.app)
+		await self._runner.setup()
+		await web.TCPSite(self._runner, self.host, self.port).start()
+		return self
+
+	async def __aexit__(self, *_):
+		await self._runner.cleanup()
+
+
+async def serve(port: int, delay: float, interval: float):
+	async with StandInInstance(port=port, delay=delay) as instance:
+		print(f"stand-in instance on {instance.url}")
+		while True:
+			await asyncio.sleep(interval)
+			status = await instance.post()
+			print(f"streamed status {status['id']}")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="a stand-in instance with a streaming api")
+	parser.add_argument("--port", type=int, default=8765)
+	parser.add_argument("--delay", type=float, default=0.3, help="seconds before the home timeline is sent")
+	parser.add_argument("--interval", type=float, default=5, help="seconds between streamed statuses")
+	args = parser.parse_args()
+
+	asyncio.run(serve(args.port, args.delay, args.interval))
+
+
+if __name__ == "__main__":
+	main()
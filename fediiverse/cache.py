@@ -0,0 +1,69 @@
+"""
+
+Small in-memory caches shared by the fediiverse servers.
+
+"""
+import threading
+from collections import OrderedDict
+from typing import Generic, TypeVar, Hashable, Optional
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# returned by LRUCache.get on a miss, so that None can be cached too
+MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+	"""
+	a bounded mapping that evicts the least recently used entry when full.
+	it's thread-safe, because rendering happens in executor threads.
+	a max_size of 0 disables the cache.
+	"""
+
+	def __init__(self, max_size: int):
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self._entries: OrderedDict[K, V] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key: K, default: Optional[V] | object = MISSING, *, count: bool = True) -> V | object:
+		"""count=False leaves the lookup out of hits and misses, for lookups that aren't about avoiding work"""
+		with self._lock:
+			try:
+				value = self._entries[key]
+			except KeyError:
+				if count:
+					self.misses += 1
+				return default
+
+			self._entries.move_to_end(key)
+			if count:
+				self.hits += 1
+			return value
+
+	def set(self, key: K, value: V):
+		if self.max_size <= 0:
+			return
+
+		with self._lock:
+			self._entries[key] = value
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+
+	def pop(self, key: K, default: Optional[V] | object = None) -> V | object:
+		with self._lock:
+			return self._entries.pop(key, default)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def __contains__(self, key: K) -> bool:
+		with self._lock:
+			return key in self._entries
+
+	def __len__(self) -> int:
+		return len(self._entries)
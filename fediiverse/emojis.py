@@ -0,0 +1,199 @@
+"""
+
+Rasterizes Twemoji SVGs (EMOJIS_PATH) to PNG.
+
+Rasterized emojis are cached in two tiers: a bounded in-memory LRU, and PNG files on disk in EMOJI_CACHE_PATH
+laid out as `{size}/{codepoints}.png`. run prewarm-emoji-cache.py to fill the disk cache ahead of time so
+rendering never has to touch cairo.
+
+The same layout is served by the olv server (and optionally nginx) at `/emoji/{size}/{codepoints}.png`
+when the emoji mode is URL.
+
+"""
+import functools
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional, Iterator
+
+import cairosvg
+import emoji as emoji_lib
+
+from .storage import EMOJIS_PATH, EMOJI_CACHE_PATH
+
+# every size (in px) the olv renderer asks for. prewarm_emoji_cache rasterizes all of them.
+EMOJI_SIZES = (16,)
+
+# ~500 bytes per 16px PNG, so this is around 2MB at most
+EMOJI_MEMORY_CACHE_SIZE = 4096
+
+
+def _build_character_class(chars: set[str]) -> str:
+	codepoints = sorted(ord(char) for char in chars)
+	ranges: list[list[int]] = []
+	for codepoint in codepoints:
+		if ranges and codepoint == ranges[-1][1] + 1:
+			ranges[-1][1] = codepoint
+		else:
+			ranges.append([codepoint, codepoint])
+
+	return "[" + "".join(
+		re.escape(chr(start)) if start == end else f"{re.escape(chr(start))}-{re.escape(chr(end))}"
+		for start, end in ranges
+	) + "]"
+
+
+def _build_trie_pattern(trie: dict) -> str:
+	alternatives = []
+	for char, child in sorted(trie.items()):
+		if char == "":
+			continue
+		child_pattern = _build_trie_pattern(child)
+		if not child_pattern:
+			alternatives.append(re.escape(char))
+		elif "" in child:
+			# this prefix is an emoji by itself, but try the longer sequences first
+			alternatives.append(f"{re.escape(char)}(?:{child_pattern})?")
+		else:
+			alternatives.append(f"{re.escape(char)}(?:{child_pattern})")
+	return "|".join(alternatives)
+
+
+def _build_emoji_pattern() -> re.Pattern:
+	trie: dict = {}
+	for emoji in emoji_lib.EMOJI_DATA:
+		node = trie
+		for char in emoji:
+			node = node.setdefault(char, {})
+		node[""] = True
+
+	# a regex shaped like a trie of every emoji sequence only has to check a few characters at every position,
+	# instead of every alternative. the lookaheads reject most non-emoji characters before we get there.
+	# the first one is deliberately coarse (it's fast), the second one is exact.
+	return re.compile(
+		":(?P<shortcode>[a-zA-Z0-9_]+):"
+		"|"
+		"(?=[#*0-9\u00a9\u00ae\u203c-\U0001faff])"
+		f"(?={_build_character_class(set(trie))})"
+		f"(?P<emoji>{_build_trie_pattern(trie)})"
+	)
+
+
+emoji_pattern = _build_emoji_pattern()
+
+
+def iter_emoji_matches(text: str, *, shortcodes: bool = False) -> Iterator[re.Match]:
+	"""
+	finds Unicode emojis (match["emoji"]) and, if shortcodes is True, custom emoji shortcodes (match["shortcode"])
+	in a single scan, in order.
+	"""
+	if text.isascii():
+		# no Unicode emoji is plain ASCII
+		if not shortcodes or ":" not in text:
+			return
+
+	for match in emoji_pattern.finditer(text):
+		if match.lastgroup == "shortcode" and not shortcodes:
+			continue
+		yield match
+
+
+def get_emoji_codepoints(emoji: str) -> str:
+	"""returns the Twemoji file name stem for an emoji, e.g. "1f469-200d-1f4bb" """
+	# remove variant selectors
+	if "\u200D" not in emoji:
+		emoji = emoji.replace("\uFE0F", "")
+
+	return "-".join(f"{ord(char):x}" for char in emoji)
+
+
+@functools.cache
+def get_available_emojis() -> frozenset[str]:
+	"""codepoint sequences of every emoji in EMOJIS_PATH"""
+	return frozenset(svg_path.stem for svg_path in EMOJIS_PATH.glob("*.svg"))
+
+
+def get_emoji_cache_path(codepoints: str, size: int) -> Path:
+	return EMOJI_CACHE_PATH / str(size) / f"{codepoints}.png"
+
+
+def get_emoji_url(codepoints: str, size: int) -> str:
+	return f"/emoji/{size}/{codepoints}.png"
+
+
+def rasterize_emoji(codepoints: str, size: int) -> Optional[bytes]:
+	svg_path = EMOJIS_PATH / f"{codepoints}.svg"
+	try:
+		with open(svg_path, "rb") as file:
+			svg_contents = file.read()
+	except FileNotFoundError:
+		return None
+
+	return cairosvg.svg2png(
+		output_width=size,
+		output_height=size,
+		bytestring=svg_contents
+	)
+
+
+def _write_cache_file(path: Path, data: bytes):
+	path.parent.mkdir(parents=True, exist_ok=True)
+
+	# write to a temporary file first so concurrent readers never see a partial PNG
+	temp_path = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}")
+	with open(temp_path, "wb") as file:
+		file.write(data)
+	os.replace(temp_path, path)
+
+
+@functools.lru_cache(maxsize=EMOJI_MEMORY_CACHE_SIZE)
+def get_emoji_png(codepoints: str, size: int) -> Optional[bytes]:
+	"""
+	returns the emoji as PNG data, or None if there is no Twemoji for it.
+	this is blocking, so call it from an executor.
+	"""
+	cache_path = get_emoji_cache_path(codepoints, size)
+	try:
+		with open(cache_path, "rb") as file:
+			return file.read()
+	except FileNotFoundError:
+		pass
+
+	png_data = rasterize_emoji(codepoints, size)
+	if png_data is None:
+		return None
+
+	try:
+		_write_cache_file(cache_path, png_data)
+	except OSError:
+		pass  # the disk cache is best-effort, we still have the PNG
+
+	return png_data
+
+
+def prewarm_emoji_cache(sizes: tuple[int, ...] = EMOJI_SIZES, log: bool = False) -> int:
+	"""rasterizes every emoji in EMOJIS_PATH at every size into the disk cache. returns the number of new files"""
+	svg_paths = sorted(EMOJIS_PATH.glob("*.svg"))
+	count = 0
+
+	for size in sizes:
+		if log:
+			print(f" -> {f'{len(svg_paths)} emojis at {size}px...':<36}", end="", flush=True)
+
+		for svg_path in svg_paths:
+			cache_path = get_emoji_cache_path(svg_path.stem, size)
+			if cache_path.exists():
+				continue
+
+			png_data = rasterize_emoji(svg_path.stem, size)
+			if png_data is None:
+				continue
+
+			_write_cache_file(cache_path, png_data)
+			count += 1
+
+		if log:
+			print("done!")
+
+	return count
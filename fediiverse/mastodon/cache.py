@@ -0,0 +1,57 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+
+from ..cache import LRUCache, MISSING
+
+
+@dataclass
+class CachedResponse:
+    response: aiohttp.ClientResponse  # already read, so it can be read again
+    etag: Optional[str]
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """
+    GET responses for resources that rarely change (the logged in account, preferences, instance info),
+    cached per user, meaning per access token. the least recently active users are evicted first,
+    and so are each user's least recently used responses past max_urls_per_user.
+
+    when a response expires it's revalidated with If-None-Match if the instance sent an ETag (otherwise it's
+    dropped), and a user's responses are dropped whenever we write anything as them.
+    """
+
+    def __init__(self, max_users: int, max_urls_per_user: int = 256):
+        self.max_urls_per_user = max_urls_per_user
+        # the None user, for requests without a token, has every instance the welcome server was asked about
+        self._users: LRUCache[Optional[str], LRUCache[str, CachedResponse]] = LRUCache(max_users)
+
+    def get(self, token: Optional[str], url: str) -> Optional[CachedResponse]:
+        responses = self._users.get(token)
+        if responses is MISSING:
+            return None
+        cached_response = responses.get(url)
+        if cached_response is MISSING:
+            return None
+        if not cached_response.is_fresh and not cached_response.etag:
+            # can't be revalidated, so it's no use anymore
+            responses.pop(url)
+            return None
+        return cached_response
+
+    def set(self, token: Optional[str], url: str, cached_response: CachedResponse):
+        responses = self._users.get(token)
+        if responses is MISSING:
+            responses = LRUCache(self.max_urls_per_user)
+            self._users.set(token, responses)
+        responses.set(url, cached_response)
+
+    def invalidate(self, token: Optional[str]):
+        self._users.pop(token)
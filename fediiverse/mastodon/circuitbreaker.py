@@ -0,0 +1,101 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+
+from ..cache import LRUCache, MISSING
+
+# what instances answer when they're down behind a reverse proxy, or overloaded
+UNAVAILABLE_STATUSES = {502, 503, 504}
+# probes get slower while an instance stays down, up to this many seconds apart
+MAX_PROBE_INTERVAL = 600
+
+
+class InstanceUnavailableError(aiohttp.ClientError):
+    """a request that wasn't sent because its instance is down. a ClientError, like a failed request"""
+
+    def __init__(self, host: str):
+        super().__init__(f"{host} is unavailable")
+        self.host = host
+
+
+@dataclass
+class Circuit:
+    failures: int = 0  # in a row
+    opened_at: Optional[float] = None  # time.monotonic(). None while requests go through
+    probe_task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class CircuitBreakers:
+    """
+    stops sending requests to instances that are down.
+
+    after max_failures failed requests in a row (connection errors, timeouts, 502/503/504), an instance's circuit
+    opens, and every request to it fails right away with InstanceUnavailableError instead of waiting for timeouts.
+    while it's open, one probe request is sent in the background every probe_interval seconds (more rarely the longer
+    it's down), and the circuit closes again as soon as one gets an answer. a max_failures of 0 disables this.
+    """
+
+    def __init__(self, max_failures: int, probe_interval: float, max_size: int = 4096):
+        self.max_failures = max_failures
+        self.probe_interval = probe_interval
+        self._circuits: LRUCache[str, Circuit] = LRUCache(max_size)
+        self._probe_tasks: set[asyncio.Task] = set()
+        self.opened = 0  # how many times a circuit was opened
+        self.rejected = 0  # how many requests weren't sent because of it
+
+    def is_open(self, host: str) -> bool:
+        circuit = self._circuits.get(host)
+        return circuit is not MISSING and circuit.opened_at is not None
+
+    def check(self, host: str, probe: Callable[[], Awaitable[bool]]):
+        """raises InstanceUnavailableError if host is down. probe() is how to check whether it's back up"""
+        circuit = self._circuits.get(host)
+        if circuit is MISSING or circuit.opened_at is None:
+            return
+
+        if circuit.probe_task is None or circuit.probe_task.done():
+            circuit.probe_task = asyncio.create_task(self._probe(circuit, probe))
+            self._probe_tasks.add(circuit.probe_task)
+            circuit.probe_task.add_done_callback(self._probe_tasks.discard)
+        self.rejected += 1
+        raise InstanceUnavailableError(host)
+
+    async def _probe(self, circuit: Circuit, probe: Callable[[], Awaitable[bool]]):
+        probe_interval = self.probe_interval
+        while circuit.opened_at is not None:
+            await asyncio.sleep(probe_interval)
+            try:
+                if await probe():
+                    circuit.failures = 0
+                    circuit.opened_at = None
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            probe_interval = min(probe_interval * 2, MAX_PROBE_INTERVAL)
+
+    def record_success(self, host: str):
+        circuit = self._circuits.get(host)
+        if circuit is not MISSING:
+            circuit.failures = 0
+            circuit.opened_at = None
+
+    def record_failure(self, host: str):
+        if self.max_failures <= 0:
+            return
+
+        circuit = self._circuits.get(host)
+        if circuit is MISSING:
+            circuit = Circuit()
+            self._circuits.set(host, circuit)
+        circuit.failures += 1
+        if circuit.opened_at is None and circuit.failures >= self.max_failures:
+            circuit.opened_at = time.monotonic()
+            self.opened += 1
+
+    def close(self):
+        """stops the probes, before the session they use is closed"""
+        for probe_task in self._probe_tasks:
+            probe_task.cancel()
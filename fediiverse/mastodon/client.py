@@ -1,34 +1,87 @@
-from typing import Optional
+from __future__ import annotations
+import asyncio
+import re
+import time
+from typing import Optional, TYPE_CHECKING
 
 import aiohttp
 from yarl import URL
 
+from .cache import ResponseCache, CachedResponse
+from .circuitbreaker import CircuitBreakers, UNAVAILABLE_STATUSES
+from .hedging import Attempt, Hedging
 from .providers.accounts import AccountsProvider
 from .providers.apps import AppsProvider
+from .providers.filters import FiltersProvider
 from .providers.instance import InstanceProvider
 from .providers.media import MediaProvider
 from .providers.notifications import NotificationsProvider
 from .providers.oauth import OAuthProvider
 from .providers.preferences import PreferencesProvider
 from .providers.statuses import StatusesProvider
+from .providers.streaming import StreamingProvider
 from .providers.timelines import TimelinesProvider
 from .providers.trends import TrendsProvider
+from .ratelimits import RateLimits, request_priority
+from .singleflight import SingleFlight
+from ..metrics import registry
+
+if TYPE_CHECKING:
+    from .pool import ClientPool
+
+CLIENT_TIMEOUT = aiohttp.ClientTimeout(
+    connect=30,  # max. 30 seconds for connection from pool
+    sock_connect=15,  # max. 15 seconds for socket to connect
+    sock_read=120,  # max. 2 minutes for data to be read
+)
+# checking if an instance that was down is back up shouldn't take long
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+# path segments that are ids: Mastodon's are numbers, GoToSocial's ULIDs, Akkoma's long base62 strings
+ID_SEGMENT_PATTERN = re.compile(r"^(?!v\d+$)(?=.*\d|[A-Za-z0-9]{16,}$).+$")
+
+upstream_request_duration = registry.histogram(
+    "fediiverse_upstream_request_duration_seconds",
+    "Time until an instance's whole response was read, by instance (or other) and endpoint",
+    ("instance", "endpoint")
+)
+upstream_responses = registry.counter(
+    "fediiverse_upstream_responses_total",
+    "Responses from instances by instance (or other), endpoint and status code, or timeout/error if there wasn't one",
+    ("instance", "endpoint", "status")
+)
+
+
+def get_endpoint_name(url: URL) -> str:
+    """the path of an api url with its ids left out, like v1/statuses/:id/context"""
+    return "/".join(
+        ":id" if ID_SEGMENT_PATTERN.match(segment) else segment
+        for segment in url.path.removeprefix("/api/").strip("/").split("/")
+    )
 
 
 class Client:
-    def __init__(self, host: str | URL, token: Optional[str] = None):
+    def __init__(self, host: str | URL, token: Optional[str] = None, *, pool: Optional[ClientPool] = None):
         self.host_url: URL = URL(host)
         self.base_url: URL = self.host_url / "api"
+        self.token: Optional[str] = token
 
-        self.session: aiohttp.ClientSession = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(
-                connect=30,  # max. 30 seconds for connection from pool
-                sock_connect=15,  # max. 15 seconds for socket to connect
-                sock_read=120,  # max. 2 minutes for data to be read
-            )
+        # clients from a pool share its session (and its connections), and don't close it
+        self._owns_session = pool is None
+        self.session: aiohttp.ClientSession = (
+            aiohttp.ClientSession(timeout=CLIENT_TIMEOUT) if pool is None else pool.session
+        )
+        # streaming connections stay open for a long time, so pools keep them out of the connection limits
+        self.streaming_session: aiohttp.ClientSession = self.session if pool is None else pool.streaming_session
+        self.response_cache: Optional[ResponseCache] = None if pool is None else pool.response_cache
+        # identical GETs that are in flight at the same time only go to the instance once
+        self.flights: SingleFlight[tuple, aiohttp.ClientResponse] = SingleFlight() if pool is None else pool.flights
+        self.rate_limits: RateLimits = RateLimits() if pool is None else pool.rate_limits
+        self.hedging: Hedging = Hedging(budget=0) if pool is None else pool.hedging
+        self.circuit_breakers: CircuitBreakers = (
+            CircuitBreakers(max_failures=0, probe_interval=0) if pool is None else pool.circuit_breakers
         )
-        if token:
-            self.set_token(token)
+        self.metric_instances: set[str] = set() if pool is None else pool.metric_instances
 
         self.notifications = NotificationsProvider(self)
         self.preferences = PreferencesProvider(self)
@@ -36,17 +89,145 @@ class Client:
         self.instance = InstanceProvider(self)
         self.statuses = StatusesProvider(self)
         self.accounts = AccountsProvider(self)
+        self.filters = FiltersProvider(self)
+        self.streaming = StreamingProvider(self)
         self.trends = TrendsProvider(self)
         self.media = MediaProvider(self)
         self.oauth = OAuthProvider(self)
         self.apps = AppsProvider(self)
 
     def set_token(self, token: str):
-        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.token = token
+
+    async def request(
+            self,
+            method: str,
+            url: URL,
+            *,
+            cache_ttl: Optional[float] = None,
+            hedge: Optional[str] = None,
+            **kwargs
+    ) -> aiohttp.ClientResponse:
+        """
+        sends a request as this client's user. GET requests with a cache_ttl (in seconds) are answered
+        from the pool's response cache while they're fresh, and revalidated with their ETag afterwards.
+        GET requests with a hedge (the name of their endpoint, like "statuses/context") are sent again
+        if they're slow for that endpoint, if the pool has hedging enabled
+        """
+        cache = self.response_cache if method == "GET" and cache_ttl else None
+        cached_response = cache.get(self.token, str(url)) if cache is not None else None
+        if cached_response is not None:
+            if cached_response.is_fresh:
+                return cached_response.response
+            if cached_response.etag:
+                kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": cached_response.etag}
+
+        # the token is sent per request, since the session may be shared with other users' clients
+        if self.token:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "Authorization": f"Bearer {self.token}"}
+
+        if method == "GET" and kwargs.keys() <= {"params", "headers"}:
+            # the Authorization header is part of the key, so only requests that would get the same answer are merged:
+            # the same user's, or unauthenticated ones. so is the priority, since a flight is sent with the priority
+            # of whoever started it, and a page load shouldn't wait on (or fail with) a background request
+            flight_key = (
+                str(url),
+                repr(kwargs.get("params")),
+                tuple(sorted(kwargs.get("headers", {}).items())),
+                request_priority.get()
+            )
+            response = await self.flights.run(flight_key, lambda: self._send_hedged(method, url, hedge, **kwargs))
+        else:
+            response = await self._send_hedged(method, url, hedge, **kwargs)
+
+        if cache is not None:
+            if response.status == 304 and cached_response is not None:
+                # not modified, so the cached response is good for another cache_ttl
+                cached_response.expires_at = time.monotonic() + cache_ttl
+                return cached_response.response
+            if response.status == 200:
+                cache.set(self.token, str(url), CachedResponse(
+                    response=response,
+                    etag=response.headers.get("ETag"),
+                    expires_at=time.monotonic() + cache_ttl
+                ))
+        elif method != "GET" and self.token and self.response_cache is not None and response.ok:
+            # anything we change as this user could be in their cached responses
+            self.response_cache.invalidate(self.token)
+
+        return response
+
+    async def _send_hedged(self, method: str, url: URL, hedge: Optional[str], **kwargs) -> aiohttp.ClientResponse:
+        if hedge is None or method != "GET":
+            return await self._send(method, url, **kwargs)
+        return await self.hedging.run(
+            (self.host_url.host, hedge),
+            lambda attempt: self._send(method, url, attempt=attempt, **kwargs)
+        )
+
+    async def _send(
+            self,
+            method: str,
+            url: URL,
+            *,
+            retry: bool = True,
+            attempt: Optional[Attempt] = None,
+            **kwargs
+    ) -> aiohttp.ClientResponse:
+        host = self.host_url.host
+        self.check_available()
+        await self.rate_limits.acquire(host, self.token)
+        if attempt is not None:
+            attempt.mark_sent()
+
+        endpoint = get_endpoint_name(url)
+        instance = host if host in self.metric_instances else "other"
+        start_time = time.perf_counter()
+        try:
+            response = await self.session.request(method=method, url=url, **kwargs)
+            # read the body right away, so the connection goes back to the pool even if nobody reads the response
+            # (and so that a response can be handed to more than one caller)
+            await response.read()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            self.circuit_breakers.record_failure(host)
+            upstream_responses.inc(instance, endpoint, "timeout" if isinstance(error, asyncio.TimeoutError) else "error")
+            raise
+        upstream_request_duration.observe(time.perf_counter() - start_time, instance, endpoint)
+        upstream_responses.inc(instance, endpoint, str(response.status))
+        if response.status in UNAVAILABLE_STATUSES:
+            self.circuit_breakers.record_failure(host)
+        else:
+            self.circuit_breakers.record_success(host)
+        self.rate_limits.update(host, self.token, response)
+
+        if response.status == 429 and method == "GET" and retry:
+            # if the limit resets soon, a page load is better off waiting for it than showing an error
+            retry_delay = self.rate_limits.get_retry_delay(host, self.token, response)
+            if retry_delay is not None:
+                self.rate_limits.retried += 1
+                await asyncio.sleep(retry_delay)
+                return await self._send(method, url, retry=False, attempt=attempt, **kwargs)
+
+        return response
+
+    def check_available(self):
+        """
+        raises InstanceUnavailableError if the instance has been down lately,
+        so requests to it fail right away instead of waiting for it to time out
+        """
+        self.circuit_breakers.check(self.host_url.host, self._probe)
+
+    async def _probe(self) -> bool:
+        """whether the instance answers at all, for the circuit breaker"""
+        async with self.session.get(self.base_url / "v1" / "instance", timeout=PROBE_TIMEOUT) as response:
+            return response.status not in UNAVAILABLE_STATUSES
 
     async def __aenter__(self):
-        await self.session.__aenter__()
+        if self._owns_session:
+            await self.session.__aenter__()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.session.__aexit__(exc_type, exc_val, exc_tb)
+        if self._owns_session:
+            self.circuit_breakers.close()
+            await self.session.__aexit__(exc_type, exc_val, exc_tb)
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+from ..cache import LRUCache, MISSING
+from .ratelimits import RequestPriority, request_priority
+
+T = TypeVar("T")
+
+# latencies kept per endpoint, and how many we need before we trust the percentile
+SAMPLE_COUNT = 200
+MIN_SAMPLES = 20
+# the most hedges that can be saved up, so a quiet hour doesn't turn into a burst of hedges after it
+MAX_BUDGET_TOKENS = 10
+
+
+@dataclass
+class Attempt:
+    """one copy of a hedged request. the function calls mark_sent() once it's past the rate limits"""
+    sent_at: Optional[float] = None  # time.monotonic()
+    sent: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def mark_sent(self):
+        self.sent_at = time.monotonic()
+        self.sent.set()
+
+
+class Hedging:
+    """
+    sends a second copy of a request that takes longer than the percentile of its endpoint's latency,
+    and uses whichever answer comes first. only for requests that can safely be sent twice (GETs).
+
+    every request earns `budget` of a hedge, and a hedge costs one, so there are at most
+    budget * requests extra requests (e.g. 0.05 = 5% more). a budget of 0 disables hedging.
+    """
+
+    def __init__(self, budget: float, percentile: float = 95, max_size: int = 4096):
+        self.budget = budget
+        self.percentile = percentile
+        # (instance, endpoint) -> its latest latencies
+        self._latencies: LRUCache[Hashable, deque[float]] = LRUCache(max_size)
+        self._budget_tokens = 0.0
+        self.requests = 0
+        self.hedged = 0  # how many requests got a second copy
+        self.won = 0  # how many of those copies answered first
+
+    def get_hedge_delay(self, key: Hashable) -> Optional[float]:
+        """how long to wait for a request before hedging it. None if we don't know the endpoint well enough yet"""
+        latencies = self._latencies.get(key)
+        if latencies is MISSING or len(latencies) < MIN_SAMPLES:
+            return None
+        ordered_latencies = sorted(latencies)
+        return ordered_latencies[min(int(len(ordered_latencies) * self.percentile / 100), len(ordered_latencies) - 1)]
+
+    def _record(self, key: Hashable, latency: float):
+        latencies = self._latencies.get(key)
+        if latencies is MISSING:
+            latencies = deque(maxlen=SAMPLE_COUNT)
+            self._latencies.set(key, latencies)
+        latencies.append(latency)
+
+    async def _race(self, primary: asyncio.Task[T], hedge: asyncio.Task[T]) -> asyncio.Task[T]:
+        """the task whose answer to use"""
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.won += 1
+                        return task
+            # both failed, so it's probably not just a slow request
+            return primary
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _wait_until_sent(primary: asyncio.Task, attempt: Attempt):
+        """until the primary is past the rate limits, or done without getting there"""
+        sent_task = asyncio.ensure_future(attempt.sent.wait())
+        try:
+            await asyncio.wait([primary, sent_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sent_task.cancel()
+
+    async def run(self, key: Hashable, function: Callable[[Attempt], Awaitable[T]]) -> T:
+        """
+        calls function(), and calls it again if it's slow for its key (an instance and endpoint).
+        latencies (and the hedge delay) are measured from the attempt's sent_at, so waiting for the rate limit
+        doesn't count. a request that's still waiting for it isn't slow, and a hedge would only wait behind it
+        """
+        if self.budget <= 0 or request_priority.get() == RequestPriority.BACKGROUND:
+            # nobody is waiting for background requests, so they don't need to be fast
+            return await function(Attempt())
+
+        self.requests += 1
+        self._budget_tokens = min(self._budget_tokens + self.budget, MAX_BUDGET_TOKENS)
+        hedge_delay = self.get_hedge_delay(key)
+
+        attempt = Attempt()
+        primary = asyncio.ensure_future(function(attempt))
+        hedge_won = False
+        try:
+            if hedge_delay is not None:
+                await self._wait_until_sent(primary, attempt)
+                done, _ = await asyncio.wait([primary], timeout=hedge_delay)
+                if not done and self._budget_tokens >= 1:
+                    self._budget_tokens -= 1
+                    self.hedged += 1
+                    hedge = asyncio.ensure_future(function(Attempt()))
+                    winner = await self._race(primary, hedge)
+                    hedge_won = winner is hedge
+                    return winner.result()
+            return await primary
+        finally:
+            if not primary.done():
+                # cancelled, either because the hedge won or because our caller was
+                primary.cancel()
+                if hedge_won and attempt.sent_at is not None:
+                    # the first request would have taken at least this long
+                    self._record(key, time.monotonic() - attempt.sent_at)
+            elif not primary.cancelled() and primary.exception() is None and attempt.sent_at is not None:
+                # errors don't say much about latency
+                self._record(key, time.monotonic() - attempt.sent_at)
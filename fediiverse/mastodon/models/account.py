@@ -2,7 +2,7 @@ from __future__ import annotations
 from datetime import datetime, date
 from typing import Optional
 
-from pydantic import BaseModel, HttpUrl, field_validator
+from pydantic import BaseModel, field_validator
 
 from .custom_emoji import CustomEmoji
 
@@ -17,13 +17,13 @@ class Account(BaseModel):
     id: str
     username: str
     acct: str
-    url: HttpUrl
+    url: str
     display_name: str
     note: str
-    avatar: HttpUrl
-    avatar_static: HttpUrl
-    header: HttpUrl
-    header_static: HttpUrl
+    avatar: str
+    avatar_static: str
+    header: str
+    header_static: str
     locked: bool
     fields: list[AccountField]
     emojis: list[CustomEmoji]
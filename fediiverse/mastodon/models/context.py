@@ -1,8 +1,52 @@
-from pydantic import BaseModel
+from typing import Any, Sequence, overload
 
 from .status import Status
 
 
-class Context(BaseModel):
-	ancestors: list[Status]
-	descendants: list[Status]
+class LazyStatusList(Sequence[Status]):
+	"""
+	a list of statuses that keeps the raw JSON items, and only validates the ones that are accessed.
+	slicing it returns a plain list of statuses
+	"""
+
+	def __init__(self, items: list[dict[str, Any]]):
+		self._items = items
+		self._statuses: dict[int, Status] = {}
+
+	def __len__(self) -> int:
+		return len(self._items)
+
+	def _get_status(self, index: int) -> Status:
+		status = self._statuses.get(index)
+		if status is None:
+			status = Status.model_validate(self._items[index])
+			self._statuses[index] = status
+		return status
+
+	@overload
+	def __getitem__(self, index: int) -> Status: ...
+
+	@overload
+	def __getitem__(self, index: slice) -> list[Status]: ...
+
+	def __getitem__(self, index: int | slice) -> Status | list[Status]:
+		# range() handles negative indexes and out of range slices exactly like a list would
+		indexes = range(len(self._items))[index]
+		if isinstance(index, slice):
+			return [self._get_status(item_index) for item_index in indexes]
+		return self._get_status(indexes)
+
+
+class Context:
+	"""
+	the ancestors and descendants of a status. popular threads have hundreds of descendants but a page only shows
+	a few of them, so statuses are only validated once they're accessed.
+	"""
+
+	def __init__(self, ancestors: list[dict[str, Any]], descendants: list[dict[str, Any]]):
+		self.ancestors = LazyStatusList(ancestors)
+		self.descendants = LazyStatusList(descendants)
+
+	@classmethod
+	def from_data(cls, data: dict[str, Any]) -> "Context":
+		return cls(ancestors=data["ancestors"], descendants=data["descendants"])
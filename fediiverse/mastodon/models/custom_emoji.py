@@ -1,11 +1,11 @@
 from typing import Optional
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel
 
 
 class CustomEmoji(BaseModel):
     shortcode: str
-    url: HttpUrl
-    static_url: HttpUrl
+    url: str
+    static_url: str
     visible_in_picker: bool
     category: Optional[str] = None
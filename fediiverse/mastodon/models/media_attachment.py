@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import Optional, Any
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel
 
 
 class MediaAttachmentType(Enum):
@@ -15,9 +15,9 @@ class MediaAttachmentType(Enum):
 class MediaAttachment(BaseModel):
 	id: str
 	type: MediaAttachmentType
-	url: HttpUrl
-	preview_url: Optional[HttpUrl] = None
-	remote_url: Optional[HttpUrl] = None
+	url: str
+	preview_url: Optional[str] = None
+	remote_url: Optional[str] = None
 	meta: Optional[dict[str, Any]] = None
 	description: Optional[str] = None
 	blurhash: Optional[str] = None
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from typing import Optional, Any
 
-from pydantic import BaseModel, HttpUrl, field_validator
+from pydantic import BaseModel, field_validator
 from datetime import datetime
 from enum import Enum
 
@@ -21,24 +21,26 @@ class StatusVisibility(Enum):
 
 class StatusApplication(BaseModel):
     name: str
-    website: Optional[HttpUrl]
+    website: Optional[str]
 
 
 class StatusMention(BaseModel):
     id: str
     username: str
-    url: HttpUrl
+    url: str
     acct: str
 
 
 class StatusTag(BaseModel):
     name: str
-    url: HttpUrl
+    url: str
 
 
+# urls in statuses (and their accounts, emojis and media) are kept as plain strings. validating every one of them
+# on every page is slow, and the img proxy validates the ones it actually fetches
 class Status(BaseModel):
     id: str
-    uri: HttpUrl
+    uri: str
     created_at: datetime
     account: Account
     content: str
@@ -53,7 +55,7 @@ class Status(BaseModel):
     reblogs_count: int
     favourites_count: int
     replies_count: int
-    url: Optional[HttpUrl] = None
+    url: Optional[str] = None
     in_reply_to_id: Optional[str] = None
     in_reply_to_account_id: Optional[str] = None
     reblog: Optional[Status] = None
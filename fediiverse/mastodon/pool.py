@@ -0,0 +1,104 @@
+from typing import Optional
+
+import aiohttp
+from yarl import URL
+
+from .cache import ResponseCache
+from .circuitbreaker import CircuitBreakers
+from .client import Client, CLIENT_TIMEOUT
+from .hedging import Hedging
+from .ratelimits import RateLimits
+from .singleflight import SingleFlight
+from ..metrics import registry, register_flights
+
+rate_limited_requests = registry.collected(
+    "fediiverse_upstream_rate_limited_requests_total",
+    "Requests that were delayed or skipped to stay under a rate limit, or retried after running into one",
+    ("action",)
+)
+hedges = registry.collected(
+    "fediiverse_upstream_hedges_total",
+    "Second copies of slow requests that were sent, and that answered first",
+    ("result",)
+)
+circuit_breaks = registry.collected(
+    "fediiverse_upstream_circuit_breaks_total",
+    "Times an instance was considered down, and requests that weren't sent because of it",
+    ("event",)
+)
+
+
+class ClientPool:
+    """
+    one long-lived aiohttp session shared by many clients, so that connections to instances are kept alive
+    and reused between requests instead of doing a new TCP and TLS handshake every time.
+    use it with `async with`, and get clients from it with `client()`.
+    """
+
+    def __init__(
+            self,
+            *,
+            limit: int = 100,
+            limit_per_host: int = 16,
+            keepalive_timeout: float = 30,
+            response_cache_size: int = 1024,
+            hedge_budget: float = 0,
+            hedge_percentile: float = 95,
+            circuit_breaker_failures: int = 5,
+            circuit_breaker_probe_interval: float = 30
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.session: aiohttp.ClientSession
+        self.streaming_session: aiohttp.ClientSession
+        # the users (access tokens) whose rarely-changing responses are cached. 0 disables the cache
+        self.response_cache = ResponseCache(response_cache_size)
+        # identical GETs in flight at the same time, across all clients. see Client.request
+        self.flights: SingleFlight[tuple, aiohttp.ClientResponse] = SingleFlight()
+        # what's left of the rate limit of each instance, per user. see RateLimits
+        self.rate_limits = RateLimits()
+        # second copies of slow GETs, at most hedge_budget of all requests. 0 disables them
+        self.hedging = Hedging(budget=hedge_budget, percentile=hedge_percentile)
+        # instances whose requests are labelled with their name on /metrics, the ones users can log in to.
+        # everything else is "other", since anyone can make the welcome server look up any domain
+        self.metric_instances: set[str] = set()
+        # instances that are down get no requests until they answer again. 0 failures disables this
+        self.circuit_breakers = CircuitBreakers(
+            max_failures=circuit_breaker_failures,
+            probe_interval=circuit_breaker_probe_interval
+        )
+
+    def register_metrics(self):
+        """exports this pool's counters on /metrics"""
+        register_flights("upstream", self.flights)
+        rate_limited_requests.add("delayed", get_value=lambda: self.rate_limits.delayed)
+        rate_limited_requests.add("skipped", get_value=lambda: self.rate_limits.skipped)
+        rate_limited_requests.add("retried", get_value=lambda: self.rate_limits.retried)
+        hedges.add("sent", get_value=lambda: self.hedging.hedged)
+        hedges.add("won", get_value=lambda: self.hedging.won)
+        circuit_breaks.add("opened", get_value=lambda: self.circuit_breakers.opened)
+        circuit_breaks.add("rejected", get_value=lambda: self.circuit_breakers.rejected)
+
+    def client(self, host: str | URL, token: Optional[str] = None) -> Client:
+        return Client(host, token, pool=self)
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout
+            ),
+            timeout=CLIENT_TIMEOUT
+        )
+        self.streaming_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),
+            timeout=aiohttp.ClientTimeout(connect=CLIENT_TIMEOUT.connect, sock_connect=CLIENT_TIMEOUT.sock_connect)
+        )
+        return self
+
+    async def __aexit__(self, *_):
+        self.circuit_breakers.close()
+        await self.streaming_session.close()
+        await self.session.close()
@@ -1,17 +1,30 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+import functools
+from typing import TYPE_CHECKING, TypeVar, Any
+
+import aiohttp
+import orjson
+from pydantic import TypeAdapter
+from yarl import URL
 
 if TYPE_CHECKING:
     from ..client import Client
 
+T = TypeVar("T")
+
+
+@functools.cache
+def get_type_adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
 
 class BaseProvider:
     def __init__(self, client: Client):
         self._client = client
 
     @property
-    def _session(self):
-        return self._client.session
+    def _request(self):
+        return self._client.request
 
     @property
     def _base_url(self):
@@ -20,3 +33,36 @@ class BaseProvider:
     @property
     def _host_url(self):
         return self._client.host_url
+
+    @staticmethod
+    async def _read_json(response: aiohttp.ClientResponse) -> Any:
+        try:
+            return orjson.loads(await response.read())
+        except orjson.JSONDecodeError:
+            # same error as response.json(), for instances that answer with an HTML page
+            raise aiohttp.ContentTypeError(
+                response.request_info,
+                response.history,
+                status=response.status,
+                message="Attempt to decode JSON with unexpected body",
+                headers=response.headers
+            ) from None
+
+    @staticmethod
+    async def _decode(response: aiohttp.ClientResponse, response_type: type[T]) -> T:
+        # decodes the raw body with orjson and validates all of it in one pass, nested models included
+        return get_type_adapter(response_type).validate_python(await BaseProvider._read_json(response))
+
+    async def _get_pages(self, url: URL, item_type: type[T], *, max_pages: int) -> list[T]:
+        """GETs a paginated list, following its Link headers for up to max_pages pages"""
+        items = []
+        for _ in range(max_pages):
+            response = await self._request(method="GET", url=url)
+            response.raise_for_status()
+            items.extend(await self._decode(response, list[item_type]))
+
+            next_link = response.links.get("next")
+            if next_link is None:
+                break
+            url = URL(next_link["url"])
+        return items
@@ -4,33 +4,42 @@ from ._base import BaseProvider
 from ..models.account import Account
 from ..models.status import Status
 
+# the logged in account. it's revalidated with its ETag after this, which is cheap
+LOCAL_ACCOUNT_CACHE_TTL = 60
+
+# people with more blocks or mutes than this don't get all of them, 80 is the most the api gives per page
+BLOCKS_MAX_PAGES = 10
+
 
 class AccountsProvider(BaseProvider):
 	async def get_local_account(self) -> Account:
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "accounts" / "verify_credentials"
+			url=self._base_url / "v1" / "accounts" / "verify_credentials",
+			cache_ttl=LOCAL_ACCOUNT_CACHE_TTL
 		)
 		response.raise_for_status()
-		return Account(**(await response.json()))
+		return await self._decode(response, Account)
 
 	async def lookup_account(self, acct: str) -> Account:
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
 			url=self._base_url / "v1" / "accounts" / "lookup" % {
 				"acct": acct
-			}
+			},
+			hedge="accounts/lookup"
 		)
 		response.raise_for_status()
-		return Account(**(await response.json()))
+		return await self._decode(response, Account)
 
 	async def get_account(self, account_id: str) -> Account:
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "accounts" / account_id
+			url=self._base_url / "v1" / "accounts" / account_id,
+			hedge="accounts"
 		)
 		response.raise_for_status()
-		return Account(**(await response.json()))
+		return await self._decode(response, Account)
 
 	async def get_account_statuses(
 		self,
@@ -63,9 +72,31 @@ class AccountsProvider(BaseProvider):
 		if tagged is not None:
 			params["tagged"] = tagged
 
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "accounts" / account_id / "statuses" % params
+			url=self._base_url / "v1" / "accounts" / account_id / "statuses" % params,
+			hedge="accounts/statuses"
 		)
 		response.raise_for_status()
-		return [Status(**data) for data in await response.json()]
+		return await self._decode(response, list[Status])
+
+	async def get_blocks(self) -> list[Account]:
+		return await self._get_pages(
+			self._base_url / "v1" / "blocks" % {"limit": 80},
+			Account,
+			max_pages=BLOCKS_MAX_PAGES
+		)
+
+	async def get_mutes(self) -> list[Account]:
+		return await self._get_pages(
+			self._base_url / "v1" / "mutes" % {"limit": 80},
+			Account,
+			max_pages=BLOCKS_MAX_PAGES
+		)
+
+	async def get_domain_blocks(self) -> list[str]:
+		return await self._get_pages(
+			self._base_url / "v1" / "domain_blocks" % {"limit": 200},
+			str,
+			max_pages=BLOCKS_MAX_PAGES
+		)
@@ -23,7 +23,7 @@ class AppsProvider(BaseProvider):
 		if website:
 			data["website"] = website
 
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "apps",
 			data=data
@@ -0,0 +1,12 @@
+from ._base import BaseProvider
+from ..models.filter import Filter
+
+
+class FiltersProvider(BaseProvider):
+	async def get_filters(self) -> list[Filter]:
+		response = await self._request(
+			method="GET",
+			url=self._base_url / "v2" / "filters"
+		)
+		response.raise_for_status()
+		return await self._decode(response, list[Filter])
@@ -37,10 +37,10 @@ class MediaProvider(BaseProvider):
 				focus_part = multipart.append(f"{focus[0]},{focus[1]}")
 				focus_part.set_content_disposition("form-data", name="focus")
 
-			response = await self._session.request(
+			response = await self._request(
 				method="POST",
 				url=self._base_url / "v2" / "media",
 				data=multipart
 			)
 			response.raise_for_status()
-			return MediaAttachment(**(await response.json()))
+			return await self._decode(response, MediaAttachment)
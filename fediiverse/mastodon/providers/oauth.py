@@ -40,7 +40,7 @@ class OAuthProvider(BaseProvider):
 		code_verifier: Optional[str] = None,
 		scope: Optional[list[str]] = None
 	) -> AccessTokenResponse:
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._host_url / "oauth" / "token",
 			json={
@@ -54,7 +54,7 @@ class OAuthProvider(BaseProvider):
 			}
 		)
 		response.raise_for_status()
-		return AccessTokenResponse(**await response.json())
+		return await self._decode(response, AccessTokenResponse)
 
 	async def revoke_access_token(
 			self,
@@ -63,7 +63,7 @@ class OAuthProvider(BaseProvider):
 			client_secret: str,
 			token: str
 	):
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._host_url / "oauth" / "revoke",
 			json={
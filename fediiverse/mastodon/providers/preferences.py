@@ -2,12 +2,16 @@ from typing import Any
 
 from ._base import BaseProvider
 
+# preferences can only be changed in the instance's own web interface
+PREFERENCES_CACHE_TTL = 300
+
 
 class PreferencesProvider(BaseProvider):
 	async def get_preferences(self) -> dict[str, Any]:
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "preferences"
+			url=self._base_url / "v1" / "preferences",
+			cache_ttl=PREFERENCES_CACHE_TTL
 		)
 		response.raise_for_status()
 		return await response.json()
@@ -29,29 +29,43 @@ class StatusesProvider(BaseProvider):
 			"language": language
 		}
 		request = filter_nulls_from_dict(request)
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses",
 			json=request
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def get(self, status_id: str) -> Status:
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "statuses" / status_id
+			url=self._base_url / "v1" / "statuses" / status_id,
+			hedge="statuses"
+		)
+		response.raise_for_status()
+		return await self._decode(response, Status)
+
+	async def get_many(self, status_ids: list[str]) -> list[Status]:
+		"""
+		several statuses in one request (Mastodon 4.3+). statuses the user can't see, or that are gone, are left out.
+		instances without this endpoint answer with a 404
+		"""
+		response = await self._request(
+			method="GET",
+			url=self._base_url / "v1" / "statuses" % [("id[]", status_id) for status_id in status_ids]
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, list[Status])
 
 	async def get_context(self, status_id: str) -> Context:
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "statuses" / status_id / "context"
+			url=self._base_url / "v1" / "statuses" / status_id / "context",
+			hedge="statuses/context"
 		)
 		response.raise_for_status()
-		return Context(**(await response.json()))
+		return Context.from_data(await self._read_json(response))
 
 	async def reblog(
 			self,
@@ -63,55 +77,55 @@ class StatusesProvider(BaseProvider):
 		if visibility is not None:
 			data["visibility"] = visibility
 
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses" / status_id / "reblog"
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def unreblog(self, status_id: str) -> Status:
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses" / status_id / "unreblog"
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def bookmark(self, status_id: str) -> Status:
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses" / status_id / "bookmark"
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def unbookmark(self, status_id: str) -> Status:
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses" / status_id / "unbookmark"
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def favourite(self, status_id: str) -> Status:
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses" / status_id / "favourite"
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def unfavourite(self, status_id: str) -> Status:
-		response = await self._session.request(
+		response = await self._request(
 			method="POST",
 			url=self._base_url / "v1" / "statuses" / status_id / "unfavourite"
 		)
 		response.raise_for_status()
-		return Status(**(await response.json()))
+		return await self._decode(response, Status)
 
 	async def delete(self, status_id: str) -> None:
-		response = await self._session.request(
+		response = await self._request(
 			method="DELETE",
 			url=self._base_url / "v1" / "statuses" / status_id
 		)
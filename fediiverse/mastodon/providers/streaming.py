@@ -0,0 +1,48 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiohttp
+import orjson
+from yarl import URL
+
+from ._base import BaseProvider
+
+# the instance pings every 15 seconds or so, so if we haven't heard from it in a while the connection is dead
+STREAMING_HEARTBEAT = 30
+
+
+class Stream:
+	"""an open streaming api connection. iterate over it to get (event, payload) pairs"""
+
+	def __init__(self, websocket: aiohttp.ClientWebSocketResponse):
+		self._websocket = websocket
+
+	async def __aiter__(self) -> AsyncIterator[tuple[str, Optional[str]]]:
+		async for message in self._websocket:
+			if message.type == aiohttp.WSMsgType.TEXT:
+				data = orjson.loads(message.data)
+				# the payload is JSON in a string, e.g. the status of an "update" event
+				yield data["event"], data.get("payload")
+			elif message.type == aiohttp.WSMsgType.ERROR:
+				raise self._websocket.exception()
+
+
+class StreamingProvider(BaseProvider):
+	async def get_streaming_url(self) -> URL:
+		# the streaming api can be on a different host than the rest of the api
+		instance = await self._client.instance.get_instance_v1()
+		streaming_api_url = instance.urls.get("streaming_api")
+		if streaming_api_url:
+			return URL(streaming_api_url) / "api" / "v1" / "streaming"
+		return self._host_url.with_scheme("ws" if self._host_url.scheme == "http" else "wss") / "api" / "v1" / "streaming"
+
+	@asynccontextmanager
+	async def connect(self, stream: str) -> AsyncIterator[Stream]:
+		self._client.check_available()
+		headers = {"Authorization": f"Bearer {self._client.token}"} if self._client.token else {}
+		async with self._client.streaming_session.ws_connect(
+			await self.get_streaming_url() % {"stream": stream},
+			headers=headers,
+			heartbeat=STREAMING_HEARTBEAT
+		) as websocket:
+			yield Stream(websocket)
@@ -29,12 +29,13 @@ class TimelinesProvider(BaseProvider):
 		if limit is not None:
 			params["limit"] = str(limit)
 
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "timelines" / "public" % params
+			url=self._base_url / "v1" / "timelines" / "public" % params,
+			hedge="timelines/public"
 		)
 		response.raise_for_status()
-		return [Status(**data) for data in await response.json()]
+		return await self._decode(response, list[Status])
 
 	async def get_home_timeline(
 		self,
@@ -53,9 +54,10 @@ class TimelinesProvider(BaseProvider):
 		if limit is not None:
 			params["limit"] = limit
 
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "timelines" / "home" % params
+			url=self._base_url / "v1" / "timelines" / "home" % params,
+			hedge="timelines/home"
 		)
 		response.raise_for_status()
-		return [Status(**data) for data in await response.json()]
+		return await self._decode(response, list[Status])
@@ -16,9 +16,10 @@ class TrendsProvider(BaseProvider):
 		if offset is not None:
 			params["offset"] = offset
 
-		response = await self._session.request(
+		response = await self._request(
 			method="GET",
-			url=self._base_url / "v1" / "trends" / "statuses" % params
+			url=self._base_url / "v1" / "trends" / "statuses" % params,
+			hedge="trends/statuses"
 		)
 		response.raise_for_status()
-		return [Status(**data) for data in await response.json()]
+		return await self._decode(response, list[Status])
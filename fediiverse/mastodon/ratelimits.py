@@ -0,0 +1,175 @@
+import asyncio
+import datetime
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+import aiohttp
+
+from ..cache import LRUCache, MISSING
+
+# when this much of a window is left, background requests are spread out over the rest of it,
+# instead of using up their share right away
+SPREAD_THRESHOLD = 0.5
+# background requests stop when this much is left, so what's left is for page loads
+BACKGROUND_RESERVE = 0.3
+# nothing waits longer than this for a rate limit. anything that would have to is not sent at all
+MAX_DELAY = 10
+
+
+class RequestPriority(Enum):
+    INTERACTIVE = "INTERACTIVE"  # someone is waiting for it
+    BACKGROUND = "BACKGROUND"  # prefetches and such, nobody is waiting for these
+
+
+# the priority of the requests made in the current context. set it in background tasks
+request_priority: ContextVar[RequestPriority] = ContextVar("request_priority", default=RequestPriority.INTERACTIVE)
+
+
+class RateLimitedError(aiohttp.ClientError):
+    """
+    a request that wasn't sent because of the rate limit: a background one saving the rest of it for page loads,
+    or a page load when it's used up for longer than MAX_DELAY. a ClientError, like a failed request
+    """
+
+    def __init__(self, host: str, message: str):
+        super().__init__(message)
+        self.host = host
+
+
+def parse_reset(reset: str) -> Optional[float]:
+    """X-RateLimit-Reset as seconds from now. Mastodon and GoToSocial send a date, Akkoma a unix timestamp"""
+    try:
+        reset_timestamp = float(reset)
+    except ValueError:
+        try:
+            reset_timestamp = datetime.datetime.fromisoformat(reset).timestamp()
+        except ValueError:
+            return None
+    return max(reset_timestamp - time.time(), 0)
+
+
+@dataclass
+class RateLimit:
+    limit: int
+    remaining: int
+    reset_at: float  # time.monotonic()
+    next_background_at: float = 0  # when spreading background requests out, when the next one can go
+
+
+class RateLimits:
+    """
+    the rate limits of instances, per access token (None for unauthenticated requests, which are limited per IP).
+    they're taken from the X-RateLimit-* headers of every response
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self._rate_limits: LRUCache[tuple[str, Optional[str]], RateLimit] = LRUCache(max_size)
+        self.delayed = 0
+        self.skipped = 0
+        self.retried = 0
+
+    def _get(self, host: str, token: Optional[str]) -> Optional[RateLimit]:
+        rate_limit = self._rate_limits.get((host, token))
+        if rate_limit is MISSING or time.monotonic() >= rate_limit.reset_at:
+            # we don't know, or it's a new window and we'll know after this request
+            return None
+        return rate_limit
+
+    async def acquire(self, host: str, token: Optional[str]):
+        """
+        waits until a request can be sent without running into the rate limit.
+        page loads go first: they're sent right away as long as anything is left, and only wait for the reset
+        when nothing is. background requests are spread out behind them, and stop before the page loads' reserve
+        """
+        if request_priority.get() == RequestPriority.BACKGROUND:
+            rate_limit = await self._acquire_background(host, token)
+        else:
+            rate_limit = await self._acquire_interactive(host, token)
+
+        if rate_limit is not None:
+            # counted right away, so that requests sent at the same time don't all think they're the last one
+            rate_limit.remaining = max(rate_limit.remaining - 1, 0)
+
+    async def _acquire_interactive(self, host: str, token: Optional[str]) -> Optional[RateLimit]:
+        rate_limit = self._get(host, token)
+        if rate_limit is None or rate_limit.remaining > 0:
+            return rate_limit
+
+        delay = rate_limit.reset_at - time.monotonic()
+        if delay > MAX_DELAY:
+            self.skipped += 1
+            raise RateLimitedError(host, f"rate limit of {host} is used up for {delay:.0f} more seconds")
+        self.delayed += 1
+        await asyncio.sleep(delay)
+        # it's a new window now, which we'll know about after this request
+        return None
+
+    async def _acquire_background(self, host: str, token: Optional[str]) -> Optional[RateLimit]:
+        rate_limit = self._get(host, token)
+        if rate_limit is None:
+            return None
+
+        reserve = rate_limit.limit * BACKGROUND_RESERVE
+        if rate_limit.remaining <= reserve:
+            self.skipped += 1
+            raise RateLimitedError(host, f"rate limit of {host} is saved for page loads")
+        if rate_limit.remaining > rate_limit.limit * SPREAD_THRESHOLD:
+            return rate_limit
+
+        # the share above the reserve is spread out until the reset
+        now = time.monotonic()
+        interval = (rate_limit.reset_at - now) / (rate_limit.remaining - reserve)
+        request_at = max(now, rate_limit.next_background_at)
+        delay = request_at - now
+        if delay > MAX_DELAY:
+            self.skipped += 1
+            raise RateLimitedError(host, f"rate limit of {host} has no room for background requests right now")
+        rate_limit.next_background_at = request_at + interval
+        if delay <= 0:
+            return rate_limit
+
+        self.delayed += 1
+        await asyncio.sleep(delay)
+        # page loads could have used up more of it in the meantime
+        rate_limit = self._get(host, token)
+        if rate_limit is not None and rate_limit.remaining <= rate_limit.limit * BACKGROUND_RESERVE:
+            self.skipped += 1
+            raise RateLimitedError(host, f"rate limit of {host} is saved for page loads")
+        return rate_limit
+
+    def update(self, host: str, token: Optional[str], response: aiohttp.ClientResponse):
+        limit = response.headers.get("X-RateLimit-Limit")
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if limit is None or remaining is None or reset is None:
+            return
+
+        reset_in = parse_reset(reset)
+        if reset_in is None or not limit.isdigit() or not remaining.isdigit():
+            return
+
+        previous_rate_limit = self._get(host, token)
+        self._rate_limits.set((host, token), RateLimit(
+            limit=int(limit),
+            remaining=int(remaining),
+            reset_at=time.monotonic() + reset_in,
+            next_background_at=previous_rate_limit.next_background_at if previous_rate_limit else 0
+        ))
+
+    def get_retry_delay(self, host: str, token: Optional[str], response: aiohttp.ClientResponse) -> Optional[float]:
+        """after a 429, how long until a page load can be retried. None if it shouldn't be"""
+        if request_priority.get() == RequestPriority.BACKGROUND:
+            return None
+
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            rate_limit = self._get(host, token)
+            if rate_limit is None:
+                return None
+            delay = rate_limit.reset_at - time.monotonic()
+        return delay if delay <= MAX_DELAY else None
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[K, T]):
+    """
+    merges concurrent calls with the same key into one: the first caller starts the call,
+    and everyone who asks for the same key while it's still running waits for that call instead of making their own.
+    nothing is kept once the call is done, so this only ever saves work that is happening at the same time.
+    """
+
+    def __init__(self):
+        self.calls = 0  # how often run() was called
+        self.flights = 0  # how many of those actually did the work
+        self._flights: dict[K, asyncio.Future[T]] = {}
+
+    @property
+    def coalesced(self) -> int:
+        return self.calls - self.flights
+
+    @property
+    def coalescing_ratio(self) -> float:
+        """the fraction of calls that were answered by someone else's call"""
+        return self.coalesced / self.calls if self.calls else 0.0
+
+    def _on_flight_done(self, key: K, flight: asyncio.Future[T]):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # if every caller went away, nobody else is going to look at the error
+            flight.exception()
+
+    async def run(self, key: K, function: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            self.flights += 1
+            flight = asyncio.ensure_future(function())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done_flight: self._on_flight_done(key, done_flight))
+
+        # shielded, so one caller being cancelled doesn't cancel the call for everyone else waiting on it
+        return await asyncio.shield(flight)
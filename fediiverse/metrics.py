@@ -0,0 +1,233 @@
+"""
+
+Prometheus metrics for the fediiverse servers, served in the text format on /metrics (only to localhost).
+
+Counters and histograms are plain dicts that are updated in place, so recording one is cheap enough for every request.
+Numbers that are already counted somewhere else (cache hits, coalesced requests...) are only read when /metrics is
+scraped. Every process has its own metrics, so with more than one uvicorn worker each scrape sees one of them.
+
+"""
+import bisect
+import time
+from typing import Callable, Iterable, Protocol
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+Labels = tuple[str, ...]
+
+# seconds. most upstream requests and pages take between 50ms and a few seconds, and the slowest time out at 2 minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def escape_label_value(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(label_names: Labels, labels: Labels, extra_label: str = "") -> str:
+	pairs = [f"{name}=\"{escape_label_value(value)}\"" for name, value in zip(label_names, labels)]
+	if extra_label:
+		pairs.append(extra_label)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+	type = "untyped"
+
+	def __init__(self, name: str, description: str, label_names: Labels = ()):
+		self.name = name
+		self.description = description
+		self.label_names = label_names
+
+	def collect(self) -> Iterable[str]:
+		raise NotImplementedError
+
+	def render(self) -> str:
+		return "\n".join([
+			f"# HELP {self.name} {self.description}",
+			f"# TYPE {self.name} {self.type}",
+			*self.collect()
+		])
+
+
+class Counter(Metric):
+	type = "counter"
+
+	def __init__(self, name: str, description: str, label_names: Labels = ()):
+		super().__init__(name, description, label_names)
+		self._values: dict[Labels, float] = {}
+
+	def inc(self, *labels: str, amount: float = 1):
+		self._values[labels] = self._values.get(labels, 0) + amount
+
+	def collect(self) -> Iterable[str]:
+		for labels, value in list(self._values.items()):
+			yield f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+
+
+class Histogram(Metric):
+	type = "histogram"
+
+	def __init__(self, name: str, description: str, label_names: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+		super().__init__(name, description, label_names)
+		self.buckets = buckets
+		# per bucket, not cumulative. the last one is everything over the largest bucket
+		self._counts: dict[Labels, list[int]] = {}
+		self._sums: dict[Labels, float] = {}
+
+	def observe(self, value: float, *labels: str):
+		counts = self._counts.get(labels)
+		if counts is None:
+			counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+		counts[bisect.bisect_left(self.buckets, value)] += 1
+		self._sums[labels] = self._sums.get(labels, 0) + value
+
+	def collect(self) -> Iterable[str]:
+		for labels, counts in list(self._counts.items()):
+			cumulative_count = 0
+			for bucket, count in zip((*self.buckets, float("inf")), counts):
+				cumulative_count += count
+				bucket_labels = format_labels(self.label_names, labels, f"le=\"{format_value(bucket)}\"")
+				yield f"{self.name}_bucket{bucket_labels} {cumulative_count}"
+			formatted_labels = format_labels(self.label_names, labels)
+			yield f"{self.name}_sum{formatted_labels} {format_value(self._sums[labels])}"
+			yield f"{self.name}_count{formatted_labels} {cumulative_count}"
+
+
+class CollectedMetric(Metric):
+	"""numbers that are counted somewhere else anyway, read whenever the metrics are scraped"""
+
+	def __init__(self, name: str, description: str, label_names: Labels = (), metric_type: str = "counter"):
+		super().__init__(name, description, label_names)
+		self.type = metric_type
+		self._sources: dict[Labels, Callable[[], float]] = {}
+
+	def add(self, *labels: str, get_value: Callable[[], float]):
+		# by labels, so adding the same source again (e.g. when a server's lifespan runs twice) replaces it
+		self._sources[labels] = get_value
+
+	def collect(self) -> Iterable[str]:
+		for labels, get_value in list(self._sources.items()):
+			yield f"{self.name}{format_labels(self.label_names, labels)} {format_value(get_value())}"
+
+
+class MetricsRegistry:
+	def __init__(self):
+		self._metrics: dict[str, Metric] = {}
+
+	def _register(self, metric: Metric) -> Metric:
+		if metric.name in self._metrics:
+			raise ValueError(f"metric {metric.name} already exists")
+		self._metrics[metric.name] = metric
+		return metric
+
+	def counter(self, name: str, description: str, label_names: Labels = ()) -> Counter:
+		return self._register(Counter(name, description, label_names))
+
+	def histogram(self, name: str, description: str, label_names: Labels = (), **kwargs) -> Histogram:
+		return self._register(Histogram(name, description, label_names, **kwargs))
+
+	def collected(self, name: str, description: str, label_names: Labels = (), **kwargs) -> CollectedMetric:
+		return self._register(CollectedMetric(name, description, label_names, **kwargs))
+
+	def render(self) -> str:
+		return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+	"fediiverse_request_duration_seconds",
+	"Time until the whole response was sent, by route",
+	("method", "route")
+)
+responses = registry.counter(
+	"fediiverse_responses_total",
+	"Responses sent, by route and status code",
+	("method", "route", "status")
+)
+cache_hits = registry.collected("fediiverse_cache_hits_total", "In-memory cache hits", ("cache",))
+cache_misses = registry.collected("fediiverse_cache_misses_total", "In-memory cache misses", ("cache",))
+flight_calls = registry.collected(
+	"fediiverse_singleflight_calls_total",
+	"Calls that could be merged with identical calls in flight",
+	("flight",)
+)
+flights = registry.collected(
+	"fediiverse_singleflight_flights_total",
+	"Calls that did the work, the others waited for one of these",
+	("flight",)
+)
+
+
+class HitCounting(Protocol):
+	hits: int
+	misses: int
+
+
+class FlightCounting(Protocol):
+	calls: int
+	flights: int
+
+
+def register_cache(name: str, cache: HitCounting):
+	"""exports the hits and misses of an LRUCache, or anything else that counts them"""
+	cache_hits.add(name, get_value=lambda: cache.hits)
+	cache_misses.add(name, get_value=lambda: cache.misses)
+
+
+def register_flights(name: str, single_flight: FlightCounting):
+	flight_calls.add(name, get_value=lambda: single_flight.calls)
+	flights.add(name, get_value=lambda: single_flight.flights)
+
+
+class RequestMetricsMiddleware:
+	"""
+	times every request until the last of its response is sent (so streamed pages are timed until they're done),
+	by the route it matched. a plain ASGI middleware, BaseHTTPMiddleware would buffer streamed responses.
+	"""
+
+	def __init__(self, app):
+		self.app = app
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			return await self.app(scope, receive, send)
+
+		start_time = time.perf_counter()
+		status = 500
+
+		async def send_with_status(message):
+			nonlocal status
+			if message["type"] == "http.response.start":
+				status = message["status"]
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_with_status)
+		finally:
+			route = scope.get("route")
+			# the route template, not the path, so there's one series per route instead of one per status id
+			route_path = route.path if route is not None else "other"
+			request_duration.observe(time.perf_counter() - start_time, scope["method"], route_path)
+			responses.inc(scope["method"], route_path, str(status))
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(request: Request) -> PlainTextResponse:
+	# nginx denies /metrics too, since everything it proxies comes from localhost
+	if request.client is None or request.client.host not in LOCAL_HOSTS:
+		raise HTTPException(status_code=404, detail="Not Found")
+	return PlainTextResponse(content=registry.render(), media_type=CONTENT_TYPE)
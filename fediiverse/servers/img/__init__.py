@@ -1,6 +1,7 @@
 import asyncio
 import datetime
 import io
+import time
 from contextlib import asynccontextmanager
 from enum import Enum
 from pathlib import Path
@@ -16,6 +17,8 @@ from pydantic import BaseModel, HttpUrl
 from yarl import URL
 
 from fediiverse.utils import filter_nulls_from_dict
+from ...mastodon.singleflight import SingleFlight
+from ...metrics import RequestMetricsMiddleware, metrics_router, register_flights, registry
 from ...storage import FediiverseMode, get_config
 
 config = get_config()
@@ -23,6 +26,19 @@ hosts = config.hosts
 
 http: aiohttp.ClientSession
 fernet: Fernet = Fernet(config.secrets.temporal_secret_key)
+# a timeline shows the same avatar many times, and the 3ds asks for all of them at once
+image_flights: SingleFlight[str, tuple[bytes, str, dict[str, str]]] = SingleFlight()
+register_flights("images", image_flights)
+
+image_fetch_duration = registry.histogram(
+	"fediiverse_image_fetch_duration_seconds",
+	"Time until a source image was downloaded"
+)
+image_processing_duration = registry.histogram(
+	"fediiverse_image_processing_duration_seconds",
+	"Time until an image was resized and converted (including waiting for a free thread), by the resulting format",
+	("content_type",)
+)
 
 MAX_CONTENT_LENGTH = 8_000_000  # maximum file size to attempt to proxy
 
@@ -42,6 +58,8 @@ app = FastAPI(
 	docs_url="/docs" if config.mode == FediiverseMode.DEV else None,
 	redoc_url="/redoc" if config.mode == FediiverseMode.DEV else None
 )
+app.add_middleware(RequestMetricsMiddleware)
+app.include_router(metrics_router)
 
 
 def http_date(dt: datetime.datetime):
@@ -153,12 +171,10 @@ def process_image_data(
 	return out_buffer.getvalue(), new_content_type
 
 
-@app.get("/img")
-async def cache_proxy(t: str):
-	target = ProxiedImageTarget.from_token(t)
-
+async def fetch_processed_image(target: ProxiedImageTarget) -> tuple[bytes, str, dict[str, str]]:
 	src_url = str(target.src)
 
+	fetch_start_time = time.perf_counter()
 	async with http.request(
 		method="GET",
 		url=src_url,
@@ -187,7 +203,9 @@ async def cache_proxy(t: str):
 		age = response.headers.get("Age")
 		last_modified = response.headers.get("Last-Modified")
 		source_buffer = io.BytesIO(await response.content.read())
+	image_fetch_duration.observe(time.perf_counter() - fetch_start_time)
 
+	processing_start_time = time.perf_counter()
 	# noinspection PyTypeChecker
 	processed_data, processed_content_type = await asyncio.get_event_loop().run_in_executor(
 		None,
@@ -197,19 +215,35 @@ async def cache_proxy(t: str):
 			source_buffer=source_buffer
 		)
 	)
+	image_processing_duration.observe(time.perf_counter() - processing_start_time, processed_content_type)
+
+	source_headers = filter_nulls_from_dict({
+		"ETag": etag,
+		"Age": age,
+		"Last-Modified": last_modified
+	})
+	return processed_data, processed_content_type, source_headers
+
+
+@app.get("/img")
+async def cache_proxy(t: str):
+	target = ProxiedImageTarget.from_token(t)
+
+	# tokens for the same target are all different (they're encrypted with a random IV), so the target itself is the key
+	processed_data, processed_content_type, source_headers = await image_flights.run(
+		target.model_dump_json(),
+		lambda: fetch_processed_image(target)
+	)
 
 	delta = datetime.timedelta(days=30)
 	headers = {
 		# these are my desperate efforts to get the 3ds to actually cache images properly
 		# but it doesnt want to
 		"Content-Type": processed_content_type,
-		"ETag": etag,
-		"Age": age,
-		"Last-Modified": last_modified,
+		**source_headers,
 		"Cache-Control": f"max-age={delta.total_seconds()}",  # 30 days
 		"Expires": http_date(datetime.datetime.now(datetime.timezone.utc) + delta)
 	}
-	headers = filter_nulls_from_dict(headers)
 
 	return Response(
 		status_code=200,
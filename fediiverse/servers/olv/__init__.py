@@ -1,30 +1,47 @@
+import asyncio
 import base64
 import datetime
 import io
 import json
+import time
 import warnings
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, Literal, Annotated, Any
+from typing import Optional, Literal, Annotated, Any, Iterable
 
 import aiohttp.client_exceptions
 import cryptography.fernet
 from PIL import Image
 from aiohttp import ClientResponseError
-from bs4 import BeautifulSoup
-from fastapi import FastAPI, Header, Form, Depends, Query, HTTPException, UploadFile, File
+from bs4 import BeautifulSoup, Tag
+from fastapi import FastAPI, Header, Form, Depends, Query, HTTPException, UploadFile, File, BackgroundTasks
 from fastapi.requests import Request
-from fastapi.responses import HTMLResponse, Response, RedirectResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, Response, RedirectResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from .rendering import render_header_user
-from ...mastodon import Client
+from .fetching import FetchScope, Prefetches, fetch_scope_dep
+from .home_buffers import HomeBuffers
+from .known_accounts import KnownAccounts
+from .shared_timelines import SharedTimelines
+from .rendering import render_header_user, status_fragment_cache
+from .sanitizer import sanitized_content_cache
+from .streaming import stream_status_list, status_html_cache, content_html_cache
+from .workers import start_process_pool, shutdown_process_pool
+from ...emojis import EMOJI_SIZES, get_available_emojis, get_emoji_png
+from ...mastodon import Client, ClientPool
+from ...mastodon.circuitbreaker import InstanceUnavailableError
+from ...mastodon.ratelimits import RateLimitedError
+from ...metrics import RequestMetricsMiddleware, metrics_router, register_cache
 from ...mastodon.models.account import Account
-from ...mastodon.models.status import StatusVisibility
-from ...servers.olv.rendering import render_status, render_profile, run_as_async, load_template
-from ...storage import FediiverseStore, get_config, FediiverseMode
+from ...mastodon.models.status import StatusVisibility, Status
+from ...servers.img import http_date
+from ...servers.olv.rendering import (
+	render_status, render_profile, run_as_async, load_template, render_status_list, StatusListEntry,
+	fetch_profile_timeline
+)
+from ...storage import FediiverseStore, get_config, FediiverseMode, RenderingEngine
 from ...token import FediiverseToken
 from ...version import FEDIIVERSE_VERSION_STR
 
@@ -122,12 +139,47 @@ else:
 
 
 store = FediiverseStore()
+upstream: ClientPool
+known_accounts = KnownAccounts(store, cache_size=config.upstream.account_cache_size)
+shared_timelines = SharedTimelines(ttl=config.upstream.shared_timeline_ttl)
+prefetches = Prefetches(ttl=config.upstream.prefetch_ttl)
+home_buffers = HomeBuffers(
+	max_users=config.upstream.home_buffer_users,
+	idle_timeout=config.upstream.home_buffer_idle_timeout
+)
+
+register_cache("status_fragments", status_fragment_cache)
+register_cache("status_html", status_html_cache)
+register_cache("sanitized_content", sanitized_content_cache)
+register_cache("content_html", content_html_cache)
+register_cache("prefetches", prefetches)
+register_cache("home_buffers", home_buffers)
+known_accounts.register_metrics()
+shared_timelines.register_metrics()
 
 
 @asynccontextmanager
 async def lifespan(_):
-	async with store:
-		yield
+	global upstream
+	async with store, ClientPool(
+		limit=config.upstream.connection_limit,
+		limit_per_host=config.upstream.connection_limit_per_host,
+		keepalive_timeout=config.upstream.keepalive_timeout,
+		response_cache_size=config.upstream.response_cache_size,
+		hedge_budget=config.upstream.hedge_budget,
+		hedge_percentile=config.upstream.hedge_percentile,
+		circuit_breaker_failures=config.upstream.circuit_breaker_failures,
+		circuit_breaker_probe_interval=config.upstream.circuit_breaker_probe_interval
+	) as upstream, home_buffers:
+		upstream.register_metrics()
+		upstream.metric_instances.update(await store.get_saved_instance_domains())
+		if config.rendering.engine == RenderingEngine.STREAMING:
+			start_process_pool(config.rendering.process_pool_size)
+		try:
+			yield
+		finally:
+			shutdown_process_pool()
+			await known_accounts.flush()
 
 
 app = FastAPI(
@@ -135,6 +187,8 @@ app = FastAPI(
 	docs_url="/docs" if config.mode == FediiverseMode.DEV else None,
 	redoc_url="/redoc" if config.mode == FediiverseMode.DEV else None
 )
+app.add_middleware(RequestMetricsMiddleware)
+app.include_router(metrics_router)
 app.mount(
 	path="/static",
 	app=static_class(
@@ -152,17 +206,37 @@ async def token_dep(
 	if not token:
 		raise HTTPException(status_code=401, detail="No authentication token was specified with the request.")
 	fediiverse_token = FediiverseToken.from_encrypted(token)
+	# tokens are only issued for saved instances, including ones the welcome server saved after we started
+	upstream.metric_instances.add(fediiverse_token.domain)
 	yield fediiverse_token
 
 
 async def mastodon_dep(fediiverse_token: Annotated[FediiverseToken, Depends(token_dep)]):
-	async with Client(
+	async with upstream.client(
 		host=f"https://{fediiverse_token.domain}",
 		token=fediiverse_token.access_token
 	) as mastodon:
 		yield mastodon
 
 
+async def anonymous_mastodon_dep(fediiverse_token: Annotated[FediiverseToken, Depends(token_dep)]):
+	# the user's instance, without their token. for things that are the same for everyone
+	async with upstream.client(host=f"https://{fediiverse_token.domain}") as mastodon:
+		yield mastodon
+
+
+def remember_statuses(mastodon: Client, statuses: Iterable[Status], *, shared: bool = False):
+	"""
+	keeps what we can reuse from statuses that were fetched as mastodon's user.
+	shared statuses (from SharedTimelines) only have the user's flags where we had them already, and public filters
+	"""
+	statuses = list(statuses)
+	known_accounts.remember_statuses(mastodon, statuses)
+	if not shared:
+		shared_timelines.remember_flags(mastodon, statuses)
+		home_buffers.update(mastodon, statuses)
+
+
 class ParamPack(BaseModel):
 	title_id: int
 	access_key: int
@@ -233,6 +307,38 @@ class TemplateDep:
 		yield await load_template(self.filename, user_id=user_id, is_miiverse=is_miiverse)
 
 
+async def render_status_list_page(
+	soup: BeautifulSoup,
+	entries: list[StatusListEntry | Tag],
+	*,
+	user_id: str,
+	utc_offset: Optional[datetime.timedelta] = None
+) -> Response:
+	"""renders statuses into the page's .status-list with the configured rendering engine"""
+	list_el = soup.select_one(".status-list")
+
+	if config.rendering.engine == RenderingEngine.STREAMING:
+		return StreamingResponse(stream_status_list(
+			soup, list_el, entries,
+			local_user_id=user_id,
+			utc_offset=utc_offset
+		), media_type="text/html")
+
+	render_time = await render_status_list(
+		entries, list_el, soup,
+		local_user_id=user_id,
+		utc_offset=utc_offset
+	)
+
+	serialize_start_time = time.perf_counter()
+	html = str(soup)
+	serialize_time = time.perf_counter() - serialize_start_time
+
+	return HTMLResponse(content=html, headers={
+		"Server-Timing": f"render;dur={render_time * 1000:.1f}, serialize;dur={serialize_time * 1000:.1f}"
+	})
+
+
 class UnauthedTemplateDep:
 	def __init__(self, filename: str):
 		self.filename = filename
@@ -254,12 +360,15 @@ async def status_route(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	user_id: Annotated[str, Depends(user_id_dep)],
 	soup: Annotated[BeautifulSoup, Depends(TemplateDep("status.html"))],
+	fetches: Annotated[FetchScope, Depends(fetch_scope_dep)],
 	status_id: str,
 	utc_offset: Annotated[Optional[datetime.timedelta], Depends(utc_offset_dep)] = None,
 	page: int = 0,
 ):
-	status = await mastodon.statuses.get(status_id)
-	context = await mastodon.statuses.get_context(status_id)
+	status, context = await asyncio.gather(
+		fetches.start(mastodon.statuses.get(status_id)),
+		fetches.start(mastodon.statuses.get_context(status_id))
+	)
 
 	ancestor_limit = 8
 	descendant_limit = 20
@@ -283,38 +392,49 @@ async def status_route(
 	else:
 		load_more_descendants_button.decompose()
 
-	list_el = soup.select_one(".status-list")
-
-	for ancestor_status in context.ancestors[-ancestor_limit:]:
-		await run_as_async(lambda: render_status(
-			ancestor_status, list_el, soup,
-			local_user_id=user_id,
-			expanded=False,
-			utc_offset=utc_offset
-		))
-
-	main_status_el = await run_as_async(lambda: render_status(
-		status, list_el, soup,
-		local_user_id=user_id,
-		expanded=True,
-		utc_offset=utc_offset
-	))
-	main_status_el.attrs["class"] += " main-status"
+	entries: list[StatusListEntry | Tag] = [
+		StatusListEntry(ancestor_status) for ancestor_status in context.ancestors[-ancestor_limit:]
+	]
+	entries.append(StatusListEntry(status, expanded=True, extra_class="main-status"))
 
 	if page > 0:
 		older_indicator_el = soup.new_tag("span", attrs={"class": "older-post-indicator"})
 		older_indicator_el.string = f"Page {page+1}"
-		list_el.append(older_indicator_el)
+		entries.append(older_indicator_el)
 
-	for descendant_status in context.descendants[descendant_offset:descendant_offset+descendant_limit]:
-		await run_as_async(lambda: render_status(
-			descendant_status, list_el, soup,
-			local_user_id=user_id,
-			expanded=False,
-			utc_offset=utc_offset
-		))
+	entries.extend(
+		StatusListEntry(descendant_status)
+		for descendant_status in context.descendants[descendant_offset:descendant_offset+descendant_limit]
+	)
+	remember_statuses(mastodon, (entry.status for entry in entries if isinstance(entry, StatusListEntry)))
 
-	return HTMLResponse(content=str(soup))
+	return await render_status_list_page(soup, entries, user_id=user_id, utc_offset=utc_offset)
+
+
+@app.get("/emoji/{size}/{file_name}")
+async def emoji_route(size: int, file_name: str):
+	# when the emoji mode is URL, rendered pages reference emojis here instead of inlining them
+	codepoints = file_name.removesuffix(".png")
+	if (
+		size not in EMOJI_SIZES
+		or not file_name.endswith(".png")
+		or codepoints not in get_available_emojis()  # also keeps the path inside the emoji cache
+	):
+		raise HTTPException(status_code=404, detail="Emoji not found")
+
+	png_data = await run_as_async(lambda: get_emoji_png(codepoints, size))
+	if png_data is None:
+		raise HTTPException(status_code=404, detail="Emoji not found")
+
+	delta = datetime.timedelta(days=365)
+	return Response(
+		content=png_data,
+		media_type="image/png",
+		headers={
+			"Cache-Control": f"public, max-age={int(delta.total_seconds())}, immutable",
+			"Expires": http_date(datetime.datetime.now(datetime.timezone.utc) + delta)
+		}
+	)
 
 
 @app.get("/logged-out", response_class=HTMLResponse)
@@ -364,15 +484,21 @@ async def new_route(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	user_id: Annotated[str, Depends(user_id_dep)],
 	our_acct: Annotated[str, Depends(acct_dep)],
+	fetches: Annotated[FetchScope, Depends(fetch_scope_dep)],
 	reply_to: Optional[str] = None,
 	default_content: str = ""
 ):
 	header_el = soup.find(class_="new-header")
 
-	reply_to_status = (await mastodon.statuses.get(reply_to)) if reply_to else None
+	reply_to_task = fetches.start(mastodon.statuses.get(reply_to)) if reply_to else None
+	# the ancestors of the status being replied to are the rest of the thread
+	reply_to_context_task = fetches.start(mastodon.statuses.get_context(reply_to)) if reply_to else None
+	preferences_task = fetches.start(mastodon.preferences.get_preferences())
+
+	reply_to_status = (await reply_to_task) if reply_to_task else None
 
 	# handle the default visibility of this post
-	preferences = await mastodon.preferences.get_preferences()
+	preferences = await preferences_task
 	user_preferred_visibility = StatusVisibility(preferences["posting:default:visibility"])
 	visibility_order = list(StatusVisibility)  # from least->most strict
 
@@ -408,28 +534,28 @@ async def new_route(
 	reply_to_field_el = soup.find(attrs={"id": "reply_to"})
 	reply_to_field_el["value"] = reply_to
 
-	# render the entire thread
-	thread_elements = []
-	thread_status = reply_to_status
-	while thread_status and len(thread_elements) <= 10:  # well, 10 replies in the thread at most.
-		# add the preview of the status being replied to
-		thread_status_el = soup.new_tag("div", attrs={"class": "reply-to"})
-		await run_as_async(lambda: render_status(
-			status=thread_status,
-			container=thread_status_el,
-			soup=soup,
-			local_user_id=user_id,
-			include_actions=False,
-			disable_selection=True
-		))
-		thread_elements.append(thread_status_el)
-		if thread_status.in_reply_to_id:
-			thread_status = await mastodon.statuses.get(thread_status.in_reply_to_id)
-		else:
-			thread_status = None
-
-	for thread_status_el in reversed(thread_elements):
-		header_el.append(thread_status_el)
+	# render the entire thread, oldest first. well, 10 replies in the thread at most.
+	thread_statuses = []
+	if reply_to_status:
+		reply_to_context = await reply_to_context_task
+		thread_statuses = [*reply_to_context.ancestors[-10:], reply_to_status]
+		remember_statuses(mastodon, thread_statuses)
+
+	def render_thread():
+		for thread_status in thread_statuses:
+			# add the preview of the status being replied to
+			thread_status_el = soup.new_tag("div", attrs={"class": "reply-to"})
+			render_status(
+				status=thread_status,
+				container=thread_status_el,
+				soup=soup,
+				local_user_id=user_id,
+				include_actions=False,
+				disable_selection=True
+			)
+			header_el.append(thread_status_el)
+
+	await run_as_async(render_thread)
 
 	return HTMLResponse(content=str(soup))
 
@@ -598,10 +724,11 @@ async def reblog_status(
 	status_id: str,
 	visibility: Optional[Literal["public", "unlisted", "private"]] = None
 ):
-	await mastodon.statuses.reblog(
+	status = await mastodon.statuses.reblog(
 		status_id=status_id,
 		visibility=visibility
 	)
+	remember_statuses(mastodon, [status])
 
 
 @app.get("/status/{status_id}/delete")
@@ -619,7 +746,7 @@ async def unreblog_status(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	status_id: str
 ):
-	await mastodon.statuses.unreblog(status_id)
+	remember_statuses(mastodon, [await mastodon.statuses.unreblog(status_id)])
 
 
 @app.get("/status/{status_id}/favourite")
@@ -628,7 +755,7 @@ async def favourite_status(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	status_id: str
 ):
-	await mastodon.statuses.favourite(status_id)
+	remember_statuses(mastodon, [await mastodon.statuses.favourite(status_id)])
 
 
 @app.get("/status/{status_id}/unfavourite")
@@ -637,7 +764,7 @@ async def unfavourite_status(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	status_id: str
 ):
-	await mastodon.statuses.unfavourite(status_id)
+	remember_statuses(mastodon, [await mastodon.statuses.unfavourite(status_id)])
 
 
 @app.get("/status/{status_id}/bookmark")
@@ -646,7 +773,7 @@ async def bookmark_status(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	status_id: str
 ):
-	await mastodon.statuses.bookmark(status_id)
+	remember_statuses(mastodon, [await mastodon.statuses.bookmark(status_id)])
 
 
 @app.get("/status/{status_id}/unbookmark")
@@ -655,7 +782,7 @@ async def unbookmark_status(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	status_id: str
 ):
-	await mastodon.statuses.unbookmark(status_id)
+	remember_statuses(mastodon, [await mastodon.statuses.unbookmark(status_id)])
 
 
 @app.get("/logout")
@@ -668,7 +795,7 @@ async def logout(
 		raise HTTPException(status_code=400, detail="Instance not found")
 
 	# we can use an unauthorized client for this
-	async with Client(host=f"https://{fediiverse_token.domain}") as mastodon:
+	async with upstream.client(host=f"https://{fediiverse_token.domain}") as mastodon:
 		await mastodon.oauth.revoke_access_token(
 			client_id=saved_instance.client_id,
 			client_secret=saved_instance.client_secret,
@@ -681,30 +808,53 @@ async def render_profile_page(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	user_id: Annotated[str, Depends(user_id_dep)],
 	is_miiverse: Annotated[bool, Depends(is_miiverse_dep)],
+	fetches: Annotated[FetchScope, Depends(fetch_scope_dep)],
+	background_tasks: BackgroundTasks,
 	max_id: Optional[str] = None,
-	utc_offset: Optional[datetime.timedelta] = None
-) -> BeautifulSoup:
-	soup, new_max_id = await render_profile(
+	utc_offset: Optional[datetime.timedelta] = None,
+	timeline_task: Optional[asyncio.Task[list[Status]]] = None
+) -> Response:
+	if timeline_task is None:
+		# fetch the posts while the rest of the profile renders
+		timeline_task = fetches.start(fetch_profile_timeline(mastodon, account.id, max_id=max_id))
+
+	soup, timeline = await render_profile(
 		account,
 		mastodon=mastodon,
 		user_id=user_id,
 		max_id=max_id,
 		include_description=not max_id,
 		include_fields=not max_id,
-		utc_offset=utc_offset,
-		is_miiverse=is_miiverse
+		is_miiverse=is_miiverse,
+		timeline=timeline_task
 	)
 	soup.find("html")["data-local-user-id"] = user_id
 
+	remember_statuses(mastodon, timeline)
+
+	new_max_id = timeline[len(timeline) - 1].id if timeline else None
+
 	potentially_has_more = not not new_max_id
 	load_older_el = soup.select_one("#load-older-button")
 	if potentially_has_more:
 		load_older_url = f"/profile/{account.id}?max_id={new_max_id}"
 		load_older_el.attrs["href"] = load_older_url
+
+		background_tasks.add_task(
+			prefetches.start,
+			mastodon,
+			("profile", account.id, new_max_id),
+			lambda _: fetch_profile_timeline(mastodon, account.id, max_id=new_max_id)
+		)
 	else:
 		load_older_el.decompose()  # DECOMPOSE???
 
-	return soup
+	return await render_status_list_page(
+		soup,
+		[StatusListEntry(status) for status in timeline],
+		user_id=user_id,
+		utc_offset=utc_offset
+	)
 
 
 @app.get("/profile/{account_id}", response_class=HTMLResponse)
@@ -713,19 +863,33 @@ async def profile_route(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	user_id: Annotated[str, Depends(user_id_dep)],
 	is_miiverse: Annotated[bool, Depends(is_miiverse_dep)],
+	fetches: Annotated[FetchScope, Depends(fetch_scope_dep)],
+	background_tasks: BackgroundTasks,
 	max_id: Optional[str] = None,
 	utc_offset: Annotated[Optional[datetime.timedelta], Depends(utc_offset_dep)] = None
 ):
-	account = await mastodon.accounts.get_account(account_id)
-
-	return HTMLResponse(content=str(await render_profile_page(
-		account=account,
+	async def get_timeline() -> list[Status]:
+		# older posts were most likely prefetched by the previous page
+		timeline = await prefetches.take(mastodon, ("profile", account_id, max_id)) if max_id else None
+		if timeline is None:
+			timeline = await fetch_profile_timeline(mastodon, account_id, max_id=max_id)
+		return timeline
+
+	# the account id is all we need to fetch the posts too
+	account_task = fetches.start(known_accounts.get_account(mastodon, account_id))
+	timeline_task = fetches.start(get_timeline())
+
+	return await render_profile_page(
+		account=await account_task,
 		mastodon=mastodon,
 		user_id=user_id,
+		fetches=fetches,
+		background_tasks=background_tasks,
 		max_id=max_id,
 		utc_offset=utc_offset,
-		is_miiverse=is_miiverse
-	)))
+		is_miiverse=is_miiverse,
+		timeline_task=timeline_task
+	)
 
 
 @app.get("/acct/{acct}", response_class=HTMLResponse)
@@ -734,24 +898,35 @@ async def acct_route(
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
 	user_id: Annotated[str, Depends(user_id_dep)],
 	is_miiverse: Annotated[bool, Depends(is_miiverse_dep)],
+	fetches: Annotated[FetchScope, Depends(fetch_scope_dep)],
+	background_tasks: BackgroundTasks,
 	utc_offset: Annotated[Optional[datetime.timedelta], Depends(utc_offset_dep)] = None
 ):
+	# if we've seen this acct before, the posts can be fetched while the account is
+	known_account_id = await known_accounts.get_account_id(mastodon, acct)
+	timeline_task = None
+	if known_account_id:
+		timeline_task = fetches.start(fetch_profile_timeline(mastodon, known_account_id, max_id=None))
+
 	try:
-		account = await mastodon.accounts.lookup_account(acct)
+		account = await known_accounts.lookup_account(mastodon, acct)
 	except ClientResponseError as error:
 		if error.status == 404:
 			raise HTTPException(status_code=404, detail=f"User @{acct} was not found.")
 		else:
 			raise error from None
 
-	return HTMLResponse(content=str(await render_profile_page(
+	return await render_profile_page(
 		account=account,
 		mastodon=mastodon,
 		user_id=user_id,
+		fetches=fetches,
+		background_tasks=background_tasks,
 		utc_offset=utc_offset,
 		is_miiverse=is_miiverse,
 		# no max_id needed
-	)))
+		timeline_task=timeline_task if account.id == known_account_id else None
+	)
 
 
 def is_user_agent_miiverse(user_agent: str) -> bool:
@@ -772,8 +947,11 @@ async def timeline_route(
 
 	user_agent: Annotated[str | None, Header()] = None,
 	mastodon: Annotated[Client, Depends(mastodon_dep)],
+	anonymous_mastodon: Annotated[Client, Depends(anonymous_mastodon_dep)],
 	user_id: Annotated[str, Depends(user_id_dep)],
-	soup: Annotated[BeautifulSoup, Depends(TemplateDep("timeline.html"))]
+	soup: Annotated[BeautifulSoup, Depends(TemplateDep("timeline.html"))],
+	fetches: Annotated[FetchScope, Depends(fetch_scope_dep)],
+	background_tasks: BackgroundTasks
 ):
 	is_miiverse = is_user_agent_miiverse(user_agent)
 
@@ -782,35 +960,44 @@ async def timeline_route(
 		viewing_older_el.decompose()
 
 	limit = 20
-	if kind == "home":
-		heading = "Home timeline"
-		timeline = await mastodon.timelines.get_home_timeline(
-			limit=limit,
-			max_id=max_id
-		)
-	elif kind == "trending":
-		heading = "Trending timeline"
-		timeline = await mastodon.trends.get_trending_statuses(
-			limit=limit,
-			offset=offset
-		)
-	elif kind == "local":
-		heading = "Local timeline"
-		timeline = await mastodon.timelines.get_public_timeline(
-			limit=limit,
-			max_id=max_id,
-			local=True
-		)
-	elif kind == "federated":
-		heading = "Federated timeline"
-		timeline = await mastodon.timelines.get_public_timeline(
+
+	async def fetch_timeline(page_fetches: FetchScope, page_max_id: Optional[str], page_offset: Optional[int]):
+		if kind == "home":
+			return await mastodon.timelines.get_home_timeline(
+				limit=limit,
+				max_id=page_max_id
+			)
+		# the same for everyone on the instance, except for the user's own flags, filters, blocks and mutes
+		return await shared_timelines.get_timeline(
+			mastodon,
+			anonymous_mastodon,
+			page_fetches,
+			kind,
 			limit=limit,
-			max_id=max_id,
-			# local AND remote, all of it!
+			max_id=page_max_id,
+			offset=page_offset
 		)
+
+	if kind == "home":
+		heading = "Home timeline"
+	elif kind in {"trending", "local", "federated"}:
+		heading = f"{kind.capitalize()} timeline"
 	else:
 		raise Exception
 
+	timeline = None
+	if kind == "home" and not max_id:
+		# the first page is kept up to date in memory for recently active users
+		timeline = home_buffers.get_first_page(mastodon, limit)
+	elif max_id or offset:
+		timeline = await prefetches.take(mastodon, ("timeline", kind, max_id, offset))
+
+	if timeline is None:
+		fetched_at = time.monotonic()
+		timeline = await fetch_timeline(fetches, max_id, offset)
+		if kind == "home" and not max_id:
+			home_buffers.fill(mastodon, timeline, fetched_at, limit)
+
 	potentially_has_more = len(timeline) >= limit
 
 	html_el = soup.find("html")
@@ -821,23 +1008,32 @@ async def timeline_route(
 		new_max_id = timeline[len(timeline) - 1].id
 		if kind == "trending":
 			# trending pages are offset by numeric index and not paginated by max id
-			load_older_url = f"/timeline?kind={kind}&offset={(offset or 0) + limit}"
+			new_max_id, new_offset = None, (offset or 0) + limit
+			load_older_url = f"/timeline?kind={kind}&offset={new_offset}"
 		else:
+			new_offset = None
 			load_older_url = f"/timeline?kind={kind}&max_id={new_max_id}"
 		load_older_el.attrs["href"] = load_older_url
+
+		# people almost always load older posts, so they're fetched while this page is being looked at
+		background_tasks.add_task(
+			prefetches.start,
+			mastodon,
+			("timeline", kind, new_max_id, new_offset),
+			lambda prefetch_fetches: fetch_timeline(prefetch_fetches, new_max_id, new_offset)
+		)
 	else:
 		load_older_el.decompose()  # DECOMPOSE???
 
 	heading_el = soup.select_one(".header h1")
 	heading_el.string = heading
 
-	list_el = soup.select_one(".status-list")
-
-	for status in timeline:
-		await run_as_async(lambda: render_status(status, list_el, soup, local_user_id=user_id))
+	remember_statuses(mastodon, timeline, shared=kind != "home")
 
-	return HTMLResponse(
-		content=str(soup)
+	return await render_status_list_page(
+		soup,
+		[StatusListEntry(status) for status in timeline],
+		user_id=user_id
 	)
 
 
@@ -892,6 +1088,32 @@ async def aiohttp_exception_handler(
 		raise exception
 
 
+@app.exception_handler(InstanceUnavailableError)
+async def instance_unavailable_exception_handler(
+		request: Request,
+		exception: InstanceUnavailableError
+) -> CaveErrorResponse | PlainTextResponse:
+	error_message = f"{exception.host} isn't responding right now, so fediiverse can't reach it.\n\nPlease try again in a little while!"
+	is_miiverse = is_user_agent_miiverse(request.headers.get("User-Agent"))
+	if is_miiverse:
+		return CaveErrorResponse(error_message=error_message, status_code=503)
+	else:
+		return PlainTextResponse(content=error_message, status_code=503)
+
+
+@app.exception_handler(RateLimitedError)
+async def rate_limited_exception_handler(
+		request: Request,
+		exception: RateLimitedError
+) -> CaveErrorResponse | PlainTextResponse:
+	error_message = f"You've made too many requests to {exception.host} for now.\n\nPlease try again in a few minutes!"
+	is_miiverse = is_user_agent_miiverse(request.headers.get("User-Agent"))
+	if is_miiverse:
+		return CaveErrorResponse(error_message=error_message, status_code=429)
+	else:
+		return PlainTextResponse(content=error_message, status_code=429)
+
+
 @app.exception_handler(StarletteHTTPException)
 async def exception_handler(
 		request: Request,
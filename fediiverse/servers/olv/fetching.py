@@ -0,0 +1,120 @@
+"""
+
+Request-scoped upstream fetching.
+
+Routes start every upstream call as soon as they know its arguments, and only await it when they need the result.
+Calls that don't depend on each other run at the same time, so a page waits for its slowest call
+instead of all of them one after the other.
+
+Pages that users almost always ask for next (the older posts of a timeline) can be prefetched in the background
+once the current page is sent, so the next request only has to render them.
+
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from ...cache import LRUCache
+from ...mastodon import Client
+from ...mastodon.ratelimits import RequestPriority, request_priority
+
+T = TypeVar("T")
+
+PREFETCH_CACHE_SIZE = 1024
+
+
+class FetchScope:
+	"""the upstream calls of one request. anything still running when the request ends is cancelled"""
+
+	def __init__(self):
+		self._tasks: list[asyncio.Task] = []
+
+	def start(self, coroutine: Awaitable[T]) -> asyncio.Task[T]:
+		"""starts a call in the background. await the returned task to get its result"""
+		task = asyncio.ensure_future(coroutine)
+		self._tasks.append(task)
+		return task
+
+	def close(self):
+		for task in self._tasks:
+			if not task.done():
+				task.cancel()
+			elif not task.cancelled():
+				# a failed call that nobody awaited (because an earlier one failed) isn't worth a warning
+				task.exception()
+		self._tasks.clear()
+
+
+async def fetch_scope_dep():
+	fetches = FetchScope()
+	try:
+		yield fetches
+	finally:
+		fetches.close()
+
+
+class Prefetches:
+	"""
+	upstream calls made ahead of time for a user, by key. a prefetched result is only used once, and only for ttl seconds.
+	a ttl of 0 disables prefetching.
+	"""
+
+	def __init__(self, ttl: float):
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		# (access token, *key) -> (task, when it was started)
+		self._prefetches: LRUCache[tuple, tuple[asyncio.Task, float]] = LRUCache(PREFETCH_CACHE_SIZE)
+
+	@staticmethod
+	async def _prefetch(function: Callable[[FetchScope], Awaitable[T]]) -> T:
+		# only for this task, which has its own copy of the context
+		request_priority.set(RequestPriority.BACKGROUND)
+		fetches = FetchScope()
+		try:
+			return await function(fetches)
+		finally:
+			fetches.close()
+
+	@staticmethod
+	def _on_prefetch_done(task: asyncio.Task):
+		if not task.cancelled():
+			# a failed prefetch is just fetched again when it's needed
+			task.exception()
+
+	async def start(self, mastodon: Client, key: tuple, function: Callable[[FetchScope], Awaitable[T]]):
+		"""
+		starts fetching something in the background, for take() to pick up later.
+		it's async so that it can be a background task of a response, but it doesn't wait for the fetch
+		"""
+		if self.ttl <= 0:
+			return
+
+		task = asyncio.ensure_future(self._prefetch(function))
+		task.add_done_callback(self._on_prefetch_done)
+		self._prefetches.set((mastodon.token, *key), (task, time.monotonic()))
+
+	async def take(self, mastodon: Client, key: tuple) -> Optional[T]:
+		"""the prefetched result for key, waiting for it if it's still being fetched. None if there isn't one"""
+		prefetch = self._prefetches.pop((mastodon.token, *key))
+		if prefetch is None:
+			if self.ttl > 0:
+				self.misses += 1
+			return None
+
+		task, started_at = prefetch
+		if time.monotonic() - started_at > self.ttl:
+			task.cancel()
+			self.misses += 1
+			return None
+
+		try:
+			result = await task
+		except (aiohttp.ClientError, asyncio.TimeoutError):
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return result
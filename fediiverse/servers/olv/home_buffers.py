@@ -0,0 +1,219 @@
+"""
+
+The first page of recently active users' home timelines, kept up to date by the streaming api.
+
+The first time someone opens their home timeline, we open a streaming connection to their instance for them,
+and fill their buffer from the instance once it's open. New statuses, edits and deletions come in over the
+connection, so the next views of the first page don't have to wait for the instance at all.
+A buffer is closed once its user hasn't looked at it for a while.
+
+If the connection drops, the buffer is thrown away and filled again once it's back,
+since we can't know what we missed in between.
+
+"""
+import asyncio
+import time
+import traceback
+from typing import Iterable, Optional
+
+import aiohttp
+from pydantic import ValidationError
+
+from ...mastodon import Client
+from ...mastodon.models.status import Status
+from ...mastodon.ratelimits import RequestPriority, request_priority
+
+# statuses kept per user. a page is 20, and this leaves room for the ones that get deleted
+HOME_BUFFER_SIZE = 40
+EVICTION_INTERVAL = 60
+RECONNECT_DELAYS = [1, 5, 30, 60]
+
+
+class HomeBuffer:
+	def __init__(self, mastodon: Client):
+		self.mastodon = mastodon
+		self.last_used_at = time.monotonic()
+		# newest first. None until it's filled, and again whenever the connection drops
+		self.statuses: Optional[list[Status]] = None
+		# statuses that were streamed before the buffer was filled
+		self._pending_statuses: list[Status] = []
+		# whether the timeline had more statuses than the buffer was filled with
+		self._has_more = True
+		self._connected_at: Optional[float] = None
+		self._task = asyncio.create_task(self._run())
+
+	def get_page(self, limit: int) -> Optional[list[Status]]:
+		self.last_used_at = time.monotonic()
+		if self.statuses is None:
+			return None
+		if len(self.statuses) < limit and self._has_more:
+			# deletions left it short of a page, the page from the instance has the ones after it
+			return None
+		return self.statuses[:limit]
+
+	def fill(self, statuses: list[Status], fetched_at: float, limit: int):
+		"""
+		fills the buffer with a first page of limit statuses that was fetched from the instance, starting at fetched_at
+		"""
+		if self._connected_at is None or fetched_at < self._connected_at:
+			# it could be missing statuses that came in before we were connected
+			return
+
+		self._has_more = len(statuses) >= limit
+
+		pending_ids = {status.id for status in self._pending_statuses}
+		self.statuses = [
+			*self._pending_statuses,
+			*(status for status in statuses if status.id not in pending_ids)
+		][:HOME_BUFFER_SIZE]
+		self._pending_statuses = []
+
+	def _add(self, status: Status):
+		if self.statuses is None:
+			self._pending_statuses = [status, *self._pending_statuses][:HOME_BUFFER_SIZE]
+		else:
+			self.statuses = [status, *(buffered for buffered in self.statuses if buffered.id != status.id)]
+			del self.statuses[HOME_BUFFER_SIZE:]
+
+	def _remove(self, status_id: str):
+		if self.statuses is not None:
+			self.statuses = [
+				status for status in self.statuses
+				if status.id != status_id and not (status.reblog and status.reblog.id == status_id)
+			]
+
+	def update(self, statuses: Iterable[Status]):
+		"""
+		replaces buffered statuses with newer versions of them (e.g. after the user favourited one).
+		they have to be fetched as the user, anything else doesn't have their flags and filter results
+		"""
+		if self.statuses is None:
+			return
+
+		updated_statuses = {status.id: status for status in statuses if status.favourited is not None}
+		for index, buffered in enumerate(self.statuses):
+			if buffered.id in updated_statuses:
+				self.statuses[index] = updated_statuses[buffered.id]
+			elif buffered.reblog and buffered.reblog.id in updated_statuses:
+				updated_status = updated_statuses[buffered.reblog.id]
+				# a boost has the same favourited/reblogged/bookmarked as the status it boosts
+				self.statuses[index] = buffered.model_copy(update={
+					"reblog": updated_status,
+					"favourited": updated_status.favourited,
+					"reblogged": updated_status.reblogged,
+					"bookmarked": updated_status.bookmarked
+				})
+
+	def _handle_event(self, event: str, payload: Optional[str]):
+		if event == "update":
+			self._add(Status.model_validate_json(payload))
+		elif event == "status.update":
+			self.update([Status.model_validate_json(payload)])
+		elif event == "delete":
+			self._remove(payload)
+		elif event == "filters_changed":
+			# the filter results of the buffered statuses are out of date
+			self.statuses = None
+
+	async def _run(self):
+		request_priority.set(RequestPriority.BACKGROUND)
+		reconnect_delay_index = 0
+		while True:
+			try:
+				async with self.mastodon.streaming.connect("user") as stream:
+					self._connected_at = time.monotonic()
+					reconnect_delay_index = 0
+					# whatever is streamed in the meantime waits in the connection, and is applied right after
+					self.fill(
+						await self.mastodon.timelines.get_home_timeline(limit=HOME_BUFFER_SIZE),
+						self._connected_at,
+						HOME_BUFFER_SIZE
+					)
+					async for event, payload in stream:
+						self._handle_event(event, payload)
+			except (aiohttp.ClientError, asyncio.TimeoutError, ValidationError, ValueError):
+				pass  # we'll just try again in a bit
+			except Exception as exception:
+				# e.g. a malformed frame. nothing awaits this task, and a buffer that stopped would still hold its slot
+				traceback.print_exception(exception)
+			finally:
+				self._connected_at = None
+				self.statuses = None
+				self._pending_statuses = []
+
+			await asyncio.sleep(RECONNECT_DELAYS[reconnect_delay_index])
+			reconnect_delay_index = min(reconnect_delay_index + 1, len(RECONNECT_DELAYS) - 1)
+
+	def close(self):
+		self._task.cancel()
+
+
+class HomeBuffers:
+	"""
+	the home buffers of the max_users most recently active users, by access token.
+	use it with `async with`, so idle buffers get closed. a max_users of 0 disables the buffers.
+	"""
+
+	def __init__(self, max_users: int, idle_timeout: float):
+		self.max_users = max_users
+		self.idle_timeout = idle_timeout
+		self.hits = 0
+		self.misses = 0
+		self._buffers: dict[str, HomeBuffer] = {}
+		self._eviction_task: Optional[asyncio.Task] = None
+
+	def get_first_page(self, mastodon: Client, limit: int) -> Optional[list[Status]]:
+		"""
+		the first page of the user's home timeline if it's buffered. otherwise, starts buffering it,
+		and the page fetched from the instance should be passed to fill()
+		"""
+		if self.max_users <= 0 or not mastodon.token:
+			return None
+
+		home_buffer = self._buffers.get(mastodon.token)
+		if home_buffer is None:
+			if len(self._buffers) >= self.max_users:
+				least_recently_used = min(self._buffers, key=lambda token: self._buffers[token].last_used_at)
+				self._buffers.pop(least_recently_used).close()
+			home_buffer = HomeBuffer(mastodon)
+			self._buffers[mastodon.token] = home_buffer
+
+		page = home_buffer.get_page(limit)
+		if page is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+		return page
+
+	def fill(self, mastodon: Client, statuses: list[Status], fetched_at: float, limit: int):
+		home_buffer = self._buffers.get(mastodon.token)
+		if home_buffer is not None:
+			home_buffer.fill(statuses, fetched_at, limit)
+
+	def update(self, mastodon: Client, statuses: Iterable[Status]):
+		home_buffer = self._buffers.get(mastodon.token)
+		if home_buffer is not None:
+			home_buffer.update(statuses)
+
+	def _evict_idle(self):
+		now = time.monotonic()
+		for token, home_buffer in list(self._buffers.items()):
+			if now - home_buffer.last_used_at > self.idle_timeout:
+				self._buffers.pop(token).close()
+
+	async def _run_evictions(self):
+		while True:
+			await asyncio.sleep(EVICTION_INTERVAL)
+			self._evict_idle()
+
+	async def __aenter__(self):
+		if self.max_users > 0:
+			self._eviction_task = asyncio.create_task(self._run_evictions())
+		return self
+
+	async def __aexit__(self, *_):
+		if self._eviction_task is not None:
+			self._eviction_task.cancel()
+		for home_buffer in self._buffers.values():
+			home_buffer.close()
+		self._buffers.clear()
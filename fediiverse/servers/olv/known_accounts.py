@@ -0,0 +1,166 @@
+"""
+
+Accounts we've already seen, so opening a profile or following a mention doesn't always need an upstream lookup.
+
+Every account we parse anyway (status authors, boosted authors, profiles) is kept in an in-memory LRU, and every acct
+we come across (mentions included) goes into an acct -> id index, which is saved in the store so it survives restarts.
+Account ids only mean something on the instance they came from, so both are keyed by the domain of the user's instance.
+
+"""
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from aiohttp import ClientResponseError
+from yarl import URL
+
+from ...cache import LRUCache, MISSING
+from ...mastodon import Client
+from ...mastodon.models.account import Account
+from ...mastodon.models.status import Status
+from ...metrics import register_cache
+from ...storage import FediiverseStore
+
+# statuses refresh the cached accounts all the time, but a profile nobody posts from shouldn't show stale counts forever
+ACCOUNT_CACHE_TTL = 300
+
+
+@dataclass
+class CachedAccount:
+	account: Account
+	cached_at: float
+
+	@property
+	def is_fresh(self) -> bool:
+		return time.monotonic() - self.cached_at < ACCOUNT_CACHE_TTL
+
+
+def get_acct_key(acct: str, domain: str) -> str:
+	"""local accounts don't have a domain in their acct, but /acct/ links always do"""
+	acct = acct.lower().removeprefix("@")
+	return acct if "@" in acct else f"{acct}@{domain}"
+
+
+def get_acct_keys(domain: str, acct: str, username: str, url: str) -> set[str]:
+	# mention links use the host of the profile url, which isn't always the domain in the acct
+	# (e.g. an instance on social.example.com with accounts like @user@example.com)
+	acct_keys = {get_acct_key(acct, domain)}
+	url_host = URL(url).host
+	if url_host:
+		acct_keys.add(f"{username}@{url_host}".lower())
+	return acct_keys
+
+
+class KnownAccounts:
+	def __init__(self, store: FediiverseStore, cache_size: int):
+		self.store = store
+		# (domain, account id) -> account
+		self._accounts: LRUCache[tuple[str, str], CachedAccount] = LRUCache(cache_size)
+		# (domain, acct key) -> account id, the recently used part of the index in the store
+		self._account_ids: LRUCache[tuple[str, str], str] = LRUCache(cache_size)
+		# domain -> acct key -> account id, waiting to be saved to the store
+		self._unsaved_account_ids: dict[str, dict[str, str]] = {}
+		self._save_task: Optional[asyncio.Task] = None
+
+	def _remember_account_id(self, domain: str, acct_keys: set[str], account_id: str):
+		for acct_key in acct_keys:
+			# only checking whether it changed, which isn't a cache hit or miss
+			if self._account_ids.get((domain, acct_key), count=False) == account_id:
+				continue
+			self._account_ids.set((domain, acct_key), account_id)
+			self._unsaved_account_ids.setdefault(domain, {})[acct_key] = account_id
+
+	def _remember_account(self, domain: str, account: Account):
+		self._accounts.set((domain, account.id), CachedAccount(account=account, cached_at=time.monotonic()))
+		self._remember_account_id(
+			domain,
+			get_acct_keys(domain, account.acct, account.username, account.url),
+			account.id
+		)
+
+	def _save_later(self):
+		# writing to the store shouldn't hold up the page, and one write per page is plenty
+		if self._unsaved_account_ids and self._save_task is None:
+			self._save_task = asyncio.create_task(self._save())
+
+	async def _save(self):
+		try:
+			while self._unsaved_account_ids:
+				unsaved_account_ids, self._unsaved_account_ids = self._unsaved_account_ids, {}
+				for domain, account_ids in unsaved_account_ids.items():
+					await self.store.save_account_ids(domain, account_ids)
+		except Exception as exception:
+			# nobody awaits this task. the ids are still in memory, and the next page saves the ones it sees
+			traceback.print_exception(exception)
+		finally:
+			self._save_task = None
+
+	def register_metrics(self):
+		register_cache("accounts", self._accounts)
+		register_cache("account_ids", self._account_ids)
+
+	async def flush(self):
+		"""waits for the index to be saved. call it before closing the store"""
+		if self._save_task is not None:
+			await self._save_task
+
+	def remember_account(self, mastodon: Client, account: Account):
+		self._remember_account(mastodon.host_url.host, account)
+		self._save_later()
+
+	def remember_statuses(self, mastodon: Client, statuses: Iterable[Status]):
+		domain = mastodon.host_url.host
+		for status in statuses:
+			for visible_status in (status, status.reblog) if status.reblog else (status,):
+				self._remember_account(domain, visible_status.account)
+				for mention in visible_status.mentions:
+					self._remember_account_id(
+						domain,
+						get_acct_keys(domain, mention.acct, mention.username, mention.url),
+						mention.id
+					)
+		self._save_later()
+
+	def get_cached_account(self, mastodon: Client, account_id: str) -> Optional[Account]:
+		cached_account = self._accounts.get((mastodon.host_url.host, account_id))
+		if cached_account is MISSING or not cached_account.is_fresh:
+			return None
+		return cached_account.account
+
+	async def get_account_id(self, mastodon: Client, acct: str) -> Optional[str]:
+		"""the id of an account by its acct, if we've seen it before. doesn't make any upstream requests"""
+		domain = mastodon.host_url.host
+		acct_key = get_acct_key(acct, domain)
+
+		account_id = self._account_ids.get((domain, acct_key))
+		if account_id is MISSING:
+			account_id = await self.store.get_account_id(domain, acct_key)
+			if account_id is not None:
+				self._account_ids.set((domain, acct_key), account_id)
+		return account_id
+
+	async def get_account(self, mastodon: Client, account_id: str) -> Account:
+		account = self.get_cached_account(mastodon, account_id)
+		if account is None:
+			account = await mastodon.accounts.get_account(account_id)
+			self.remember_account(mastodon, account)
+		return account
+
+	async def lookup_account(self, mastodon: Client, acct: str) -> Account:
+		account_id = await self.get_account_id(mastodon, acct)
+		if account_id is not None:
+			try:
+				return await self.get_account(mastodon, account_id)
+			except ClientResponseError as error:
+				# the account is gone, but someone else might have its acct now
+				if error.status != 404:
+					raise error from None
+
+		account = await mastodon.accounts.lookup_account(acct)
+		# the acct we were asked about isn't always one of the account's own, e.g. when the instance is on a subdomain
+		domain = mastodon.host_url.host
+		self._remember_account_id(domain, {get_acct_key(acct, domain)}, account.id)
+		self.remember_account(mastodon, account)
+		return account
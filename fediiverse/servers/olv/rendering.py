@@ -1,18 +1,21 @@
 import asyncio
 import base64
+import copy
 import datetime
-import re
 import string
+import time
 import warnings
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Optional, Callable, Awaitable
 
 import aiofiles
-import cairosvg
-import emoji as emoji_lib
 from bs4 import BeautifulSoup, Tag
 from yarl import URL
 
+from .sanitizer import sanitize_content, ContentNode
+from ...cache import LRUCache, MISSING
+from ...emojis import get_emoji_png, get_emoji_codepoints, get_available_emojis, get_emoji_url, iter_emoji_matches
 from ...mastodon import Client
 from ...mastodon.models.account import Account
 from ...mastodon.models.custom_emoji import CustomEmoji
@@ -21,7 +24,8 @@ from ...mastodon.models.media_attachment import MediaAttachmentType, MediaAttach
 from ...mastodon.models.preview_card import PreviewCardType
 from ...mastodon.models.status import Status, StatusVisibility
 from ...servers.img import get_proxied_url
-from ...storage import get_config, FediiverseMode, EMOJIS_PATH
+from ...storage import get_config, FediiverseMode, EmojiMode
+from ...utils import filter_nulls_from_dict
 from ...version import FEDIIVERSE_VERSION_STR
 
 config = get_config()
@@ -35,157 +39,90 @@ async def run_as_async(func: Callable):
 	return await asyncio.get_event_loop().run_in_executor(None, func)
 
 
-def get_emoji_img_src(emoji: str, size: int = 72) -> Optional[str]:
-	# remove variant selectors
-	if "\u200D" not in emoji:
-		emoji = emoji.replace("\uFE0F", "")
+def get_emoji_img_src(emoji: str, size: int = 16) -> Optional[str]:
+	codepoints = get_emoji_codepoints(emoji)
 
-	codepoint_str = "-".join(f"{ord(char):x}" for char in emoji)
-	svg_path = EMOJIS_PATH / f"{codepoint_str}.svg"
-	if not svg_path.exists():
-		return None
-
-	# this is blocking but we use run_as_async higher up
-	with open(svg_path, "rb") as file:
-		svg_contents = file.read()
+	if config.rendering.emoji_mode == EmojiMode.URL:
+		# served by the olv server (or nginx) and cached by the browser across pages
+		if codepoints not in get_available_emojis():
+			return None
+		return get_emoji_url(codepoints, size)
 
-	png_data = cairosvg.svg2png(
-		output_width=size,
-		output_height=size,
-		bytestring=svg_contents
-	)
+	# this is blocking (on a cache miss) but we use run_as_async higher up
+	png_data = get_emoji_png(codepoints, size)
+	if png_data is None:
+		return None
 
 	return "data:image/png;base64," + base64.b64encode(png_data).decode("ascii")
 
 
-def inline_emojify(
-		text: string,
-		soup: BeautifulSoup,
+def emojify(
+		text: str,
 		*,
 		shortcode_index: Optional[dict[str, CustomEmoji]] = None,
-):
+) -> list[str | tuple[str, str]]:
 	"""
-	returns a list of elements representing the input string with all emojis converted to inline emoji elements.
+	splits the input string into plain strings and (class name, src) pairs for inline emoji images.
 	if shortcode_index is specified custom emojis are also converted.
 	"""
 
-	text_matches: list[dict] = []
-
-	if shortcode_index:
-		# PHASE 0: parse out the custom emojis
-		index = 0
-		shortcode_pattern = re.compile(":([a-zA-Z0-9_]+):")
-
-		while True:
-			match = shortcode_pattern.search(text, index)
-			if not match:
-				break
-
-			match_start, match_end = match.span()
-			index = match_end
+	parts = []
+	index = 0
+	for match in iter_emoji_matches(text, shortcodes=bool(shortcode_index)):
+		match_start, match_end = match.span()
 
-			match_shortcode = match.group(1)
-			if match_shortcode not in shortcode_index:
+		if match.lastgroup == "shortcode":
+			custom_emoji = shortcode_index.get(match["shortcode"])
+			if not custom_emoji:
 				# invalid emoji
 				continue
 
-			text_matches.append({
-				"type": "custom_emoji",
-				"start": match_start,
-				"end": match_end,
-				"shortcode": match_shortcode
-			})
-
-	# PHASE 1: parse out the unicode emojis
-	for emoji_match in emoji_lib.emoji_list(text):
-		text_matches.append({
-			"type": "emoji",
-			"start": emoji_match["match_start"],
-			"end": emoji_match["match_end"],
-			"emoji": emoji_match["emoji"]
-		})
-
-	text_matches.sort(key=lambda match_: match_["start"])
-
-	# PHASE 2: actually convert the text into usual
-	children = []
-	index = 0
-	for match in text_matches:
-		match_type = match["type"]
-		match_start = match["start"]
-		match_end = match["end"]
-
-		children.append(text[index:match_start])
-
-		if match_type == "custom_emoji":
-			match_shortcode = match["shortcode"]
-			custom_emoji = shortcode_index[match_shortcode]
-			emoji_el = soup.new_tag("img")
-			emoji_el["class"] = "custom-emoji"
-			emoji_el["src"] = get_proxied_url(custom_emoji.url, max_height=32)  # resizes down to both 16px and 14px
-			children.append(emoji_el)
-		elif match_type == "emoji":
+			parts.append(text[index:match_start])
+			# resizes down to both 16px and 14px
+			parts.append(("custom-emoji", get_proxied_url(custom_emoji.url, max_height=32)))
+		else:
 			match_emoji = match["emoji"]
+			parts.append(text[index:match_start])
 			emoji_src = get_emoji_img_src(
 				emoji=match_emoji,
 				size=16
 			)
 
 			if emoji_src:
-				emoji_el = soup.new_tag("img")
-				emoji_el["class"] = "emoji"
-				emoji_el["src"] = emoji_src
-				children.append(emoji_el)
+				parts.append(("emoji", emoji_src))
 			else:
 				warnings.warn(f"warning: couldn't find emoji {match_emoji!r}")
-		else:
-			raise NotImplementedError("idfk")
 
 		index = match_end
 
-	children.append(text[index:])  # if theres any left.
-
-	return children
+	parts.append(text[index:])  # if theres any left.
 
+	return parts
 
-acct_mention_regex = re.compile("^@([a-zA-Z0-9_.-]+)(?:@([a-z0-9_.-]+))?$")  # matches: @a@a or @a
 
-
-def check_if_acct_mention(
-		text: str,
-		href: str
-) -> Optional[str]:
+def inline_emojify(
+		text: string,
+		soup: BeautifulSoup,
+		*,
+		shortcode_index: Optional[dict[str, CustomEmoji]] = None,
+):
 	"""
-	check if a link with content `text` and href `href` is a link to another account
+	returns a list of elements representing the input string with all emojis converted to inline emoji elements.
+	if shortcode_index is specified custom emojis are also converted.
 	"""
-	acct_mention_match = acct_mention_regex.match(text)
-	if not acct_mention_match:
-		return None
-
-	mentioned_username: str = acct_mention_match.group(1)
-	mentioned_host: str | None = acct_mention_match.group(2)  # not always present
 
-	href_url = URL(href)
-	url_host = href_url.host
-
-	if mentioned_host and url_host != mentioned_host:
-		return None
-
-	if len(href_url.parts) == 3:
-		if not href_url.parts[1] in {"users", "u"}:
-			return None
-		url_username = href_url.parts[2]
-	elif len(href_url.parts) == 2:
-		if not href_url.parts[1].startswith("@"):
-			return None
-		url_username = href_url.parts[1].removeprefix("@")
-	else:
-		return None
-
-	if mentioned_username != url_username:
-		return None
+	children = []
+	for part in emojify(text, shortcode_index=shortcode_index):
+		if isinstance(part, str):
+			children.append(part)
+		else:
+			class_name, src = part
+			emoji_el = soup.new_tag("img")
+			emoji_el["class"] = class_name
+			emoji_el["src"] = src
+			children.append(emoji_el)
 
-	return f"{url_username}@{url_host}"
+	return children
 
 
 def beautifully_insert_content(
@@ -197,59 +134,24 @@ def beautifully_insert_content(
 	content_shortcode_index = {
 		custom_emoji.shortcode: custom_emoji for custom_emoji in emojis
 	}
-	content_soup = BeautifulSoup(content, "html.parser")
-
-	def transplant(src_el: Tag, dest_el: Tag):
-		for child in list(src_el.children):
-			if isinstance(child, Tag):
-				tag_name = child.name.lower()
-				if tag_name not in {
-					"del", "pre", "blockquote", "code", "b",
-					"strong", "u", "i", "em", "ul", "ol", "li",
-					"h1", "h2", "h3", "h4", "h5", "h6", "p",
-					"a", "span", "br"
-				}:
-					continue
-
-				if tag_name == "a":
-					href = child.attrs.get("href")
-
-					# special case for user mentions
-					acct = check_if_acct_mention(child.text, href)
-
-					if acct:
-						attrs = {
-							"href": f"/acct/{acct}",
-							"contextual": ""
-						}
-					else:
-						attrs = {
-							"href": href,
-							"target": "_blank",
-							"rel": "nofollow noopener noreferrer",  # not like it matters...
-							"onclick": f"event.preventDefault(); promptLink({href!r});"
-						}
-				else:
-					attrs = {}
 
-				new_child = soup.new_tag(
-					name=tag_name,
-					attrs=attrs
-				)
-				transplant(child, new_child)
-				dest_el.append(new_child)
-			elif isinstance(child, str):
-				text = child
-				children = inline_emojify(
-					text=text,
+	def insert_nodes(nodes: list[ContentNode], dest_el: Tag):
+		for node in nodes:
+			if isinstance(node, str):
+				dest_el.extend(inline_emojify(
+					text=node,
 					soup=soup,
 					shortcode_index=content_shortcode_index
-				)
-				dest_el.extend(children)
+				))
 			else:
-				continue
+				new_child = soup.new_tag(
+					name=node.name,
+					attrs=dict(node.attrs)
+				)
+				insert_nodes(node.children, new_child)
+				dest_el.append(new_child)
 
-	transplant(content_soup, destination_el)
+	insert_nodes(sanitize_content(content), destination_el)
 
 
 def render_header_user(account: Account, soup: BeautifulSoup, link: bool = True):
@@ -300,6 +202,50 @@ def render_stat(soup: BeautifulSoup, label: str, value: int):
 	return stat_el
 
 
+def get_status_cache_key(status: Status, **options) -> tuple:
+	"""
+	a key for everything a rendered status depends on. options are the keyword arguments it's rendered with.
+	content, media and spoilers only change when a status is edited.
+	the cache is shared by users of every instance, and ids only mean something on one instance, so statuses are
+	keyed by their uri too, along with every id that ends up in the markup.
+	"""
+	visible_status = status.reblog if status.reblog else status
+
+	return (
+		status.uri,
+		visible_status.uri,
+		status.id,
+		visible_status.id,
+		status.account.id,
+		visible_status.account.id,
+		status.edited_at,
+		visible_status.edited_at,
+		visible_status.reblogs_count,
+		visible_status.favourites_count,
+		visible_status.replies_count,
+		visible_status.favourited,
+		visible_status.reblogged,
+		visible_status.bookmarked,
+		# cards are fetched some time after a status is posted
+		visible_status.card.url if visible_status.card else None,
+		# profiles can change without any of the statuses changing
+		status.account.display_name,
+		visible_status.account.display_name,
+		str(visible_status.account.avatar),
+		tuple(
+			(filter_result.filter.id, filter_result.filter.title, filter_result.filter.filter_action)
+			for filter_result in visible_status.filtered
+		),
+		tuple(sorted(options.items()))
+	)
+
+
+# copies of rendered (filter element, status element) pairs. None if the status is hidden by a filter
+status_fragment_cache: LRUCache[tuple, tuple[Optional[Tag], Tag] | None] = LRUCache(
+	config.rendering.fragment_cache_size
+)
+
+
 def render_status(
 		status: Status,
 		container: Tag,
@@ -311,10 +257,31 @@ def render_status(
 		expanded: bool = False,
 		utc_offset: Optional[datetime.timedelta] = None
 ) -> Tag | None:
+	cache_key = get_status_cache_key(
+		status,
+		local_user_id=local_user_id,
+		include_actions=include_actions,
+		disable_selection=disable_selection,
+		expanded=expanded,
+		utc_offset=utc_offset
+	)
+	cached_fragment = status_fragment_cache.get(cache_key)
+	if cached_fragment is None:
+		return None
+	elif cached_fragment is not MISSING:
+		# copying skips sanitizing the content, emojis and proxied urls
+		cached_filter_el, cached_status_el = cached_fragment
+		if cached_filter_el is not None:
+			container.append(copy.copy(cached_filter_el))
+		status_el = copy.copy(cached_status_el)
+		container.append(status_el)
+		return status_el
+
 	parent_status = status
 	status = parent_status.reblog if parent_status.reblog else parent_status
 
 	is_filtered = status.filtered and len(status.filtered)
+	filter_el = None
 
 	status_el = soup.new_tag("div")
 	status_el["id"] = f"status-{parent_status.id}"
@@ -330,6 +297,7 @@ def render_status(
 	if is_filtered:
 		for filter_result in status.filtered:
 			if filter_result.filter.filter_action == FilterAction.HIDE:
+				status_fragment_cache.set(cache_key, None)
 				return None
 
 		status_el["style"] = "display: none"
@@ -490,7 +458,8 @@ def render_status(
 				full_size_img_url = get_proxied_url(attachment.url, max_width=400, max_height=1024)
 
 				actual_min_height = max(min_height, min(ideal_height, max_height))
-				image_el = soup.new_tag("div", attrs={
+				# copying a tag drops attributes set to None, so leave them out to begin with
+				image_el = soup.new_tag("div", attrs=filter_nulls_from_dict({
 					"class": "media-gallery__item-img",
 					"style": "; ".join([
 						f"background-image: url({preview_img_url!r})",
@@ -500,7 +469,7 @@ def render_status(
 					"role": "img",
 					"title": attachment.description,
 					"alt": attachment.description
-				})
+				}))
 
 				image_button_el = soup.new_tag("button", attrs={
 					"class": "media-gallery__item-button",
@@ -538,7 +507,7 @@ def render_status(
 		interactive = card.type == PreviewCardType.VIDEO
 		large_image = interactive or (card.image and (card.width > card.height))
 
-		card_el = soup.new_tag("a", attrs={
+		card_el = soup.new_tag("a", attrs=filter_nulls_from_dict({
 			"class": "status-card",
 			"data-large-image": "true" if large_image else "false",
 
@@ -546,7 +515,7 @@ def render_status(
 			"target": "_blank",
 			"rel": "nofollow noopener noreferrer",  # not like it matters...
 			"onclick": f"event.preventDefault(); promptLink({card.url!r});"
-		})
+		}))
 
 		if card.image:
 			card_image_el = soup.new_tag("div", attrs={
@@ -752,21 +721,72 @@ def render_status(
 	status_el.append(actions_el)
 	container.append(status_el)
 
+	status_fragment_cache.set(cache_key, (
+		copy.copy(filter_el) if filter_el is not None else None,
+		copy.copy(status_el)
+	))
+
 	return status_el
 
 
-_cached_templates: dict[str, str] = {}
+@dataclass
+class StatusListEntry:
+	"""a status in a page's .status-list, and how to render it"""
+	status: Status
+	expanded: bool = False
+	extra_class: Optional[str] = None
+
+
+async def render_status_list(
+		entries: list[StatusListEntry | Tag],
+		list_el: Tag,
+		soup: BeautifulSoup,
+		*,
+		local_user_id: str,
+		utc_offset: Optional[datetime.timedelta] = None
+) -> float:
+	"""
+	renders statuses (and any other elements in between) into list_el.
+	the whole list is rendered in one executor task. returns how long that took in seconds
+	"""
+
+	def render_entries() -> float:
+		start_time = time.perf_counter()
+
+		for entry in entries:
+			if isinstance(entry, Tag):
+				list_el.append(entry)
+				continue
+
+			status_el = render_status(
+				entry.status, list_el, soup,
+				local_user_id=local_user_id,
+				expanded=entry.expanded,
+				utc_offset=utc_offset
+			)
+			if status_el and entry.extra_class:
+				status_el.attrs["class"] += f" {entry.extra_class}"
+
+		return time.perf_counter() - start_time
+
+	return await run_as_async(render_entries)
+
+
+_cached_templates: dict[str, BeautifulSoup] = {}
 
 
 async def load_template(filename: str, *, user_id: str, is_miiverse: bool) -> BeautifulSoup:
-	html = _cached_templates.get(filename)
-	if not html:
+	cached_soup = _cached_templates.get(filename)
+	if cached_soup is not None:
+		# copying the parsed tree is a lot cheaper than parsing the HTML again
+		soup = copy.copy(cached_soup)
+	else:
 		async with aiofiles.open(templates_path / filename, "r") as file:
 			html = await file.read()
-			if config.mode == FediiverseMode.PROD:
-				_cached_templates[filename] = html
 
-	soup = BeautifulSoup(html, "html.parser")
+		soup = BeautifulSoup(html, "html.parser")
+		if config.mode == FediiverseMode.PROD:
+			_cached_templates[filename] = copy.copy(soup)
 
 	# used for applying some additional css hacks for miiverse browser specifically
 	root_el = soup.find("html")
@@ -777,6 +797,17 @@ async def load_template(filename: str, *, user_id: str, is_miiverse: bool) -> Be
 	return soup
 
 
+PROFILE_TIMELINE_LIMIT = 20
+
+
+async def fetch_profile_timeline(mastodon: Client, account_id: str, *, max_id: Optional[str] = None) -> list[Status]:
+	return await mastodon.accounts.get_account_statuses(
+		max_id=max_id,
+		account_id=account_id,
+		limit=PROFILE_TIMELINE_LIMIT
+	)
+
+
 async def render_profile(
 		account: Account,
 		*,
@@ -785,9 +816,13 @@ async def render_profile(
 		max_id: Optional[str] = None,
 		include_description: bool = True,
 		include_fields: bool = True,
-		utc_offset: Optional[datetime.timedelta] = None,
-		is_miiverse: bool = False
-) -> tuple[BeautifulSoup, str | None]:
+		is_miiverse: bool = False,
+		timeline: Optional[Awaitable[list[Status]]] = None
+) -> tuple[BeautifulSoup, list[Status]]:
+	"""
+	renders everything except the statuses, and returns the soup and the statuses to render into .status-list.
+	timeline is the (already started) fetch of the statuses, if the caller started it early. otherwise they're fetched here
+	"""
 	soup = await load_template("profile.html", user_id=user_id, is_miiverse=is_miiverse)
 
 	older_post_indicator_el = soup.select_one(".older-post-indicator")
@@ -877,21 +912,7 @@ async def render_profile(
 	else:
 		fields_el.decompose()
 
-	limit = 20
-
-	timeline = await mastodon.accounts.get_account_statuses(
-		max_id=max_id,
-		account_id=account.id,
-		limit=limit
-	)
-
-	list_el = soup.select_one(".status-list")
-	for status in timeline:
-		await run_as_async(lambda: render_status(status, list_el, soup, local_user_id=user_id, utc_offset=utc_offset))
-
-	try:
-		new_max_id = timeline[len(timeline) - 1].id
-	except IndexError:
-		new_max_id = None
+	if timeline is None:
+		timeline = fetch_profile_timeline(mastodon, account.id, max_id=max_id)
 
-	return soup, new_max_id
+	return soup, await timeline
@@ -0,0 +1,310 @@
+"""
+
+Public timelines and trending statuses, shared by everyone on an instance.
+
+These return the same statuses for every user, so each page is fetched without a token, at most once per TTL per
+instance, and every viewer gets a copy with their own state laid over it:
+- favourited, reblogged and bookmarked, from the statuses we've seen as them (including the ones they just acted on).
+  the ones on the page we haven't seen as them yet are fetched as them first, a batch of ids per request
+- statuses that batch leaves out (by accounts that blocked them, or deleted since) are left out
+- filter results, by matching their public filters here the same way Mastodon does
+- statuses by accounts and domains they've blocked or muted are left out
+
+This is close to what the instance would show them, but not the same: the API doesn't tell us which languages they
+chose to see (chosen_languages), so statuses in other languages are shown anyway. That's why it's opt-in.
+
+Instances that don't allow timelines without logging in (or don't have the endpoints we need for the overlay,
+like fetching several statuses at once before Mastodon 4.3) are fetched per user, like before.
+
+"""
+import asyncio
+import datetime
+import html
+import re
+import time
+from dataclasses import dataclass
+from typing import Iterable, Literal, NamedTuple, Optional
+
+from aiohttp import ClientResponseError
+
+from .fetching import FetchScope
+from ...cache import LRUCache, MISSING
+from ...mastodon import Client
+from ...mastodon.models.filter import Filter, FilterContext
+from ...mastodon.models.filter_result import FilterResult
+from ...mastodon.models.status import Status
+from ...mastodon.ratelimits import request_priority
+from ...mastodon.singleflight import SingleFlight
+from ...metrics import register_cache, register_flights
+
+SharedTimelineKind = Literal["trending", "local", "federated"]
+
+# filters, blocks and mutes can only be changed outside fediiverse, so they don't need to be checked that often
+VIEWER_CONTEXT_TTL = 300
+# how long an instance that can't be shared is fetched per user before trying again
+UNSHARED_DOMAIN_TTL = 3600
+
+SHARED_TIMELINE_CACHE_SIZE = 256
+VIEWER_CONTEXT_CACHE_SIZE = 1024
+STATUS_FLAGS_CACHE_SIZE = 65536
+# how many statuses are fetched per request to get a user's flags, Mastodon's limit
+STATUS_FLAGS_BATCH_SIZE = 20
+
+# what instances answer when they want a login for their public timelines,
+# or when they don't have filters/blocks/mutes endpoints for the overlay
+UNSHARED_STATUSES = {401, 403, 404, 405, 422}
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+class StatusFlags(NamedTuple):
+	favourited: Optional[bool]
+	reblogged: Optional[bool]
+	bookmarked: Optional[bool]
+
+
+@dataclass
+class SharedTimeline:
+	statuses: list[Status]
+	fetched_at: float
+
+
+def get_keyword_pattern(filter_: Filter) -> Optional[re.Pattern]:
+	"""the same matching as Mastodon's CustomFilter, every keyword of a filter in one pattern"""
+	keyword_patterns = []
+	for filter_keyword in filter_.keywords or []:
+		keyword = filter_keyword.keyword
+		if filter_keyword.whole_word:
+			start = r"\b" if re.match(r"\w", keyword) else ""
+			end = r"\b" if re.search(r"\w$", keyword) else ""
+			keyword_patterns.append(f"{start}{re.escape(keyword)}{end}")
+		else:
+			keyword_patterns.append(re.escape(keyword))
+
+	if not keyword_patterns:
+		return None
+	return re.compile("|".join(keyword_patterns), re.IGNORECASE)
+
+
+def get_searchable_text(status: Status) -> str:
+	return "\n\n".join([
+		status.spoiler_text,
+		html.unescape(TAG_PATTERN.sub(" ", status.content)),
+		*(attachment.description or "" for attachment in status.media_attachments)
+	])
+
+
+class ViewerContext:
+	"""
+	what a user has set up on their instance that changes which public statuses they see, and how.
+	only what the API lets us read: not who blocked them, or their chosen languages
+	"""
+
+	def __init__(self, filters: list[Filter], hidden_account_ids: set[str], blocked_domains: set[str]):
+		now = datetime.datetime.now(datetime.timezone.utc)
+		self.filters = [
+			(filter_, get_keyword_pattern(filter_))
+			for filter_ in filters
+			if FilterContext.PUBLIC in filter_.context and (filter_.expires_at is None or filter_.expires_at > now)
+		]
+		self.hidden_account_ids = hidden_account_ids
+		self.blocked_domains = blocked_domains
+		self.fetched_at = time.monotonic()
+
+	@property
+	def is_fresh(self) -> bool:
+		return time.monotonic() - self.fetched_at < VIEWER_CONTEXT_TTL
+
+	def is_hidden(self, status: Status) -> bool:
+		for visible_status in (status, status.reblog) if status.reblog else (status,):
+			if visible_status.account.id in self.hidden_account_ids:
+				return True
+			_, _, account_domain = visible_status.account.acct.rpartition("@")
+			if account_domain and account_domain.lower() in self.blocked_domains:
+				return True
+		return False
+
+	def get_filter_results(self, status: Status) -> list[FilterResult]:
+		if not self.filters:
+			return []
+
+		filter_results = []
+		searchable_text = None
+		for filter_, keyword_pattern in self.filters:
+			keyword_matches = None
+			if keyword_pattern is not None:
+				if searchable_text is None:
+					searchable_text = get_searchable_text(status)
+				keyword_matches = list(dict.fromkeys(keyword_pattern.findall(searchable_text))) or None
+
+			status_matches = [
+				filter_status.status_id for filter_status in filter_.statuses or [] if filter_status.status_id == status.id
+			] or None
+
+			if keyword_matches or status_matches:
+				filter_results.append(FilterResult(
+					filter=filter_,
+					keyword_matches=keyword_matches,
+					status_matches=status_matches
+				))
+		return filter_results
+
+
+class SharedTimelines:
+	def __init__(self, ttl: float):
+		self.ttl = ttl
+		# (domain, kind, limit, max_id, offset) -> statuses, as anyone without an account would see them
+		self._timelines: LRUCache[tuple, SharedTimeline] = LRUCache(SHARED_TIMELINE_CACHE_SIZE)
+		self._timeline_flights: SingleFlight[tuple, list[Status]] = SingleFlight()
+		# token -> filters, blocks and mutes
+		self._viewer_contexts: LRUCache[str, ViewerContext] = LRUCache(VIEWER_CONTEXT_CACHE_SIZE)
+		# (token, status id) -> that user's favourited/reblogged/bookmarked, None if they can't see the status
+		self._status_flags: LRUCache[tuple[str, str], Optional[StatusFlags]] = LRUCache(STATUS_FLAGS_CACHE_SIZE)
+		# domain -> when we found out its timelines can't be shared
+		self._unshared_domains: LRUCache[str, float] = LRUCache(SHARED_TIMELINE_CACHE_SIZE)
+
+	def register_metrics(self):
+		register_cache("shared_timelines", self._timelines)
+		register_cache("viewer_contexts", self._viewer_contexts)
+		register_cache("status_flags", self._status_flags)
+		register_flights("shared_timelines", self._timeline_flights)
+
+	def remember_flags(self, mastodon: Client, statuses: Iterable[Status]):
+		"""keeps the user's flags from statuses that were fetched with their token"""
+		for status in statuses:
+			for visible_status in (status, status.reblog) if status.reblog else (status,):
+				if visible_status.favourited is None:
+					continue  # not fetched as anyone
+				self._status_flags.set((mastodon.token, visible_status.id), StatusFlags(
+					favourited=visible_status.favourited,
+					reblogged=visible_status.reblogged,
+					bookmarked=visible_status.bookmarked
+				))
+
+	def _is_shared(self, domain: str) -> bool:
+		if self.ttl <= 0:
+			return False
+		unshared_at = self._unshared_domains.get(domain)
+		return unshared_at is MISSING or time.monotonic() - unshared_at > UNSHARED_DOMAIN_TTL
+
+	@staticmethod
+	async def _fetch(
+		mastodon: Client,
+		kind: SharedTimelineKind,
+		*,
+		limit: int,
+		max_id: Optional[str],
+		offset: Optional[int]
+	) -> list[Status]:
+		if kind == "trending":
+			return await mastodon.trends.get_trending_statuses(limit=limit, offset=offset)
+		# local only, or local AND remote, all of it!
+		return await mastodon.timelines.get_public_timeline(limit=limit, max_id=max_id, local=kind == "local")
+
+	async def _get_shared_timeline(self, anonymous: Client, key: tuple, **kwargs) -> list[Status]:
+		shared_timeline = self._timelines.get(key)
+		if shared_timeline is not MISSING and time.monotonic() - shared_timeline.fetched_at < self.ttl:
+			return shared_timeline.statuses
+
+		async def fetch_shared_timeline() -> list[Status]:
+			statuses = await self._fetch(anonymous, **kwargs)
+			self._timelines.set(key, SharedTimeline(statuses=statuses, fetched_at=time.monotonic()))
+			return statuses
+
+		# prefetches and page loads don't share flights, see Client.request
+		return await self._timeline_flights.run((*key, request_priority.get()), fetch_shared_timeline)
+
+	async def _get_viewer_context(self, mastodon: Client) -> ViewerContext:
+		viewer_context = self._viewer_contexts.get(mastodon.token)
+		if viewer_context is not MISSING and viewer_context.is_fresh:
+			return viewer_context
+
+		filters, blocks, mutes, domain_blocks = await asyncio.gather(
+			mastodon.filters.get_filters(),
+			mastodon.accounts.get_blocks(),
+			mastodon.accounts.get_mutes(),
+			mastodon.accounts.get_domain_blocks()
+		)
+		viewer_context = ViewerContext(
+			filters=filters,
+			hidden_account_ids={account.id for account in [*blocks, *mutes]},
+			blocked_domains={domain.lower() for domain in domain_blocks}
+		)
+		self._viewer_contexts.set(mastodon.token, viewer_context)
+		return viewer_context
+
+	async def _fetch_missing_flags(self, mastodon: Client, statuses: list[Status]):
+		"""fetches the statuses we don't have the user's flags for as them, a batch at a time"""
+		missing_status_ids = list(dict.fromkeys(
+			visible_status.id
+			for status in statuses
+			for visible_status in ((status, status.reblog) if status.reblog else (status,))
+			if (mastodon.token, visible_status.id) not in self._status_flags
+		))
+		if not missing_status_ids:
+			return
+
+		batches = await asyncio.gather(*(
+			mastodon.statuses.get_many(missing_status_ids[index:index + STATUS_FLAGS_BATCH_SIZE])
+			for index in range(0, len(missing_status_ids), STATUS_FLAGS_BATCH_SIZE)
+		))
+		for batch in batches:
+			self.remember_flags(mastodon, batch)
+		for status_id in missing_status_ids:
+			if (mastodon.token, status_id) not in self._status_flags:
+				# left out, so the instance wouldn't show it to them
+				self._status_flags.set((mastodon.token, status_id), None)
+
+	def _is_visible(self, token: str, status: Status) -> bool:
+		return all(
+			self._status_flags.get((token, visible_status.id), count=False) is not None
+			for visible_status in ((status, status.reblog) if status.reblog else (status,))
+		)
+
+	def _overlay_status(self, token: str, status: Status, viewer_context: ViewerContext) -> Status:
+		update = {"filtered": viewer_context.get_filter_results(status)}
+		status_flags = self._status_flags.get((token, status.id))
+		if status_flags is not MISSING and status_flags is not None:
+			update.update(status_flags._asdict())
+		if status.reblog:
+			update["reblog"] = self._overlay_status(token, status.reblog, viewer_context)
+		# a shallow copy, the shared status itself is never changed
+		return status.model_copy(update=update)
+
+	async def get_timeline(
+		self,
+		mastodon: Client,
+		anonymous: Client,
+		fetches: FetchScope,
+		kind: SharedTimelineKind,
+		*,
+		limit: int,
+		max_id: Optional[str] = None,
+		offset: Optional[int] = None
+	) -> list[Status]:
+		"""a page of a public timeline or trending statuses, as close to how mastodon's user would see it as we can tell"""
+		domain = mastodon.host_url.host
+		kwargs = {"kind": kind, "limit": limit, "max_id": max_id, "offset": offset}
+		if not self._is_shared(domain):
+			return await self._fetch(mastodon, **kwargs)
+
+		viewer_context_task = fetches.start(self._get_viewer_context(mastodon))
+		shared_timeline_task = fetches.start(
+			self._get_shared_timeline(anonymous, (domain, kind, limit, max_id, offset), **kwargs)
+		)
+		try:
+			viewer_context = await viewer_context_task
+			shared_timeline = await shared_timeline_task
+			shown_statuses = [status for status in shared_timeline if not viewer_context.is_hidden(status)]
+			await self._fetch_missing_flags(mastodon, shown_statuses)
+		except ClientResponseError as error:
+			if error.status not in UNSHARED_STATUSES:
+				raise error from None
+			self._unshared_domains.set(domain, time.monotonic())
+			return await self._fetch(mastodon, **kwargs)
+
+		return [
+			self._overlay_status(mastodon.token, status, viewer_context)
+			for status in shown_statuses
+			if self._is_visible(mastodon.token, status)
+		]
@@ -0,0 +1,648 @@
+"""
+
+String-building rendering engine.
+
+Renders the same markup as the BeautifulSoup functions in rendering.py, but writes escaped HTML directly
+instead of building a tree, and streams a page's .status-list as it is rendered.
+BeautifulSoup sorts attributes by name when it serializes a tree, so attributes are sorted here too.
+
+"""
+import datetime
+from typing import Optional, AsyncIterator
+
+from bs4 import BeautifulSoup, Tag
+from yarl import URL
+
+from .rendering import emojify, run_as_async, StatusListEntry, get_status_cache_key, config
+from .sanitizer import sanitize_content, get_content_digest, ContentNode, SANITIZED_CONTENT_CACHE_SIZE
+from . import workers
+from ...cache import LRUCache, MISSING
+from ...utils import filter_nulls_from_dict
+from ...mastodon.models.account import Account
+from ...mastodon.models.custom_emoji import CustomEmoji
+from ...mastodon.models.filter import FilterAction
+from ...mastodon.models.media_attachment import MediaAttachmentType, MediaAttachment
+from ...mastodon.models.preview_card import PreviewCardType
+from ...mastodon.models.status import Status, StatusVisibility
+from ...servers.img import get_proxied_url
+
+# tags that html.parser soups serialize as <tag/> when empty
+VOID_TAGS = {"br", "img"}
+
+STATUS_LIST_MARKER = "fediiverse:status-list"
+
+# statuses rendered per executor task. small enough that the first ones are sent early
+STREAMING_BATCH_SIZE = 5
+
+# rendered status HTML, or None if the status is hidden by a filter
+status_html_cache: LRUCache[tuple, str | None] = LRUCache(config.rendering.fragment_cache_size)
+
+
+def escape(text: str) -> str:
+	return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def format_attribute(name: str, value: Optional[str | int]) -> str:
+	if value is None:
+		return name
+
+	value = escape(str(value))
+	quote = '"'
+	if '"' in value:
+		if "'" in value:
+			value = value.replace('"', "&quot;")
+		else:
+			quote = "'"
+	return f"{name}={quote}{value}{quote}"
+
+
+def start_tag(name: str, attrs: Optional[dict] = None) -> str:
+	if not attrs:
+		return f"<{name}>"
+	return f"<{name} " + " ".join(format_attribute(key, attrs[key]) for key in sorted(attrs)) + ">"
+
+
+def void_tag(name: str, attrs: Optional[dict] = None) -> str:
+	return start_tag(name, attrs)[:-1] + "/>"
+
+
+def element(name: str, attrs: Optional[dict] = None, inner_html: str = "") -> str:
+	return f"{start_tag(name, attrs)}{inner_html}</{name}>"
+
+
+def inline_emojify_html(
+		text: str,
+		*,
+		shortcode_index: Optional[dict[str, CustomEmoji]] = None
+) -> str:
+	return "".join(
+		escape(part) if isinstance(part, str) else void_tag("img", {"class": part[0], "src": part[1]})
+		for part in emojify(text, shortcode_index=shortcode_index)
+	)
+
+
+def get_shortcode_index(emojis: list[CustomEmoji]) -> dict[str, CustomEmoji]:
+	return {custom_emoji.shortcode: custom_emoji for custom_emoji in emojis}
+
+
+# rendered content HTML, by content digest, custom emojis and disable_selection
+content_html_cache: LRUCache[tuple, str] = LRUCache(SANITIZED_CONTENT_CACHE_SIZE)
+
+
+def beautifully_render_content(
+		content: str,
+		emojis: list[CustomEmoji],
+		*,
+		disable_selection: bool = False
+) -> str:
+	cache_key = (
+		get_content_digest(content),
+		tuple((custom_emoji.shortcode, str(custom_emoji.url)) for custom_emoji in emojis),
+		disable_selection
+	)
+	content_html = content_html_cache.get(cache_key)
+	if content_html is not MISSING:
+		return content_html
+
+	content_shortcode_index = get_shortcode_index(emojis)
+	parts = []
+
+	def render_nodes(nodes: list[ContentNode]):
+		for node in nodes:
+			if isinstance(node, str):
+				parts.append(inline_emojify_html(node, shortcode_index=content_shortcode_index))
+				continue
+
+			attrs = node.attrs
+			if disable_selection and node.name == "a":
+				attrs = {**attrs, "tabindex": "-1"}
+
+			if node.name in VOID_TAGS and not node.children:
+				parts.append(void_tag(node.name, attrs))
+				continue
+
+			parts.append(start_tag(node.name, attrs))
+			render_nodes(node.children)
+			parts.append(f"</{node.name}>")
+
+	render_nodes(sanitize_content(content))
+
+	content_html = "".join(parts)
+	content_html_cache.set(cache_key, content_html)
+	return content_html
+
+
+def render_header_user_html(account: Account, link: bool = True, disable_selection: bool = False) -> str:
+	if link:
+		header_attrs = {
+			"href": f"/profile/{account.id}",
+			"class": "header-user",
+			"contextual": ""
+		}
+		if disable_selection:
+			header_attrs["tabindex"] = "-1"
+		header_name = "a"
+	else:
+		header_attrs = {"class": "header-user"}
+		header_name = "div"
+
+	proxied_av_url = get_proxied_url(account.avatar, max_width=32, max_height=32, mask_pfp=True)
+	display_name_html = inline_emojify_html(
+		account.display_name,
+		shortcode_index=get_shortcode_index(account.emojis)
+	)
+
+	return element(header_name, header_attrs, "".join([
+		void_tag("img", {"class": "header-user__avatar", "src": str(proxied_av_url)}),
+		element("div", {"class": "header-user__names"}, "".join([
+			element("span", {"class": "header-user__display-name"}, display_name_html),
+			element("span", {"class": "header-user__acct-name"}, escape("@" + account.acct))
+		]))
+	]))
+
+
+def render_stat_html(label: str, value: int) -> str:
+	return element("span", {"class": "stat"}, element("span", {"class": "stat__value"}, f"{value:,}") + " " + escape(label))
+
+
+def render_media_html(
+		status: Status,
+		parent_status: Status
+) -> str:
+	# if theres 1 attachment thats 320x120 in size (3ds sketches) make it full width and dont table it
+
+	sketch_attachment: Optional[MediaAttachment] = None
+	attachments = []
+	for attachment in status.media_attachments:
+		if (
+				attachment.meta
+				and "original" in attachment.meta
+				and attachment.meta["original"].get("width") == 320
+				and attachment.meta["original"].get("height") == 120
+		) and not sketch_attachment:
+			sketch_attachment = attachment
+		else:
+			attachments.append(attachment)
+
+	parts = []
+	if sketch_attachment:
+		parts.append(void_tag("img", {
+			"class": "status__sketch",
+			"src": get_proxied_url(sketch_attachment.url)
+		}))
+
+	if attachments and len(attachments):
+		attachments = [
+			attachment for attachment in attachments if
+			attachment.type == MediaAttachmentType.IMAGE
+		]
+
+		rows = []
+		for row_index in range(0, len(attachments), 2):
+			row_attachments = attachments[row_index:row_index + 2]
+			items = []
+			for attachment in row_attachments:
+				alone_in_row = len(row_attachments) == 1
+
+				min_height = 72
+				max_height = 230
+				if (
+					attachment.meta
+					and "small" in attachment.meta
+					and "aspect" in attachment.meta["small"]
+				):
+					aspect_ratio = attachment.meta["small"]["aspect"]
+					ideal_height = (306 if alone_in_row else 151) * (1 / aspect_ratio)
+				else:
+					ideal_height = 151
+
+				preview_img_url = get_proxied_url(attachment.preview_url, max_width=306, max_height=max_height)
+				full_size_img_url = get_proxied_url(attachment.url, max_width=400, max_height=1024)
+
+				actual_min_height = max(min_height, min(ideal_height, max_height))
+				image_html = element("button", {
+					"class": "media-gallery__item-button",
+					"onclick": f"previewImage({str(full_size_img_url)!r}, {parent_status.id!r})",
+				})
+				if attachment.description:
+					image_html += element("button", {
+						"class": "media-gallery__item-alt-button",
+						"onclick": "altClicked(this, event)"
+					}, "Alt")
+
+				items.append(element("td", {
+					"class": "media-gallery__item",
+					"colspan": "2" if alone_in_row else "1"
+				}, element("div", filter_nulls_from_dict({
+					"class": "media-gallery__item-img",
+					"style": "; ".join([
+						f"background-image: url({preview_img_url!r})",
+						f"min-height: {actual_min_height}px",
+						f"max-height: {max_height}px"
+					]),
+					"role": "img",
+					"title": attachment.description,
+					"alt": attachment.description
+				}), image_html)))
+
+			rows.append(element("tr", {"class": "media-gallery__row"}, "".join(items)))
+
+		parts.append(element("table", {"class": "media-gallery"}, "".join(rows)))
+
+	return "".join(parts)
+
+
+def render_card_html(status: Status, disable_selection: bool = False) -> str:
+	card = status.card
+
+	if card.provider_name:
+		provider = card.provider_name
+	elif card.url:
+		provider = URL(card.url).host
+	else:
+		provider = None
+
+	interactive = card.type == PreviewCardType.VIDEO
+	large_image = interactive or (card.image and (card.width > card.height))
+
+	card_attrs = filter_nulls_from_dict({
+		"class": "status-card",
+		"data-large-image": "true" if large_image else "false",
+
+		"href": card.url,
+		"target": "_blank",
+		"rel": "nofollow noopener noreferrer",  # not like it matters...
+		"onclick": f"event.preventDefault(); promptLink({card.url!r});"
+	})
+	if disable_selection:
+		card_attrs["tabindex"] = "-1"
+
+	parts = []
+	if card.image:
+		parts.append(element("div", {
+			"class": "status-card__image",
+			"style": f"background-image: url({get_proxied_url(card.image, max_width=309, max_height=174)!r})"
+		}))
+
+	content_parts = [
+		element("span", {"class": "status-card__host"}, element("span", None, inline_emojify_html(provider)) if provider else ""),
+		element("span", {"class": "status-card__title"}, inline_emojify_html(card.title))
+	]
+	if card.author_name:
+		content_parts.append(element("span", {
+			"class": "status-card__author"
+		}, "by " + inline_emojify_html(card.author_name)))
+	elif card.description:
+		content_parts.append(element("span", {
+			"class": "status-card__description"
+		}, inline_emojify_html(card.description)))
+
+	parts.append(element("div", {"class": "status-card__content"}, "".join(content_parts)))
+
+	return element("a", card_attrs, "".join(parts))
+
+
+def render_action_html(
+		*,
+		label: Optional[str] = None,
+		active: bool = False,
+		disabled: bool = False,
+
+		icon: str,
+		callback: str  # (this, event) => void
+) -> str:
+	attrs = {
+		"class": "status__action",
+		"onClick": f"{callback}(this, event)"
+	}
+	if label:
+		attrs["data-text"] = "true"
+	if disabled:
+		attrs["disabled"] = "true"
+	if active:
+		attrs["data-active"] = "true"
+
+	inner_html = element("div", {"class": "icon", "icon": icon}) + (escape(label) if label else "")
+	return element("button", attrs, element("div", {"class": "status__action-inner"}, inner_html))
+
+
+def render_status_html(
+		status: Status,
+		*,
+		local_user_id: str,
+		include_actions: bool = True,
+		disable_selection: bool = False,
+		expanded: bool = False,
+		utc_offset: Optional[datetime.timedelta] = None,
+		extra_class: Optional[str] = None
+) -> str | None:
+	"""same markup as rendering.render_status, including the filter element before the status if there is one"""
+	cache_key = get_status_cache_key(
+		status,
+		local_user_id=local_user_id,
+		include_actions=include_actions,
+		disable_selection=disable_selection,
+		expanded=expanded,
+		utc_offset=utc_offset,
+		extra_class=extra_class
+	)
+	cached_html = status_html_cache.get(cache_key)
+	if cached_html is not MISSING:
+		return cached_html
+
+	parent_status = status
+	status = parent_status.reblog if parent_status.reblog else parent_status
+
+	is_filtered = status.filtered and len(status.filtered)
+
+	status_attrs = {
+		"id": f"status-{parent_status.id}",
+		"class": f"status {extra_class}" if extra_class else "status",
+		"data-status-id": parent_status.id,
+		"data-status-acct": parent_status.account.acct,
+		"data-status-by-me": "true" if parent_status.account.id == local_user_id else "false",
+		"data-visible-status-id": status.id,
+		"data-visible-status-acct": status.account.acct,
+		"data-visible-status-by-me": "true" if status.account.id == local_user_id else "false",
+		"data-expanded": "true" if expanded else "false",
+	}
+
+	filter_html = ""
+	if is_filtered:
+		for filter_result in status.filtered:
+			if filter_result.filter.filter_action == FilterAction.HIDE:
+				status_html_cache.set(cache_key, None)
+				return None
+
+		status_attrs["style"] = "display: none"
+
+		filter_names = [filter_result.filter.title for filter_result in status.filtered]
+		filter_html = element("div", {
+			"class": "filter",
+			"id": f"status-{parent_status.id}-filter",
+			"data-status-id": parent_status.id,
+			"data-visible-status-id": status.id
+		}, "".join([
+			element("span", {"class": "filter__label"}, "Filtered: " + element(
+				"span", {"class": "filter__name"}, escape(", ".join(filter_names))
+			)),
+			element("button", {
+				"class": "button",
+				"onclick": "filterShowClicked(this, event)"
+			}, "Show anyway")
+		]))
+
+	parts = []
+	if parent_status != status:
+		# if this is a boost post
+		parts.append(element("div", {"class": "status__prepend"}, "".join([
+			element("div", {"class": "status__prepend-icon-container"}, element("div", {
+				"class": "icon status__prepend-icon",
+				"icon": "reblog"
+			})),
+			element("span", {"class": "status__prepend-label"}, element(
+				"span", {"class": "status__prepend-user"}, inline_emojify_html(
+					parent_status.account.display_name,
+					shortcode_index=get_shortcode_index(parent_status.account.emojis)
+				)
+			) + " boosted")
+		])))
+
+	parts.append(render_header_user_html(status.account, disable_selection=disable_selection))
+
+	# RENDER SPOILER
+	if status.spoiler_text:
+		parts.append(element("div", {"class": "status__spoiler"}, "".join([
+			element("span", {"class": "status__spoiler-text"}, escape(status.spoiler_text)),
+			element("button", {
+				"class": "status__spoiler-button",
+				"onclick": "spoilerClicked(this, event)"
+			}, "Show")
+		])))
+
+	# RENDER CONTENT:
+	content_parts = [
+		element("div", {"class": "status__content-text rendered-text"}, beautifully_render_content(
+			status.content,
+			status.emojis,
+			disable_selection=disable_selection
+		)),
+		render_media_html(status, parent_status)
+	]
+	if status.card:
+		content_parts.append(render_card_html(status, disable_selection=disable_selection))
+
+	parts.append(element("div", {
+		"class": "status__content",
+		"style": "display: none" if status.spoiler_text else ""
+	}, "".join(content_parts)))
+
+	if expanded:
+		# RENDER META:
+		timezone = datetime.timezone(utc_offset) if utc_offset is not None else datetime.timezone.utc
+		meta_html = element("span", None, escape(
+			status.created_at.astimezone(timezone).strftime("%b %e, %Y at %k:%M")
+		))
+
+		if status.application:
+			meta_html += " • " + element("span", None, escape(status.application.name))
+
+		meta_html += element("span", {"class": "status__meta-visibility"}, element("div", {
+			"class": "icon",
+			"icon": (
+				"earth" if status.visibility == StatusVisibility.PUBLIC else
+				"moon" if status.visibility == StatusVisibility.UNLISTED else
+				"lock" if status.visibility == StatusVisibility.PRIVATE else
+				"at" if status.visibility == StatusVisibility.DIRECT else
+				"err"
+			)
+		}) + " " + (
+			"Public" if status.visibility == StatusVisibility.PUBLIC else
+			"Unlisted" if status.visibility == StatusVisibility.UNLISTED else
+			"Private" if status.visibility == StatusVisibility.PRIVATE else
+			"Direct" if status.visibility == StatusVisibility.DIRECT else
+			"UNKNOWN"
+		))
+		parts.append(element("div", {"class": "status__meta"}, meta_html))
+
+		# RENDER STATS:
+		stats_html = render_stat_html("boost" if status.reblogs_count == 1 else "boosts", status.reblogs_count)
+		stats_html += render_stat_html("favorite" if status.favourites_count == 1 else "favorites", status.favourites_count)
+		if status.replies_count > 1:
+			stats_html += render_stat_html("reply" if status.replies_count == 1 else "replies", status.replies_count)
+		parts.append(element("div", {"class": "status__stats"}, stats_html))
+
+	# RENDER ACTIONS:
+	actions = []
+	if not expanded:
+		actions.append(element("a", {
+			"class": "status__timedelta",
+			"data-timestamp-type": "timedelta",
+			"data-timestamp": int(status.created_at.timestamp()),
+			"contextual": "",
+			"href": f"/status/{status.id}"
+		}, "---"))
+
+	actions.append(element("div", {
+		"style": "display: block; -webkit-box-flex: 1;"
+	}))
+
+	if include_actions:
+		actions.append(render_action_html(
+			icon="ellipsis",
+			active=False,
+			callback="moreClicked"
+		))
+
+		if is_filtered:
+			actions.append(render_action_html(
+				icon="eye",
+				active=False,
+				callback="hideClicked"
+			))
+
+		actions.append(render_action_html(
+			icon="reply",
+			active=False,
+			callback="replyClicked"
+		))
+		actions.append(render_action_html(
+			icon="reblog",
+			active=status.reblogged,
+			disabled=status.visibility not in {
+				StatusVisibility.PUBLIC,
+				StatusVisibility.UNLISTED
+			},
+			callback="reblogClicked"
+		))
+		actions.append(render_action_html(
+			icon="favourite",
+			active=status.favourited,
+			callback="favouriteClicked"
+		))
+		actions.append(render_action_html(
+			icon="bookmark",
+			active=status.bookmarked,
+			callback="bookmarkClicked"
+		))
+
+	parts.append(element("div", {"class": "status__actions"}, "".join(actions)))
+
+	status_html = filter_html + element("div", status_attrs, "".join(parts))
+	status_html_cache.set(cache_key, status_html)
+	return status_html
+
+
+def split_template(soup: BeautifulSoup, list_el: Tag) -> tuple[str, str]:
+	"""serializes a page around list_el, returning the HTML before and after the end of its contents"""
+	list_el.append(STATUS_LIST_MARKER)
+	head, tail = str(soup).split(STATUS_LIST_MARKER)
+	return head, tail
+
+
+async def stream_status_list(
+		soup: BeautifulSoup,
+		list_el: Tag,
+		entries: list[StatusListEntry | Tag],
+		*,
+		local_user_id: str,
+		utc_offset: Optional[datetime.timedelta] = None
+) -> AsyncIterator[str]:
+	"""streams the page, rendering statuses into list_el while the start of the page is already being sent"""
+	head, tail = split_template(soup, list_el)
+	yield head
+
+	for batch_start in range(0, len(entries), STREAMING_BATCH_SIZE):
+		batch = entries[batch_start:batch_start + STREAMING_BATCH_SIZE]
+		yield await render_entries_html(batch, local_user_id=local_user_id, utc_offset=utc_offset)
+
+	yield tail
+
+
+def render_statuses_json_html(jobs: list[tuple[str, dict]]) -> list[Optional[str]]:
+	"""renders (status JSON, render_status_html options) pairs. this is what runs in the worker processes"""
+	return [
+		render_status_html(Status.model_validate_json(status_json), **options)
+		for status_json, options in jobs
+	]
+
+
+def get_status_html_options(
+		entry: StatusListEntry,
+		*,
+		local_user_id: str,
+		utc_offset: Optional[datetime.timedelta] = None
+) -> dict:
+	return {
+		"local_user_id": local_user_id,
+		"include_actions": True,
+		"disable_selection": False,
+		"expanded": entry.expanded,
+		"utc_offset": utc_offset,
+		"extra_class": entry.extra_class
+	}
+
+
+async def render_entries_html(
+		entries: list[StatusListEntry | Tag],
+		*,
+		local_user_id: str,
+		utc_offset: Optional[datetime.timedelta] = None
+) -> str:
+	"""renders a batch of entries in a worker process if there's a process pool, or in one executor task"""
+	if workers.process_pool is not None:
+		return await render_entries_html_in_process_pool(entries, local_user_id=local_user_id, utc_offset=utc_offset)
+
+	def render_entries() -> str:
+		parts = []
+		for entry in entries:
+			if isinstance(entry, Tag):
+				parts.append(str(entry))
+				continue
+
+			status_html = render_status_html(
+				entry.status,
+				**get_status_html_options(entry, local_user_id=local_user_id, utc_offset=utc_offset)
+			)
+			if status_html:
+				parts.append(status_html)
+		return "".join(parts)
+
+	return await run_as_async(render_entries)
+
+
+async def render_entries_html_in_process_pool(
+		entries: list[StatusListEntry | Tag],
+		*,
+		local_user_id: str,
+		utc_offset: Optional[datetime.timedelta] = None
+) -> str:
+	parts: list[Optional[str]] = []
+	jobs: list[tuple[str, dict]] = []
+	job_indexes: list[tuple[int, tuple]] = []  # (index in parts, cache key) for every job
+
+	for entry in entries:
+		if isinstance(entry, Tag):
+			parts.append(str(entry))
+			continue
+
+		options = get_status_html_options(entry, local_user_id=local_user_id, utc_offset=utc_offset)
+
+		# statuses this process has already rendered don't have to go to a worker
+		cache_key = get_status_cache_key(entry.status, **options)
+		cached_html = status_html_cache.get(cache_key)
+		if cached_html is not MISSING:
+			parts.append(cached_html)
+			continue
+
+		job_indexes.append((len(parts), cache_key))
+		jobs.append((entry.status.model_dump_json(), options))
+		parts.append(None)
+
+	if jobs:
+		results = await workers.run_in_process_pool(render_statuses_json_html, jobs)
+		for (index, cache_key), status_html in zip(job_indexes, results):
+			status_html_cache.set(cache_key, status_html)
+			parts[index] = status_html
+
+	return "".join(part for part in parts if part)
@@ -0,0 +1,80 @@
+"""
+
+Optional pool of worker processes for the STREAMING rendering engine.
+
+Rendering is CPU-bound Python, so in the default thread pool it only ever uses one core at a time because of the GIL.
+With a process pool, statuses are sent to the workers as JSON and come back as HTML fragments.
+Whenever the pool is disabled or broken, rendering falls back to this process.
+
+"""
+import asyncio
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Callable, TypeVar
+
+from .rendering import run_as_async
+
+T = TypeVar("T")
+
+process_pool: Optional[ProcessPoolExecutor] = None
+process_pool_size = 0
+
+
+def _initialize_worker():
+	# import the renderer (which builds the emoji pattern) before the first batch arrives
+	from . import streaming
+
+	# the parent process checks its own cache before sending anything here
+	streaming.status_html_cache.max_size = 0
+
+
+def _create_process_pool(size: int) -> ProcessPoolExecutor:
+	return ProcessPoolExecutor(
+		max_workers=size,
+		# forking a process with a running event loop and threads isn't safe
+		mp_context=multiprocessing.get_context("spawn"),
+		initializer=_initialize_worker
+	)
+
+
+def start_process_pool(size: int):
+	global process_pool, process_pool_size
+	process_pool_size = size
+	if size > 0:
+		process_pool = _create_process_pool(size)
+
+
+def shutdown_process_pool():
+	global process_pool
+	if process_pool is not None:
+		process_pool.shutdown(wait=False, cancel_futures=True)
+		process_pool = None
+
+
+def _restart_process_pool(broken_pool: ProcessPoolExecutor):
+	global process_pool
+	if process_pool is not broken_pool:
+		return  # someone else already restarted it
+
+	broken_pool.shutdown(wait=False, cancel_futures=True)
+	process_pool = _create_process_pool(process_pool_size)
+
+
+async def run_in_process_pool(func: Callable[..., T], *args) -> T:
+	"""runs func(*args) in a worker process, or in a thread of this process if there's no pool"""
+	pool = process_pool
+	if pool is not None:
+		try:
+			return await asyncio.get_event_loop().run_in_executor(pool, func, *args)
+		except BrokenProcessPool:
+			warnings.warn("warning: the rendering process pool broke, restarting it")
+			_restart_process_pool(pool)
+		except RuntimeError:
+			# submit() raises this for a pool that was shut down. only ignore it for ones we shut down or replaced
+			if process_pool is pool:
+				raise
+			warnings.warn("warning: the rendering process pool was shut down while in use, rendering in this process")
+
+	return await run_as_async(lambda: func(*args))
@@ -20,7 +20,10 @@ from pydantic import BaseModel
 from yarl import URL
 
 from ...instance_check import is_allowed_instance_domain_name
-from ...mastodon import Client
+from ...mastodon import ClientPool
+from ...mastodon.circuitbreaker import InstanceUnavailableError
+from ...mastodon.ratelimits import RateLimitedError
+from ...metrics import RequestMetricsMiddleware, metrics_router
 from ...mastodon.providers.oauth import GrantType
 from ...storage import FediiverseStore, SavedInstance, get_config, FediiverseMode
 from ...token import FediiverseToken
@@ -34,11 +37,24 @@ config = get_config()
 hosts = config.hosts
 fernet: Fernet = Fernet(config.secrets.temporal_secret_key)
 store = FediiverseStore()
+upstream: ClientPool
 
 
 @asynccontextmanager
 async def lifespan(_):
-	async with store:
+	global upstream
+	async with store, ClientPool(
+		limit=config.upstream.connection_limit,
+		limit_per_host=config.upstream.connection_limit_per_host,
+		keepalive_timeout=config.upstream.keepalive_timeout,
+		response_cache_size=config.upstream.response_cache_size,
+		hedge_budget=config.upstream.hedge_budget,
+		hedge_percentile=config.upstream.hedge_percentile,
+		circuit_breaker_failures=config.upstream.circuit_breaker_failures,
+		circuit_breaker_probe_interval=config.upstream.circuit_breaker_probe_interval
+	) as upstream:
+		upstream.register_metrics()
+		upstream.metric_instances.update(await store.get_saved_instance_domains())
 		yield
 
 
@@ -47,6 +63,8 @@ app = FastAPI(
 	docs_url="/docs" if config.mode == FediiverseMode.DEV else None,
 	redoc_url="/redoc" if config.mode == FediiverseMode.DEV else None
 )
+app.add_middleware(RequestMetricsMiddleware)
+app.include_router(metrics_router)
 app.mount("/static", StaticFiles(directory=static_path), name="static")
 
 
@@ -73,13 +91,15 @@ async def validate_instance_domain(host: str) -> bool:
 
 	# 2. check if its an instance
 	try:
-		async with Client(f"https://{host}") as mastodon:
+		async with upstream.client(f"https://{host}") as mastodon:
 			instance = await mastodon.instance.get_instance_v1()
 			# fix for "void.lgbt" returning "https://void.lgbt" as its instance URI
 			uri = instance.uri.removeprefix("https://")
 			uri = uri.replace("/", "")
 			if host != uri:
 				return False
+	except (InstanceUnavailableError, RateLimitedError):
+		raise  # we can't tell right now, the error page says why
 	except aiohttp.ClientError as exception:
 		traceback.print_exception(exception)
 		return False
@@ -89,7 +109,7 @@ async def validate_instance_domain(host: str) -> bool:
 
 async def build_instance_app_at_domain(domain: str) -> SavedInstance:
 	timestamp = datetime.datetime.now(tz=datetime.timezone.utc)
-	async with Client(f"https://{domain}") as mastodon:
+	async with upstream.client(f"https://{domain}") as mastodon:
 		application = await mastodon.apps.create_application(
 			client_name="fediiverse for Nintendo 3DS",
 			redirect_uris=[str(RETURN_URL)],
@@ -133,6 +153,7 @@ async def select_instance(
 		# we haven't seen this instance before!
 		instance_info = await build_instance_app_at_domain(domain_name)
 		await store.save_instance(instance_info)
+		upstream.metric_instances.add(domain_name)
 
 	state = OAuthState(
 		domain=domain_name
@@ -249,7 +270,7 @@ async def return_route(
 	if not instance_info:
 		raise ValueError(f"no instance info for {state.domain}")
 
-	async with Client(host=f"https://{state.domain}") as mastodon:
+	async with upstream.client(host=f"https://{state.domain}") as mastodon:
 		try:
 			token_response = await mastodon.oauth.obtain_access_token(
 				grant_type=GrantType.AUTHORIZATION_CODE,
@@ -315,3 +336,27 @@ async def exception_handler(
 		status_code=exception.status_code,
 		content=str(soup)
 	)
+
+
+# noinspection PyUnusedLocal
+@app.exception_handler(InstanceUnavailableError)
+async def instance_unavailable_exception_handler(
+		request: Request,
+		exception: InstanceUnavailableError
+) -> HTMLResponse:
+	return await exception_handler(request, StarletteHTTPException(
+		status_code=503,
+		detail=f"{exception.host} isn't responding right now. Please try again in a little while!"
+	))
+
+
+# noinspection PyUnusedLocal
+@app.exception_handler(RateLimitedError)
+async def rate_limited_exception_handler(
+		request: Request,
+		exception: RateLimitedError
+) -> HTMLResponse:
+	return await exception_handler(request, StarletteHTTPException(
+		status_code=429,
+		detail=f"Too many requests to {exception.host} for now. Please try again in a few minutes!"
+	))
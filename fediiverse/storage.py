@@ -30,6 +30,7 @@ CONFIG_PATH = ROOT_PATH / "config.json"
 SQLITE_PATH = ROOT_PATH / "storage.db"
 NGINX_PATH = ROOT_PATH / "nginx"
 EMOJIS_PATH = ROOT_PATH / "emojis"
+EMOJI_CACHE_PATH = ROOT_PATH / "emoji-cache"
 CACHED_BLOCKLIST_PATH = ROOT_PATH / "cached-blocklist.json"
 
 
@@ -76,6 +77,39 @@ class FediiverseConfigWelcome(BaseModel):
 	additional_intro_html: Optional[str]
 
 
+class EmojiMode(Enum):
+	INLINE = "INLINE"
+	URL = "URL"
+
+
+class RenderingEngine(Enum):
+	SOUP = "SOUP"
+	STREAMING = "STREAMING"
+
+
+class FediiverseConfigRendering(BaseModel):
+	emoji_mode: EmojiMode = EmojiMode.INLINE
+	engine: RenderingEngine = RenderingEngine.SOUP
+	fragment_cache_size: int = 1024
+	process_pool_size: int = 0
+
+
+class FediiverseConfigUpstream(BaseModel):
+	connection_limit: int = 100
+	connection_limit_per_host: int = 16
+	keepalive_timeout: float = 30
+	response_cache_size: int = 1024
+	account_cache_size: int = 4096
+	shared_timeline_ttl: float = 0
+	prefetch_ttl: float = 120
+	home_buffer_users: int = 0
+	home_buffer_idle_timeout: float = 600
+	hedge_budget: float = 0
+	hedge_percentile: float = 95
+	circuit_breaker_failures: int = 5
+	circuit_breaker_probe_interval: float = 30
+
+
 class FediiverseConfig(BaseModel):
 	log_path: Path
 	proxy_upstream_https: Optional[str] = None
@@ -83,6 +117,8 @@ class FediiverseConfig(BaseModel):
 	secrets: FediiverseConfigSecrets
 	instances: FediiverseConfigInstances
 	welcome: FediiverseConfigWelcome
+	rendering: FediiverseConfigRendering = FediiverseConfigRendering()
+	upstream: FediiverseConfigUpstream = FediiverseConfigUpstream()
 	mode: FediiverseMode
 
 
@@ -116,6 +152,10 @@ class FediiverseStore:
 			client_secret=client_secret
 		)
 
+	async def get_saved_instance_domains(self) -> set[str]:
+		results = await (await self.sqlite.execute("SELECT domain_name FROM instances")).fetchall()
+		return {domain_name for domain_name, in results}
+
 	async def save_instance(self, instance: SavedInstance) -> SavedInstance | None:
 		await self.sqlite.execute(
 			"INSERT INTO instances (domain_name, created_at, client_id, client_secret) VALUES (?,?,?,?)",
@@ -128,6 +168,24 @@ class FediiverseStore:
 		)
 		await self.sqlite.commit()
 
+	async def get_account_id(self, domain_name: str, acct: str) -> str | None:
+		result = await (await self.sqlite.execute(
+			"SELECT account_id FROM account_ids WHERE domain_name = ? AND acct = ?",
+			(domain_name, acct)
+		)).fetchone()
+		if result is None:
+			return None
+
+		account_id, = result
+		return account_id
+
+	async def save_account_ids(self, domain_name: str, account_ids: dict[str, str]):
+		await self.sqlite.executemany(
+			"INSERT OR REPLACE INTO account_ids (domain_name, acct, account_id) VALUES (?,?,?)",
+			[(domain_name, acct, account_id) for acct, account_id in account_ids.items()]
+		)
+		await self.sqlite.commit()
+
 	async def _setup(self):
 		await self.sqlite.execute(
 			"CREATE TABLE IF NOT EXISTS instances ("
@@ -137,6 +195,15 @@ class FediiverseStore:
 			"  client_secret TEXT NOT NULL"
 			")"
 		)
+		# which account id an acct has on an instance. ids are only valid on the instance they're from
+		await self.sqlite.execute(
+			"CREATE TABLE IF NOT EXISTS account_ids ("
+			"  domain_name TEXT NOT NULL,"
+			"  acct TEXT NOT NULL,"
+			"  account_id TEXT NOT NULL,"
+			"  PRIMARY KEY (domain_name, acct)"
+			")"
+		)
 
 	async def __aenter__(self):
 		self.sqlite = await aiosqlite.connect(SQLITE_PATH)
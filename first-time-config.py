@@ -227,6 +227,10 @@ async def main():
 	# update NGINX conf:
 	build_configuration()
 
+	# rasterize emojis ahead of time so the olv server doesn't have to:
+	from fediiverse.emojis import prewarm_emoji_cache
+	prewarm_emoji_cache(log=True)
+
 	questionary.print(f"your fediiverse server has been set up in {fediiverse_path}! ", style="pink bold")
 	questionary.print(f"for further instruction, see ./docs/hosting/setup-instructions.md and configuration.md.",
 					  style="pink bold")
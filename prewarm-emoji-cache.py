@@ -0,0 +1,11 @@
+from fediiverse.emojis import prewarm_emoji_cache
+
+
+def main():
+	print("Rasterizing emojis into the emoji cache...")
+	count = prewarm_emoji_cache(log=True)
+	print(f"done! ({count} new files)")
+
+
+if __name__ == "__main__":
+	main()